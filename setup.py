@@ -39,6 +39,8 @@ use_setuptools()
 from setuptools import setup
 
 from upkern import information
+from upkern.bootloaders import BOOTLOADERS
+from upkern.initramfs import PREPARERS
 
 PARAMS = {}
 
@@ -92,12 +94,17 @@ PARAMS['entry_points'] = {
         'console_scripts': [
             'upkern = upkern:run',
             ],
+        BOOTLOADERS.group: BOOTLOADERS.entry_points(),
+        PREPARERS.group: PREPARERS.entry_points(),
         }
 
 PARAMS['packages'] = [
         'upkern',
         'upkern.kernel',
+        'upkern.bootloader',
+        'upkern.bootloader.bootloaders',
         'upkern.bootloaders',
+        'upkern.initramfs',
         'upkern.system',
         ]
 
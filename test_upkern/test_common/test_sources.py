@@ -13,6 +13,18 @@ class TestBaseSources(unittest.TestCase):
     mocks_mask = set()
     mocks = set()
 
+    mocks.add('Sources.binary_name')
+    def mock_binary_name(self, binary_name):
+        if 'Sources.binary_name' in self.mocks_mask:
+            return
+
+        _ = mock.patch.object(sources.Sources, 'binary_name', mock.PropertyMock())
+
+        self.addCleanup(_.stop)
+
+        mocked_binary_name = _.start()
+        mocked_binary_name.return_value = binary_name
+
     mocks.add('Sources.configuration_files')
     def mock_configuration_files(self, configuration_files):
         if 'Sources.configuration_files' in self.mocks_mask:
@@ -37,6 +49,18 @@ class TestBaseSources(unittest.TestCase):
         mocked_directory_name = _.start()
         mocked_directory_name.return_value = directory_name
 
+    mocks.add('Sources.fingerprint')
+    def mock_fingerprint(self, fingerprint = None):
+        if 'Sources.fingerprint' in self.mocks_mask:
+            return
+
+        _ = mock.patch.object(sources.Sources, 'fingerprint', mock.PropertyMock())
+
+        self.addCleanup(_.stop)
+
+        self.mocked_fingerprint = _.start()
+        self.mocked_fingerprint.return_value = fingerprint or {}
+
     mocks.add('Sources.kernel_suffix')
     def mock_kernel_suffix(self, kernel_suffix):
         if 'Sources.kernel_suffix' in self.mocks_mask:
@@ -61,6 +85,25 @@ class TestBaseSources(unittest.TestCase):
         mocked_package_name = _.start()
         mocked_package_name.return_value = package_name
 
+    mocks.add('system.boot')
+    def mock_system_boot(self):
+        '''Start every use with a fresh `/boot` session.'''
+
+        if 'system.boot' in self.mocks_mask:
+            return
+
+        _ = mock.patch.multiple('upkern.sources.system.boot', _mounted = None, _inventory = None)
+
+        self.addCleanup(_.stop)
+
+        _.start()
+
+        _ = mock.patch.dict('upkern.sources.system.utilities._references', clear = True)
+
+        self.addCleanup(_.stop)
+
+        _.start()
+
     mocks.add('system.utilties.mount')
     def mock_system_utilities_mount(self):
         if 'system.utiltiies.mount' in self.mocks_mask:
@@ -83,5 +126,16 @@ class TestBaseSources(unittest.TestCase):
 
         self.mocked_system_utilities_unmount = _.start()
 
+    mocks.add('transaction')
+    def mock_transaction(self):
+        if 'transaction' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.sources.transaction')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_transaction = _.start()
+
     def prepare_sources(self, *args, **kwargs):
         self.s = sources.Sources(*args, **kwargs)
@@ -16,6 +16,7 @@ SOURCES['correct'].append(
         'configuration_name': 'config-3.12.6-gentoo',
         'system_map_name': 'System.map-3.12.6-gentoo',
         'kernel_index': 3012006000,
+        'kernel_series': 'gentoo-3.12',
         'kernel_suffix': '-3.12.6-gentoo',
         'portage_configuration': { 'MAKEOPTS': '-j5' },
         'source_directories': [
@@ -44,6 +45,7 @@ SOURCES['correct'].append(
         'configuration_name': 'config-3.12.6-gentoo',
         'system_map_name': 'System.map-3.12.6-gentoo',
         'kernel_index': 3012006000,
+        'kernel_series': 'gentoo-3.12',
         'kernel_suffix': '-3.12.6-gentoo',
         'portage_configuration': { 'MAKEOPTS': '-j5' },
         'source_directories': [
@@ -72,6 +74,7 @@ SOURCES['correct'].append(
         'configuration_name': 'config-3.9.11-gentoo-r1',
         'system_map_name': 'System.map-3.9.11-gentoo-r1',
         'kernel_index': 3009011001,
+        'kernel_series': 'gentoo-3.9',
         'kernel_suffix': '-3.9.11-gentoo-r1',
         'portage_configuration': { 'MAKEOPTS': '-j5' },
         'source_directories': [
@@ -103,6 +106,7 @@ SOURCES['correct'].append(
         'configuration_name': 'config-3.11.7-hardened-r1',
         'system_map_name': 'System.map-3.11.7-hardened-r1',
         'kernel_index': 3011007001,
+        'kernel_series': 'hardened-3.11',
         'kernel_suffix': '-3.11.7-hardened-r1',
         'portage_configuration': { 'MAKEOPTS': '-j5' },
         'source_directories': [
@@ -9,6 +9,7 @@ import os
 import shutil
 
 from upkern import sources
+from upkern.system import files
 
 from test_upkern.test_common.test_sources import TestBaseSources
 from test_upkern.test_fixtures.test_sources import SOURCES
@@ -18,10 +19,13 @@ logger = logging.getLogger(__name__)
 
 ORIGINALS = {
     'os.path.islink': os.path.islink,
+    'files.Installer.copy': files.Installer.copy,
+    'files.Installer.write': files.Installer.write,
     'os.path.lexists': os.path.lexists,
     'os.readlink': os.readlink,
     'os.rename': os.rename,
     'os.remove': os.remove,
+    'os.replace': os.replace,
     'os.symlink': os.symlink,
     'shutil.copy': shutil.copy,
     'shutil.move': shutil.move,
@@ -282,6 +286,7 @@ class TestSourcesSetupSymlink(TestFunctionalSources):
 
             self.wrap_os_path_islink(self.temporary_directory_path)
             self.wrap_os_symlink(self.temporary_directory_path)
+            self.mock_transaction()
 
             self.prepare_sources(source['name'])
 
@@ -307,6 +312,7 @@ class TestSourcesSetupSymlink(TestFunctionalSources):
             self.wrap_os_readlink(self.temporary_directory_path)
             self.wrap_os_remove(self.temporary_directory_path)
             self.wrap_os_symlink(self.temporary_directory_path)
+            self.mock_transaction()
 
             self.prepare_sources(source['name'])
 
@@ -321,31 +327,21 @@ class TestSourcesInstall(TestFunctionalSources):
     mocks_mask = TestFunctionalSources.mocks_mask
     mocks = TestFunctionalSources.mocks
 
-    mocks.add('Sources.binary_name')
-    def mock_binary_name(self, binary_name):
-        if 'Sources.binary_name' in self.mocks_mask:
-            return
-
-        _ = mock.patch.object(sources.Sources, 'binary_name', mock.PropertyMock())
-
-        self.addCleanup(_.stop)
-
-        mocked_binary_name = _.start()
-        mocked_binary_name.return_value = binary_name
+    def wrap_system_files_installer(self, prefix):
+        def copy(installer, src, dst):
+            src = os.path.normpath(prefix + '/' + src)
+            dst = os.path.normpath(prefix + '/' + dst)
+            return ORIGINALS['files.Installer.copy'](installer, src, dst)
 
-    def wrap_os_rename(self, prefix):
-        def wrapped(src, dst):
-            if src.startswith('/'):
-                src = os.path.normpath(prefix + '/' + src)
+        def write(installer, dst, *args, **kwargs):
             dst = os.path.normpath(prefix + '/' + dst)
-            return ORIGINALS['os.rename'](src, dst)
+            return ORIGINALS['files.Installer.write'](installer, dst, *args, **kwargs)
 
-        _ = mock.patch('upkern.sources.os.rename')
+        _ = mock.patch.multiple('upkern.sources.system.files.Installer', copy = copy, write = write)
 
         self.addCleanup(_.stop)
 
-        self.wrapped_os_rename = _.start()
-        self.wrapped_os_rename.side_effect = wrapped
+        _.start()
 
     def test_install(self):
         '''sources.Sources().install()'''
@@ -356,6 +352,9 @@ class TestSourcesInstall(TestFunctionalSources):
             self.prepare_temporary_directory()
             self.populate_temporary_directory_files(
                 {
+                    '/': [
+                        'System.map',
+                    ],
                     '/boot': [
                         '.keep',
                     ],
@@ -374,8 +373,9 @@ class TestSourcesInstall(TestFunctionalSources):
             self.mock_system_utilities_unmount()
 
             self.wrap_os_path_lexists(self.temporary_directory_path)
-            self.wrap_os_rename(self.temporary_directory_path)
-            self.wrap_shutil_copy(self.temporary_directory_path)
+            self.wrap_os_remove(self.temporary_directory_path)
+            self.wrap_system_files_installer(self.temporary_directory_path)
+            self.mock_transaction()
 
             self.prepare_sources(source['name'])
 
@@ -386,4 +386,68 @@ class TestSourcesInstall(TestFunctionalSources):
                 self.actual_contents('/boot/{0}'.format(source['configuration_name'])),
             )
 
+            self.assertEqual(
+                self.expected_contents['/usr/src/linux/System.map'],
+                self.actual_contents('/System.map'),
+            )
+
+            self.assertEqual([ '.keep', 'System.map' + source['kernel_suffix'], 'bzImage' + source['kernel_suffix'], source['configuration_name'] ], sorted(os.listdir(self.temporary_directory_path + '/boot')))
+
+            self.mocked_transaction.protect.assert_has_calls([
+                mock.call('/boot/bzImage' + source['kernel_suffix']),
+                mock.call('/boot/' + source['configuration_name']),
+                mock.call('/boot/System.map' + source['kernel_suffix']),
+                mock.call('/System.map'),
+            ])
+
+            logger.info('finished testing %s', source['package_name'])
+
+    def test_install_build_root(self):
+        '''sources.Sources(build_root = '/mnt/scratch').install()'''
+
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            build_directory = '/mnt/scratch/' + source['directory_name']
+
+            self.prepare_temporary_directory()
+            self.populate_temporary_directory_files(
+                {
+                    '/boot': [
+                        '.keep',
+                    ],
+                    build_directory: [
+                        '.config',
+                        'System.map',
+                    ],
+                    build_directory + '/arch/x86_64/boot': [
+                        'bzImage',
+                    ],
+                }
+            )
+
+            self.mock_directory_name(source['directory_name'])
+            self.mock_kernel_suffix(source['kernel_suffix'])
+            self.mock_system_utilities_mount()
+            self.mock_system_utilities_unmount()
+
+            self.wrap_os_path_lexists(self.temporary_directory_path)
+            self.wrap_os_remove(self.temporary_directory_path)
+            self.wrap_system_files_installer(self.temporary_directory_path)
+            self.mock_transaction()
+
+            self.prepare_sources(source['name'], build_root = '/mnt/scratch')
+
+            self.s.install()
+
+            self.assertEqual(
+                self.expected_contents[build_directory + '/.config'],
+                self.actual_contents('/boot/{0}'.format(source['configuration_name'])),
+            )
+
+            self.assertEqual(
+                self.expected_contents[build_directory + '/System.map'],
+                self.actual_contents('/System.map'),
+            )
+
             logger.info('finished testing %s', source['package_name'])
@@ -0,0 +1,204 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import logging
+import mock
+import os
+
+from upkern.system import vdb
+
+from test_upkern.test_fixtures.test_sources import SOURCES
+from test_upkern.test_functional import TestBaseFunctional
+
+logger = logging.getLogger(__name__)
+
+ORIGINALS = {
+    'vdb._versions': vdb._versions,
+    'vdb._walk': vdb._walk,
+}
+
+
+class TestOwners(TestBaseFunctional):
+    mocks_mask = TestBaseFunctional.mocks_mask
+    mocks = TestBaseFunctional.mocks
+
+    mocks.add('vdb._walk')
+    def wrap_vdb_walk(self):
+        if 'vdb._walk' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.system.vdb._walk', side_effect = ORIGINALS['vdb._walk'])
+
+        self.addCleanup(_.stop)
+
+        self.wrapped_vdb_walk = _.start()
+
+    def populate_vdb(self, source_directories, package_names):
+        for directory, package_name in zip(source_directories, package_names):
+            real_directory_path = os.path.normpath(self.temporary_directory_path + '/var/db/pkg/' + package_name)
+
+            os.makedirs(real_directory_path)
+
+            with open(os.path.join(real_directory_path, 'CONTENTS'), 'w') as fh:
+                fh.write('dir /usr\n')
+                fh.write('dir /usr/src\n')
+                fh.write('dir /usr/src/{0}\n'.format(directory))
+                fh.write('obj /usr/src/{0}/Makefile d41d8cd98f00b204e9800998ecf8427e 1388534400\n'.format(directory))
+
+    def prepare_paths(self):
+        self.prepare_temporary_directory()
+
+        self.populate_temporary_directory_files({ '/var/db/pkg/sys-apps/portage-2.2.7': [ 'CONTENTS' ] })
+
+        for name, value in ( ( 'VDB_DIRECTORY', '/var/db/pkg' ), ( 'OWNERS_INDEX', '/var/cache/upkern/owners.json' ) ):
+            _ = mock.patch.object(vdb, name, os.path.normpath(self.temporary_directory_path + value))
+
+            self.addCleanup(_.stop)
+
+            _.start()
+
+    def test_owners_batched(self):
+        '''system.vdb.owners()—single walk'''
+
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            self.prepare_paths()
+
+            self.populate_vdb(source['source_directories'], source['package_names'])
+            self.wrap_vdb_walk()
+
+            paths = [ '/usr/src/' + _ for _ in source['source_directories'] ]
+
+            self.assertEqual(dict(zip(paths, source['package_names'])), vdb.owners(paths))
+
+            self.wrapped_vdb_walk.assert_called_once_with(paths)
+
+            logger.info('finished testing %s', source['package_name'])
+
+    def test_owners_indexed(self):
+        '''system.vdb.owners()—indexed'''
+
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            self.prepare_paths()
+
+            self.populate_vdb(source['source_directories'], source['package_names'])
+            self.wrap_vdb_walk()
+
+            paths = [ '/usr/src/' + _ for _ in source['source_directories'] ]
+
+            vdb.owners(paths)
+            vdb.owners(paths)
+
+            self.assertEqual(1, self.wrapped_vdb_walk.call_count)
+
+            logger.info('finished testing %s', source['package_name'])
+
+    def test_owners_stale_index(self):
+        '''system.vdb.owners()—stale index'''
+
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            self.prepare_paths()
+
+            self.populate_vdb(source['source_directories'], source['package_names'])
+            self.wrap_vdb_walk()
+
+            paths = [ '/usr/src/' + _ for _ in source['source_directories'] ]
+
+            vdb.owners(paths)
+
+            _ = os.stat(vdb.VDB_DIRECTORY).st_mtime + 1
+            os.utime(vdb.VDB_DIRECTORY, ( _, _ ))
+
+            vdb.owners(paths)
+
+            self.assertEqual(2, self.wrapped_vdb_walk.call_count)
+
+            logger.info('finished testing %s', source['package_name'])
+
+
+class TestInstalled(TestOwners):
+    mocks_mask = TestOwners.mocks_mask
+    mocks = TestOwners.mocks
+
+    mocks.add('vdb._versions')
+    def wrap_vdb_versions(self):
+        if 'vdb._versions' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.system.vdb._versions', side_effect = ORIGINALS['vdb._versions'])
+
+        self.addCleanup(_.stop)
+
+        self.wrapped_vdb_versions = _.start()
+
+    def prepare_paths(self):
+        super(TestInstalled, self).prepare_paths()
+
+        _ = mock.patch.object(vdb, 'INSTALLED_INDEX', os.path.normpath(self.temporary_directory_path + '/var/cache/upkern/installed.json'))
+
+        self.addCleanup(_.stop)
+
+        _.start()
+
+        for cpv, slot, counter in (
+                ( 'sys-boot/grub-0.97-r12', '0', '10' ),
+                ( 'sys-boot/grub-2.00-r7', '2/2.00', '20' ),
+                ( 'sys-boot/grub-static-0.97-r12', '0', '30' ),
+                ):
+            real_directory_path = os.path.normpath(self.temporary_directory_path + '/var/db/pkg/' + cpv)
+
+            os.makedirs(real_directory_path)
+
+            for name, value in ( ( 'SLOT', slot ), ( 'COUNTER', counter ) ):
+                with open(os.path.join(real_directory_path, name), 'w') as fh:
+                    fh.write(value + '\n')
+
+    def test_installed(self):
+        '''system.vdb.installed()'''
+
+        self.prepare_paths()
+
+        self.assertEqual(
+                {
+                    'sys-boot/grub': [
+                        vdb.Installed('sys-boot/grub-0.97-r12', '0', 10),
+                        vdb.Installed('sys-boot/grub-2.00-r7', '2', 20),
+                    ],
+                    'sys-boot/lilo': [],
+                    'sys-kernel/dracut': [],
+                },
+                vdb.installed([ 'sys-boot/grub', 'sys-boot/lilo', 'sys-kernel/dracut' ])
+                )
+
+    def test_installed_indexed(self):
+        '''system.vdb.installed()—indexed'''
+
+        self.prepare_paths()
+        self.wrap_vdb_versions()
+
+        vdb.installed([ 'sys-boot/grub' ])
+        vdb.installed([ 'sys-boot/grub' ])
+
+        self.wrapped_vdb_versions.assert_called_once_with('sys-boot/grub')
+
+    def test_installed_stale_index(self):
+        '''system.vdb.installed()—stale index'''
+
+        self.prepare_paths()
+        self.wrap_vdb_versions()
+
+        vdb.installed([ 'sys-boot/grub' ])
+
+        _ = os.stat(vdb.VDB_DIRECTORY).st_mtime + 1
+        os.utime(vdb.VDB_DIRECTORY, ( _, _ ))
+
+        vdb.installed([ 'sys-boot/grub' ])
+
+        self.assertEqual(2, self.wrapped_vdb_versions.call_count)
@@ -33,14 +33,22 @@ class TestBaseUnit(unittest.TestCase):
 
         self.mocked_system_portage_emerge = _.start()
 
-    mocks.add('subprocess.call')
-    def mock_subprocess_call(self, result = 0):
-        if 'subprocess.call' in self.mocks_mask:
+    mocks.add('system.commands.run')
+    def mock_system_commands_run(self, result = 0):
+        if 'system.commands.run' in self.mocks_mask:
             return
 
-        _ = mock.patch(self.__module__.replace('test_', '').replace('.unit', '') + '.subprocess.call')
+        module_name = self.__module__.replace('test_', '').replace('.unit', '').split('.')
+        module_name.extend([ 'system', 'commands', 'run' ])
+
+        known_symbols = set()
+        module_name = '.'.join([ _ for _ in module_name if _ not in known_symbols and not known_symbols.add(_) ])
+
+        logger.debug('module_name: %s', module_name)
+
+        _ = mock.patch(module_name)
 
         self.addCleanup(_.stop)
 
-        self.mocked_subprocess_call = _.start()
-        self.mocked_subprocess_call.return_value = result
+        self.mocked_system_commands_run = _.start()
+        self.mocked_system_commands_run.return_value = result
@@ -0,0 +1,181 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import mock
+import unittest
+
+from upkern import application
+from upkern.arguments import ARGUMENTS
+from upkern.bootloader.bootloaders.grub import Grub
+
+
+class TestRun(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    mocks.add('journal')
+    def mock_journal(self):
+        if 'journal' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.application.journal')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_journal = _.start()
+
+    mocks.add('transaction')
+    def mock_transaction(self):
+        if 'transaction' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.application.transaction')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_transaction = _.start()
+
+    mocks.add('system')
+    def mock_system(self):
+        if 'system' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.application.system')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_system = _.start()
+
+    mocks.add('Sources')
+    def mock_sources(self):
+        if 'Sources' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.application.Sources')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_sources = _.start()
+        self.mocked_sources.return_value.binary_name = 'bzImage-3.12.6-gentoo'
+        self.mocked_sources.return_value.up_to_date = False
+
+    mocks.add('InitialRAMFileSystem')
+    def mock_initial_ram_file_system(self):
+        if 'InitialRAMFileSystem' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.application.InitialRAMFileSystem')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_initial_ram_file_system = _.start()
+
+    mocks.add('BootLoader')
+    def mock_bootloader(self, bootloader):
+        if 'BootLoader' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.application.BootLoader')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_bootloader = _.start()
+        self.mocked_bootloader.return_value = bootloader
+
+    def test_run_bootloader(self):
+        '''application.run()—bootloader phase'''
+
+        self.mock_journal()
+        self.mock_transaction()
+        self.mock_system()
+        self.mock_sources()
+        self.mock_initial_ram_file_system()
+
+        grub = mock.create_autospec(Grub, instance = True)
+
+        self.mock_bootloader(grub)
+
+        application.run(ARGUMENTS.parse_args([ '--initramfs', '-o', 'quiet' ]))
+
+        grub.prepare.assert_called_once_with(kernel = 'bzImage-3.12.6-gentoo', kernel_options = 'quiet', initrd = True)
+        grub.install.assert_called_once_with()
+
+        self.mocked_transaction.commit.assert_called_once_with()
+        self.assertFalse(self.mocked_transaction.rollback.called)
+
+    def test_run_bootloader_none(self):
+        '''application.run()—no bootloader installed'''
+
+        self.mock_journal()
+        self.mock_transaction()
+        self.mock_system()
+        self.mock_sources()
+
+        self.mock_bootloader(None)
+
+        application.run(ARGUMENTS.parse_args([]))
+
+        self.mocked_transaction.commit.assert_called_once_with()
+        self.assertFalse(self.mocked_transaction.rollback.called)
+
+    def test_run_up_to_date(self):
+        '''application.run()—kernel already installed'''
+
+        self.mock_journal()
+        self.mock_transaction()
+        self.mock_system()
+        self.mock_sources()
+        self.mock_initial_ram_file_system()
+
+        self.mocked_sources.return_value.up_to_date = True
+
+        grub = mock.create_autospec(Grub, instance = True)
+
+        self.mock_bootloader(grub)
+
+        application.run(ARGUMENTS.parse_args([ '--initramfs' ]))
+
+        self.assertFalse(self.mocked_sources.return_value.build.called)
+        self.assertFalse(self.mocked_sources.return_value.install.called)
+        self.assertFalse(self.mocked_initial_ram_file_system.called)
+        self.assertFalse(self.mocked_bootloader.called)
+
+        self.mocked_transaction.commit.assert_called_once_with()
+
+    def test_run_recover_failure(self):
+        '''application.run()—transaction recovery fails'''
+
+        self.mock_journal()
+        self.mock_transaction()
+        self.mock_system()
+
+        self.mocked_transaction.recover.side_effect = RuntimeError('another upkern run holds the transaction')
+
+        self.assertRaises(RuntimeError, application.run, ARGUMENTS.parse_args([]))
+
+        self.mocked_transaction.rollback.assert_called_once_with()
+        self.mocked_system.boot.release.assert_called_once_with()
+
+        self.assertFalse(self.mocked_journal.record.called)
+        self.mocked_journal.stop.assert_called_once_with()
+
+    def test_run_release_failure(self):
+        '''application.run()—releasing /boot fails'''
+
+        self.mock_journal()
+        self.mock_transaction()
+        self.mock_system()
+        self.mock_sources()
+
+        self.mock_bootloader(None)
+
+        self.mocked_system.boot.release.side_effect = OSError('umount: /boot: target is busy')
+
+        application.run(ARGUMENTS.parse_args([]))
+
+        self.mocked_transaction.commit.assert_called_once_with()
+
+        self.assertEqual('phases', self.mocked_journal.record.call_args[0][0])
+        self.mocked_journal.stop.assert_called_once_with()
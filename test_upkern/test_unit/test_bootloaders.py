@@ -0,0 +1,54 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import mock
+import unittest
+
+from upkern import bootloaders
+from upkern.system import vdb
+
+
+class TestBootLoader(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    mocks.add('system.vdb.installed')
+    def mock_system_vdb_installed(self, installed):
+        if 'system.vdb.installed' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.bootloaders.system.vdb.installed')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_system_vdb_installed = _.start()
+        self.mocked_system_vdb_installed.return_value = installed
+
+    def test_bootloader_none(self):
+        '''bootloaders.BootLoader()—none installed'''
+
+        self.mock_system_vdb_installed({ 'sys-boot/grub': [] })
+
+        self.assertIsNone(bootloaders.BootLoader())
+
+        self.mocked_system_vdb_installed.assert_called_once_with([ 'sys-boot/grub' ])
+
+    def test_bootloader(self):
+        '''bootloaders.BootLoader()'''
+
+        self.mock_system_vdb_installed({ 'sys-boot/grub': [ vdb.Installed('sys-boot/grub-2.00-r7', '2', 20) ] })
+
+        self.assertIsInstance(bootloaders.BootLoader(), bootloaders.BOOTLOADERS['grub2'])
+
+    def test_bootloader_latest(self):
+        '''bootloaders.BootLoader()—several installed'''
+
+        for installed, expected in (
+                ( [ vdb.Installed('sys-boot/grub-0.97-r12', '0', 10), vdb.Installed('sys-boot/grub-2.00-r7', '2', 20) ], 'grub2' ),
+                ( [ vdb.Installed('sys-boot/grub-2.00-r7', '2', 20), vdb.Installed('sys-boot/grub-0.97-r12', '0', 30) ], 'grub' ),
+                ):
+            self.mock_system_vdb_installed({ 'sys-boot/grub': installed })
+
+            self.assertIsInstance(bootloaders.BootLoader(), bootloaders.BOOTLOADERS[expected])
@@ -27,28 +27,123 @@ class TestGenKernelPreparerMethods(TestBaseGenKernelPreparer, TestBaseUnit):
         mocked_options = _.start()
         mocked_options.return_value = options
 
+    mocks.add('system.boot')
+    def mock_system_boot(self):
+        if 'system.boot' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.initramfs.genkernel.system.boot')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_system_boot = _.start()
+
     def test_build_without_options(self):
         '''initramfs.genkernel.GenKernelPreparer().build()—without options'''
 
-        self.mock_subprocess_call()
+        self.mock_system_commands_run()
         self.mock_options()
+        self.mock_system_boot()
 
         self.prepare_preparer()
 
         self.p.build()
 
-        command = 'genkernel --no-ramdisk-modules initramfs'
-        self.mocked_subprocess_call.assert_called_once_with(command, shell = True)
+        command = [ 'genkernel', '--no-mountboot', '--no-ramdisk-modules', 'initramfs' ]
+        self.mocked_system_commands_run.assert_called_once_with(command)
+
+        self.mocked_system_boot.mount.assert_called_once_with()
 
     def test_build_with_options(self):
         '''initramfs.genkernel.GenKernelPreparer().build()—with options'''
 
-        self.mock_subprocess_call()
+        self.mock_system_commands_run()
         self.mock_options('--lvm --mdadm')
+        self.mock_system_boot()
 
         self.prepare_preparer()
 
         self.p.build()
 
-        command = 'genkernel --no-ramdisk-modules --lvm --mdadm initramfs'
-        self.mocked_subprocess_call.assert_called_once_with(command, shell = True)
+        command = [ 'genkernel', '--no-mountboot', '--no-ramdisk-modules', '--lvm', '--mdadm', 'initramfs' ]
+        self.mocked_system_commands_run.assert_called_once_with(command)
+
+    def test_build_kernel(self):
+        '''initramfs.genkernel.GenKernelPreparer().build()—for a given kernel'''
+
+        self.mock_system_commands_run()
+        self.mock_options()
+        self.mock_system_boot()
+
+        _ = mock.patch('upkern.initramfs.genkernel.os.path.isdir')
+
+        self.addCleanup(_.stop)
+
+        mocked_isdir = _.start()
+        mocked_isdir.return_value = True
+
+        self.prepare_preparer('3.12.6-gentoo', '/usr/src/linux-3.12.6-gentoo', '/var/tmp/upkern/build/gentoo-3.12')
+
+        self.p.build()
+
+        command = [ 'genkernel', '--no-mountboot', '--no-ramdisk-modules', '--kerneldir=/usr/src/linux-3.12.6-gentoo', '--kernel-outputdir=/var/tmp/upkern/build/gentoo-3.12', 'initramfs' ]
+        self.mocked_system_commands_run.assert_called_once_with(command)
+
+        mocked_isdir.return_value = False
+
+        self.mocked_system_commands_run.reset_mock()
+
+        self.assertRaises(RuntimeError, self.p.build)
+
+        self.assertFalse(self.mocked_system_commands_run.called)
+
+    def test_build_transaction(self):
+        '''initramfs.genkernel.GenKernelPreparer().build()—in a transaction'''
+
+        self.mock_system_commands_run()
+        self.mock_options()
+        self.mock_system_boot()
+
+        self.mocked_system_boot.BOOT_DIRECTORY = '/boot'
+        self.mocked_system_boot.inventory.side_effect = [
+                [ 'bzImage-3.12.6-gentoo', 'initramfs-genkernel-x86_64-3.10.7-gentoo', 'initramfs-genkernel-x86_64-3.12.6-gentoo' ],
+                [ 'bzImage-3.12.6-gentoo', 'initramfs-genkernel-x86_64-3.10.7-gentoo', 'initramfs-genkernel-x86_64-3.12.6-gentoo', 'initramfs-genkernel-x86_64-3.12.6-gentoo.old' ],
+                ]
+
+        _ = mock.patch('upkern.initramfs.genkernel.transaction')
+
+        self.addCleanup(_.stop)
+
+        mocked_transaction = _.start()
+        mocked_transaction.active.return_value = True
+
+        self.prepare_preparer('3.12.6-gentoo')
+
+        self.p.build()
+
+        mocked_transaction.protect.assert_called_once_with('/boot/initramfs-genkernel-x86_64-3.12.6-gentoo')
+        mocked_transaction.created.assert_called_once_with('/boot/initramfs-genkernel-x86_64-3.12.6-gentoo.old')
+
+    def test_journal(self):
+        '''initramfs.genkernel.GenKernelPreparer()—journaled steps'''
+
+        _ = mock.patch('upkern.journal.enabled')
+
+        self.addCleanup(_.stop)
+
+        _.start().return_value = True
+
+        _ = mock.patch('upkern.journal.record')
+
+        self.addCleanup(_.stop)
+
+        mocked_record = _.start()
+
+        self.prepare_preparer('3.12.6-gentoo')
+
+        self.p.configure('lvm')
+        self.p.install()
+
+        _ = [ ( call[0][0], call[1]['step'] ) for call in mocked_record.call_args_list ]
+
+        self.assertEqual([ ( 'start', 'initramfs.configure' ), ( 'stop', 'initramfs.configure' ), ( 'start', 'initramfs.install' ), ( 'stop', 'initramfs.install' ) ], _)
@@ -0,0 +1,93 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import io
+import json
+import mock
+import unittest
+
+from upkern import journal
+
+
+class TestJournal(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    mocks.add('journal._stream')
+    def mock_stream(self):
+        if 'journal._stream' in self.mocks_mask:
+            return
+
+        self.stream = io.StringIO()
+
+        _ = mock.patch.object(journal, '_stream', self.stream)
+
+        self.addCleanup(_.stop)
+
+        _.start()
+
+    def events(self):
+        return [ json.loads(_) for _ in self.stream.getvalue().splitlines() ]
+
+    def test_record_disabled(self):
+        '''journal.record()—disabled'''
+
+        self.assertFalse(journal.enabled())
+
+        journal.record('command', command = 'make', status = 0)
+
+    def test_record(self):
+        '''journal.record()'''
+
+        self.mock_stream()
+
+        journal.record('command', command = 'make', status = 0)
+
+        _ = self.events()
+
+        self.assertEqual(1, len(_))
+        self.assertEqual('command', _[0]['event'])
+        self.assertEqual('make', _[0]['command'])
+        self.assertEqual(0, _[0]['status'])
+        self.assertIn('timestamp', _[0])
+
+    def test_journaled(self):
+        '''journal.journaled()'''
+
+        self.mock_stream()
+
+        class Step(object):
+            kernel = 'linux-3.12.6-gentoo'
+
+            @journal.journaled('sources.build', lambda _: { 'kernel': _.kernel })
+            def build(self):
+                return 'built'
+
+        self.assertEqual('built', Step().build())
+
+        _ = self.events()
+
+        self.assertEqual([ 'start', 'stop' ], [ event['event'] for event in _ ])
+        self.assertEqual([ 'linux-3.12.6-gentoo' ] * 2, [ event['kernel'] for event in _ ])
+        self.assertEqual('ok', _[1]['status'])
+        self.assertIn('duration', _[1])
+
+    def test_journaled_failure(self):
+        '''journal.journaled()—failure'''
+
+        self.mock_stream()
+
+        class Step(object):
+            @journal.journaled('sources.build')
+            def build(self):
+                raise RuntimeError('kernel did not build correctly')
+
+        with self.assertRaises(RuntimeError):
+            Step().build()
+
+        _ = self.events()
+
+        self.assertEqual('failed', _[1]['status'])
+        self.assertEqual('kernel did not build correctly', _[1]['error'])
@@ -0,0 +1,102 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import collections
+import mock
+import unittest
+
+from upkern import plugins
+
+MANIFEST = {
+    'ordered': ( 'collections:OrderedDict', { 'package': 'dev-lang/python' } ),
+    'counter': ( 'collections:Counter', {} ),
+}
+
+
+class TestRegistry(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    def setUp(self):
+        super(TestRegistry, self).setUp()
+
+        self.mock_entry_points()
+        self.wrap_importlib_import_module()
+
+        self.r = plugins.Registry('upkern.tests', MANIFEST)
+
+    mocks.add('plugins._entry_points')
+    def mock_entry_points(self, entry_points = {}):
+        if 'plugins._entry_points' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.plugins._entry_points')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_entry_points = _.start()
+        self.mocked_entry_points.return_value = dict(entry_points)
+
+    mocks.add('importlib.import_module')
+    def wrap_importlib_import_module(self):
+        if 'importlib.import_module' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.plugins.importlib.import_module', side_effect = plugins.importlib.import_module)
+
+        self.addCleanup(_.stop)
+
+        self.wrapped_importlib_import_module = _.start()
+
+    def test_names(self):
+        '''plugins.Registry()—names'''
+
+        self.mocked_entry_points.return_value = { 'deque': 'collections:deque' }
+
+        self.assertEqual([ 'counter', 'deque', 'ordered' ], list(self.r))
+        self.assertEqual(3, len(self.r))
+        self.assertIn('deque', self.r)
+        self.assertNotIn('defaultdict', self.r)
+
+        self.mocked_entry_points.assert_called_once_with('upkern.tests')
+        self.assertFalse(self.wrapped_importlib_import_module.called)
+
+    def test_getitem(self):
+        '''plugins.Registry()[?]'''
+
+        self.assertIs(collections.OrderedDict, self.r['ordered'])
+        self.assertIs(collections.OrderedDict, self.r['ordered'])
+
+        self.wrapped_importlib_import_module.assert_called_once_with('collections')
+
+        self.assertFalse(self.mocked_entry_points.called)
+
+    def test_getitem_entry_point(self):
+        '''plugins.Registry()[?]—entry point'''
+
+        self.mocked_entry_points.return_value = { 'deque': 'collections:deque' }
+
+        self.assertIs(collections.deque, self.r['deque'])
+
+        self.assertRaises(KeyError, lambda: self.r['defaultdict'])
+
+    def test_setitem(self):
+        '''plugins.Registry()[?] = ?'''
+
+        self.r['defaultdict'] = collections.defaultdict
+
+        self.assertIs(collections.defaultdict, self.r['defaultdict'])
+        self.assertIn('defaultdict', list(self.r))
+
+        self.assertFalse(self.wrapped_importlib_import_module.called)
+
+    def test_metadata(self):
+        '''plugins.Registry().metadata()'''
+
+        self.assertEqual({ 'package': 'dev-lang/python' }, self.r.metadata('ordered', 'package'))
+
+        self.assertFalse(self.wrapped_importlib_import_module.called)
+
+        self.assertEqual({ 'most_common': collections.Counter.most_common }, self.r.metadata('counter', 'most_common'))
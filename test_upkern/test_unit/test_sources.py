@@ -6,7 +6,11 @@
 import copy
 import logging
 import mock
+import os
+import platform
 import random
+import shutil
+import tempfile
 import unittest
 
 from upkern import sources
@@ -32,6 +36,68 @@ class TestKernelIndex(unittest.TestCase):
         for kernel_string, result in self.kernel_strings:
             self.assertEqual(result, sources.kernel_index(kernel_string))
 
+class TestKernelSeries(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    def test_kernel_series(self):
+        '''sources.kernel_series()'''
+
+        for source in SOURCES['all']:
+            self.assertEqual(source['kernel_series'], sources.kernel_series(source['directory_name']))
+
+class TestKernelVersion(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    def test_kernel_version_ordering(self):
+        '''sources.KernelVersion() ordering'''
+
+        expected = [
+            'linux-2.6.32.61-gentoo',
+            'linux-3.10.7-gentoo',
+            'linux-3.10.7-gentoo-r1',
+            'linux-3.10.7-gentoo-r10',
+            'linux-3.12-gentoo',
+            'linux-3.12.6-gentoo',
+            'linux-3.13.0-rc1-git',
+            'linux-3.13.0-rc10-git',
+            'linux-3.13-gentoo',
+            'linux-3.13.1',
+        ]
+
+        self.assertEqual(expected, sorted(reversed(expected), key = sources.kernel_version))
+
+    def test_kernel_version_equality(self):
+        '''sources.KernelVersion() equality'''
+
+        self.assertEqual(sources.KernelVersion('linux-3.12-gentoo'), sources.KernelVersion('config-3.12.0-gentoo'))
+        self.assertNotEqual(sources.KernelVersion('linux-3.12.6-gentoo'), sources.KernelVersion('linux-3.12.6-hardened'))
+
+    def test_kernel_version_fields(self):
+        '''sources.KernelVersion() fields'''
+
+        _ = sources.KernelVersion('linux-3.13.0-rc8-git-r2')
+
+        self.assertEqual(( 3, 13, 0 ), _.numbers)
+        self.assertEqual(8, _.rc)
+        self.assertEqual('git', _.flavour)
+        self.assertEqual(2, _.revision)
+
+    def test_kernel_version_other_types(self):
+        '''sources.KernelVersion() compared with other types'''
+
+        _ = sources.KernelVersion('linux-3.12.6-gentoo')
+
+        self.assertNotEqual('linux-3.12.6-gentoo', _)
+        self.assertFalse(_ == ( ( 3, 12, 6 ), True, 0, 'gentoo', 0 ))
+        self.assertRaises(TypeError, lambda: _ < 'linux-3.13.0-gentoo')
+
+    def test_kernel_version_memoized(self):
+        '''sources.kernel_version() memoized'''
+
+        self.assertIs(sources.kernel_version('linux-3.12.6-gentoo'), sources.kernel_version('linux-3.12.6-gentoo'))
+
 class TestSourcesConstructor(unittest.TestCase):
     mocks_mask = set()
     mocks = set()
@@ -55,20 +121,17 @@ class TestSourcesProperties(TestBaseSources):
     mocks_mask = TestBaseSources.mocks_mask
     mocks = TestBaseSources.mocks
 
-    mocks.add('gentoolkit.helpers.FileOwner')
-    def mock_gentoolkit_helpers_fileowner(self, package_names):
-        if 'gentoolkit.helpers.FileOwner' in self.mocks_mask:
+    mocks.add('system.vdb.owners')
+    def mock_system_vdb_owners(self, source_directories, package_names):
+        if 'system.vdb.owners' in self.mocks_mask:
             return
 
-        _ = mock.patch('upkern.sources.gentoolkit.helpers.FileOwner')
+        _ = mock.patch('upkern.sources.system.vdb.owners')
 
         self.addCleanup(_.stop)
 
-        self.mocked_gentoolkit_helpers_fileowner = _.start()
-
-        self.mocked_finder = mock.MagicMock()
-        self.mocked_gentoolkit_helpers_fileowner.return_value = self.mocked_finder
-        self.mocked_finder.side_effect = [ [ ( _, ) ] for _ in package_names ] # flake8: noqa
+        self.mocked_system_vdb_owners = _.start()
+        self.mocked_system_vdb_owners.return_value = dict(zip([ '/usr/src/' + _ for _ in source_directories ], package_names))
 
     mocks.add('os.listdir')
     def mock_os_listdir(self, source_directories):
@@ -87,13 +150,25 @@ class TestSourcesProperties(TestBaseSources):
         if 'portage.config' in self.mocks_mask:
             return
 
-        _ = mock.patch('upkern.sources.portage.config')
+        _ = mock.patch('portage.config')
 
         self.addCleanup(_.stop)
 
         self.mocked_portage_config = _.start()
         self.mocked_portage_config.return_value = portage_configuration
 
+        _ = mock.patch('upkern.system.portage.MAKE_CONF', ())
+
+        self.addCleanup(_.stop)
+
+        _.start()
+
+        _ = mock.patch.object(sources.system.portage, '_settings', None)
+
+        self.addCleanup(_.stop)
+
+        _.start()
+
     mocks.add('Sources.source_directories')
     def mock_source_directories(self, source_directories):
         if 'Sources.source_directories' in self.mocks_mask:
@@ -120,6 +195,55 @@ class TestSourcesProperties(TestBaseSources):
 
             logger.info('finished testing %s', source['package_name'])
 
+    def test_build_directory(self):
+        '''sources.Sources().build_directory'''
+
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            self.mock_directory_name(source['directory_name'])
+
+            self.prepare_sources(source['name'])
+
+            self.assertEqual('/usr/src/linux', self.s.build_directory)
+            self.assertEqual([], self.s.build_options)
+
+            logger.info('finished testing %s', source['package_name'])
+
+    def test_build_directory_incremental(self):
+        '''sources.Sources(incremental = True).build_directory'''
+
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            self.mock_directory_name(source['directory_name'])
+
+            self.prepare_sources(source['name'], incremental = True)
+
+            self.assertEqual('/var/tmp/upkern/build/' + source['kernel_series'], self.s.build_directory)
+            self.assertEqual([ '-f', '/usr/src/linux/Makefile', 'KBUILD_SRC=/usr/src/linux' ], self.s.build_options)
+
+            logger.info('finished testing %s', source['package_name'])
+
+    def test_build_directory_build_root(self):
+        '''sources.Sources(build_root = ?).build_directory'''
+
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            self.mock_directory_name(source['directory_name'])
+
+            self.prepare_sources(source['name'], build_root = '/mnt/scratch')
+
+            self.assertEqual('/mnt/scratch/' + source['directory_name'], self.s.build_directory)
+            self.assertEqual([ '-f', '/usr/src/linux/Makefile', 'KBUILD_SRC=/usr/src/linux' ], self.s.build_options)
+
+            self.prepare_sources(source['name'], build_root = '/mnt/scratch', incremental = True)
+
+            self.assertEqual('/mnt/scratch/' + source['kernel_series'], self.s.build_directory)
+
+            logger.info('finished testing %s', source['package_name'])
+
     def test_configuration_name(self):
         '''sources.Sources().configuration_name'''
 
@@ -143,6 +267,7 @@ class TestSourcesProperties(TestBaseSources):
             _ = copy.copy(source['configuration_files'])
             random.shuffle(_)
             self.mock_os_listdir(_)
+            self.mock_system_boot()
             self.mock_system_utilities_mount()
             self.mock_system_utilities_unmount()
 
@@ -158,7 +283,7 @@ class TestSourcesProperties(TestBaseSources):
         for source in SOURCES['all']:
             logger.info('testing %s', source['package_name'])
 
-            self.mock_gentoolkit_helpers_fileowner(source['package_names'])
+            self.mock_system_vdb_owners(source['source_directories'], source['package_names'])
             self.mock_package_name(source['package_name'])
             self.mock_source_directories(source['source_directories'])
 
@@ -166,6 +291,49 @@ class TestSourcesProperties(TestBaseSources):
 
             self.assertEqual(source['directory_name'], self.s.directory_name)
 
+            self.mocked_system_vdb_owners.assert_called_once_with([ '/usr/src/' + _ for _ in source['source_directories'] ])
+
+            logger.info('finished testing %s', source['package_name'])
+
+    def test_fingerprint(self):
+        '''sources.Sources().fingerprint'''
+
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            self.mock_directory_name(source['directory_name'])
+            self.mock_package_name(source['package_name'])
+            self.mock_portage_config({ 'MAKEOPTS': '-j5 -l4 V=1' })
+
+            _ = mock.patch('upkern.sources.system.kconfig.parse')
+
+            self.addCleanup(_.stop)
+
+            mocked_parse = _.start()
+            mocked_parse.return_value = { 'EXT4_FS': 'm' }
+
+            _ = mock.patch('upkern.sources.system.make.compiler_version')
+
+            self.addCleanup(_.stop)
+
+            mocked_compiler_version = _.start()
+            mocked_compiler_version.return_value = 'gcc (Gentoo 4.7.3-r1 p1.4, pie-0.5.5) 4.7.3'
+
+            self.prepare_sources(source['name'])
+
+            _ = self.s.fingerprint
+
+            mocked_parse.assert_called_once_with('/usr/src/linux/.config')
+
+            self.assertEqual(source['package_name'].lstrip('='), _['package'])
+            self.assertEqual(source['directory_name'], _['sources'])
+            self.assertEqual('gcc (Gentoo 4.7.3-r1 p1.4, pie-0.5.5) 4.7.3', _['compiler'])
+            self.assertEqual([ 'V=1' ], _['options'])
+
+            mocked_parse.return_value = { 'EXT4_FS': 'y' }
+
+            self.assertNotEqual(_['configuration'], self.s.fingerprint['configuration'])
+
             logger.info('finished testing %s', source['package_name'])
 
     def test_kernel_suffix(self):
@@ -182,13 +350,47 @@ class TestSourcesProperties(TestBaseSources):
 
             logger.info('finished testing %s', source['package_name'])
 
+    def test_make_options(self):
+        '''sources.Sources().make_options'''
+
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            self.mock_portage_config(source['portage_configuration'])
+
+            self.prepare_sources(source['name'])
+
+            self.assertEqual(source['portage_configuration']['MAKEOPTS'], self.s.make_options)
+
+            logger.info('finished testing %s', source['package_name'])
+
+    def test_make_options_planned(self):
+        '''sources.Sources(plan_jobs = True).make_options'''
+
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            self.mock_portage_config(source['portage_configuration'])
+
+            _ = mock.patch('upkern.sources.system.make.plan')
+
+            self.addCleanup(_.stop)
+
+            _.start().return_value = ( 64, 64 )
+
+            self.prepare_sources(source['name'], plan_jobs = True)
+
+            self.assertEqual('-j64 -l64', self.s.make_options)
+
+            logger.info('finished testing %s', source['package_name'])
+
     def test_package_name(self):
         '''sources.Sources().package_name'''
 
         for source in SOURCES['all']:
             logger.info('testing %s', source['package_name'])
 
-            self.mock_gentoolkit_helpers_fileowner(source['package_names'])
+            self.mock_system_vdb_owners(source['source_directories'], source['package_names'])
             self.mock_source_directories(source['source_directories'])
 
             self.prepare_sources(source['name'])
@@ -197,6 +399,28 @@ class TestSourcesProperties(TestBaseSources):
 
             logger.info('finished testing %s', source['package_name'])
 
+    def test_package_name_unowned(self):
+        '''sources.Sources().package_name—unowned source directories'''
+
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            self.mock_system_vdb_owners([ 'linux-9.9.9-gentoo' ] + source['source_directories'], [ None ] + source['package_names'])
+            self.mock_source_directories([ 'linux-9.9.9-gentoo' ] + source['source_directories'])
+
+            self.prepare_sources(source['name'])
+
+            self.assertEqual(source['package_name'], self.s.package_name)
+
+            logger.info('finished testing %s', source['package_name'])
+
+        self.mock_system_vdb_owners([ 'linux-9.9.9-gentoo' ], [ None ])
+        self.mock_source_directories([ 'linux-9.9.9-gentoo' ])
+
+        self.prepare_sources()
+
+        self.assertRaises(RuntimeError, getattr, self.s, 'package_name')
+
     def test_portage_configuration(self):
         '''sources.Sources().portage_configuration'''
 
@@ -229,6 +453,81 @@ class TestSourcesProperties(TestBaseSources):
 
             logger.info('finished testing %s', source['package_name'])
 
+    def _up_to_date_wrapper(self, installed, exists = True):
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            self.mock_binary_name(source['binary_name'])
+            self.mock_fingerprint({ 'sources': source['directory_name'] })
+
+            _ = mock.patch('upkern.sources.system.boot.mount')
+
+            self.addCleanup(_.stop)
+
+            _.start()
+
+            _ = mock.patch('upkern.sources.open', mock.mock_open(read_data = installed), create = True)
+
+            self.addCleanup(_.stop)
+
+            mocked_open = _.start()
+
+            _ = mock.patch('upkern.sources.os.path.exists')
+
+            self.addCleanup(_.stop)
+
+            _.start().return_value = exists
+
+            self.prepare_sources(source['name'])
+
+            result = self.s.up_to_date
+
+            mocked_open.assert_called_once_with('/boot/' + source['binary_name'] + '.fingerprint', 'r')
+
+            logger.info('finished testing %s', source['package_name'])
+
+            yield source, result
+
+    def test_up_to_date(self):
+        '''sources.Sources().up_to_date'''
+
+        for source, result in self._up_to_date_wrapper('{"sources": "linux-3.12.6-gentoo"}'):
+            self.assertEqual(source['directory_name'] == 'linux-3.12.6-gentoo', result)
+
+    def test_up_to_date_configuration_changed(self):
+        '''sources.Sources().up_to_date—configuration changed'''
+
+        _ = mock.patch('upkern.sources.system.kconfig.parse')
+
+        self.addCleanup(_.stop)
+
+        _.start().side_effect = lambda path: { 'EXT4_FS': 'y' } if path.startswith('/boot/') else { 'EXT4_FS': 'm', 'XFS_FS': 'm' }
+
+        _ = mock.patch('upkern.sources.journal.record')
+
+        self.addCleanup(_.stop)
+
+        mocked_record = _.start()
+
+        self.mock_directory_name('linux-3.12.6-gentoo')
+
+        for source, result in self._up_to_date_wrapper('{"configuration": "f00"}'):
+            self.assertFalse(result)
+
+            mocked_record.assert_called_with('rebuild', reasons = [ 'configuration', 'sources' ], added = [ 'XFS_FS' ], removed = [], changed = [ 'EXT4_FS' ])
+
+    def test_up_to_date_without_binary(self):
+        '''sources.Sources().up_to_date—without binary'''
+
+        for source, result in self._up_to_date_wrapper('{"sources": "linux-3.12.6-gentoo"}', exists = False):
+            self.assertFalse(result)
+
+    def test_up_to_date_without_fingerprint(self):
+        '''sources.Sources().up_to_date—corrupt fingerprint'''
+
+        for source, result in self._up_to_date_wrapper(''):
+            self.assertFalse(result)
+
     def test_system_map_name(self):
         '''sources.Sources().system_map_name'''
 
@@ -253,7 +552,7 @@ class TestSourcesMethod(TestBaseSources, TestBaseUnit):
         if 'gentoolkit.query.Query' in self.mocks_mask:
             return
 
-        _ = mock.patch('upkern.sources.gentoolkit.query.Query')
+        _ = mock.patch('gentoolkit.query.Query')
 
         self.addCleanup(_.stop)
 
@@ -275,6 +574,29 @@ class TestSourcesMethod(TestBaseSources, TestBaseUnit):
         mocked_portage_configuration = _.start()
         mocked_portage_configuration.return_value = portage_configuration
 
+    mocks.add('system.make')
+    def mock_system_make(self):
+        if 'system.make' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.sources.system.make.JobServer')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_system_make_jobserver = _.start()
+
+        _ = mock.patch('upkern.sources.system.make.Stage')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_system_make_stage = _.start()
+
+        _ = mock.patch('upkern.sources.system.make.Output')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_system_make_output = _.start()
+
     def test_build(self):
         '''sources.Sources().build()'''
 
@@ -282,44 +604,385 @@ class TestSourcesMethod(TestBaseSources, TestBaseUnit):
             logger.info('testing %s', source['package_name'])
 
             self.mock_portage_configuration(source['portage_configuration'])
-            self.mock_subprocess_call()
+            self.mock_system_make()
+            self.mock_fingerprint()
+            self.mock_kernel_suffix(source['kernel_suffix'])
+            self.mock_transaction()
+
+            self.prepare_sources(source['name'])
+
+            self.s.build()
+
+            self.mocked_system_make_jobserver.assert_called_once_with(5)
+
+            self.mocked_transaction.protect.assert_called_once_with('/lib/modules/' + source['kernel_suffix'].lstrip('-'))
+
+            jobserver = self.mocked_system_make_jobserver.return_value
+            output = self.mocked_system_make_output.return_value
+
+            _ = [
+                mock.call('image', [ 'bzImage' ], [], '/usr/src/linux', jobserver, {}, output),
+                mock.call().run(),
+                mock.call('modules', [ 'modules' ], [], '/usr/src/linux', jobserver, {}, output),
+                mock.call().run(),
+                mock.call('modules_install', [ 'modules_install' ], [], '/usr/src/linux', jobserver, {}, output),
+                mock.call().start(),
+            ]
+            self.mocked_system_make_stage.assert_has_calls(_)
+
+            self.assertTrue(self.s.built)
+
+    def test_build_quiet(self):
+        '''sources.Sources().build()—logging quietly'''
+
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            self.mock_portage_configuration(source['portage_configuration'])
+            self.mock_system_make()
+            self.mock_fingerprint()
+            self.mock_kernel_suffix(source['kernel_suffix'])
+            self.mock_transaction()
+
+            _ = logging.getLogger('upkern').level
+
+            logging.getLogger('upkern').setLevel(logging.WARNING)
+
+            self.addCleanup(logging.getLogger('upkern').setLevel, _)
 
             self.prepare_sources(source['name'])
 
             self.s.build()
 
-            command = 'make {0} && make {0} modules_install'.format(source['portage_configuration']['MAKEOPTS'])
-            self.mocked_subprocess_call.assert_called_once_with(command, shell = True)
+            self.assertFalse(self.mocked_system_make_output.call_args_list[0][0][1])
+            self.assertEqual({ 'echo': False }, self.mocked_system_make_output.call_args_list[1][1])
+
+    def test_finish_modules_install(self):
+        '''sources.Sources().finish_modules_install()'''
+
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            self.mock_portage_configuration(source['portage_configuration'])
+            self.mock_system_make()
+            self.mock_fingerprint()
+            self.mock_kernel_suffix(source['kernel_suffix'])
+            self.mock_transaction()
+
+            self.prepare_sources(source['name'])
+
+            self.s.build()
+
+            stage = self.mocked_system_make_stage.return_value.start.return_value
+
+            self.assertFalse(stage.wait.called)
+
+            self.s.finish_modules_install()
+            self.s.finish_modules_install()
+
+            stage.wait.assert_called_once_with()
+            self.mocked_system_make_jobserver.return_value.close.assert_called_once_with()
+
+            self.assertIn(stage, self.s.stages)
+
+    def test_import_archive(self):
+        '''sources.Sources().import_archive()'''
+
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            _ = mock.patch('upkern.sources.system.artifacts.unpack')
+
+            self.addCleanup(_.stop)
+
+            mocked_unpack = _.start()
+            mocked_unpack.return_value = (
+                    {
+                        'package': source['package_name'].lstrip('='),
+                        'kernel': source['directory_name'],
+                        'release': source['kernel_suffix'].lstrip('-'),
+                        'fingerprint': { 'architecture': platform.machine() },
+                    },
+                    { 'bzImage': '/tmp/upkern/bzImage', 'modules.tar.gz': '/tmp/upkern/modules.tar.gz' },
+                    )
+
+            check = mock.patch('upkern.sources.system.artifacts.check_modules')
+
+            self.addCleanup(check.stop)
+
+            mocked_check_modules = check.start()
+
+            s = sources.Sources()
+
+            s.import_archive('/tmp/kernel.tar.gz', '/tmp/upkern')
+
+            mocked_unpack.assert_called_once_with('/tmp/kernel.tar.gz', '/tmp/upkern')
+            mocked_check_modules.assert_called_once_with('/tmp/upkern/modules.tar.gz', source['kernel_suffix'].lstrip('-'))
+
+            self.assertEqual(source['package_name'], s.package_name)
+            self.assertEqual(source['directory_name'], s.directory_name)
+            self.assertEqual('/lib/modules/' + source['kernel_suffix'].lstrip('-'), s.modules_directory)
+            self.assertTrue(s.built)
+
+            _.stop()
+            check.stop()
+
+    def test_import_archive_architecture(self):
+        '''sources.Sources().import_archive()—other architecture'''
+
+        _ = mock.patch('upkern.sources.system.artifacts.unpack')
+
+        self.addCleanup(_.stop)
+
+        mocked_unpack = _.start()
+        mocked_unpack.return_value = (
+                {
+                    'package': 'sys-kernel/gentoo-sources-3.12.6',
+                    'kernel': 'linux-3.12.6-gentoo',
+                    'fingerprint': { 'architecture': 'pdp11' },
+                },
+                {},
+                )
+
+        s = sources.Sources()
+
+        self.assertRaises(RuntimeError, s.import_archive, '/tmp/kernel.tar.gz', '/tmp/upkern')
+
+        self.assertFalse(s.built)
+
+    def test_import_archive_release(self):
+        '''sources.Sources().import_archive()—release escaping /lib/modules'''
+
+        _ = mock.patch('upkern.sources.system.artifacts.unpack')
+
+        self.addCleanup(_.stop)
+
+        mocked_unpack = _.start()
+        mocked_unpack.return_value = (
+                {
+                    'package': 'sys-kernel/gentoo-sources-3.12.6',
+                    'kernel': 'linux-3.12.6-gentoo',
+                    'release': '../../etc',
+                },
+                { 'modules.tar.gz': '/tmp/upkern/modules.tar.gz' },
+                )
+
+        _ = mock.patch('upkern.sources.system.artifacts.check_modules')
+
+        self.addCleanup(_.stop)
+
+        mocked_check_modules = _.start()
+
+        s = sources.Sources()
+
+        self.assertRaises(RuntimeError, s.import_archive, '/tmp/kernel.tar.gz', '/tmp/upkern')
+
+        self.assertFalse(mocked_check_modules.called)
+        self.assertFalse(s.built)
+
+    def test_build_with_artifact_cache(self):
+        '''sources.Sources(artifact_cache = ?).build()—cached'''
+
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            self.mock_portage_configuration(source['portage_configuration'])
+            self.mock_system_make()
+            self.mock_fingerprint()
+
+            _ = mock.patch('upkern.sources.system.artifacts.ArtifactCache')
+
+            self.addCleanup(_.stop)
+
+            mocked_artifact_cache = _.start()
+            mocked_artifact_cache.return_value.fetch.return_value = {
+                    'modules.tar.gz': '/var/cache/upkern/artifacts/f00/modules.tar.gz',
+                    'release': '3.12.6-gentoo-custom',
+                    }
+
+            for name in ( 'transaction', 'system.artifacts.extract_modules' ):
+                _ = mock.patch('upkern.sources.' + name)
+
+                self.addCleanup(_.stop)
+
+                _.start()
+
+            mocked_extract_modules = sources.system.artifacts.extract_modules
+
+            self.prepare_sources(source['name'], artifact_cache = '/var/cache/upkern/artifacts')
+
+            self.s.build()
+
+            mocked_artifact_cache.assert_called_once_with('/var/cache/upkern/artifacts')
+            mocked_artifact_cache.return_value.fetch.assert_called_once_with({})
+
+            self.assertFalse(self.mocked_system_make_stage.called)
+            self.assertTrue(self.s.built)
+
+            self.assertEqual('/lib/modules/3.12.6-gentoo-custom', self.s.modules_directory)
+
+            mocked_extract_modules.assert_called_once_with('/var/cache/upkern/artifacts/f00/modules.tar.gz', '/lib/modules', '3.12.6-gentoo-custom')
+
+            self.s.finish_modules_install()
+            self.s._extract_cached_modules()
+
+            self.assertEqual(1, mocked_extract_modules.call_count)
+
+    def test_prepare_unchanged_configuration(self):
+        '''sources.Sources().prepare()—configuration already compared'''
+
+        directory = tempfile.mkdtemp()
+
+        self.addCleanup(shutil.rmtree, directory)
+
+        self.mock_directory_name('linux-3.12.21-gentoo-r1')
+
+        for name in ( '_setup_symlink', '_copy_configuration' ):
+            _ = mock.patch.object(sources.Sources, name)
+
+            self.addCleanup(_.stop)
+
+            _.start()
+
+        _ = mock.patch('upkern.sources.system.kconfig.symbols')
+
+        self.addCleanup(_.stop)
+
+        mocked_symbols = _.start()
+        mocked_symbols.return_value = {}
+
+        self.addCleanup(sources.logger.setLevel, sources.logger.level)
+
+        sources.logger.setLevel(logging.INFO)
+
+        with open(os.path.join(directory, '.config'), 'w') as fh:
+            fh.write('CONFIG_64BIT=y\n')
+
+        self.prepare_sources(build_root = directory)
+
+        with mock.patch.object(sources.Sources, 'build_directory', mock.PropertyMock(return_value = directory)):
+            self.s.prepare(None)
+
+            self.assertEqual(1, mocked_symbols.call_count)
+
+            self.s.prepare(None)
+
+            self.assertEqual(1, mocked_symbols.call_count)
+
+            with open(os.path.join(directory, '.config'), 'a') as fh:
+                fh.write('CONFIG_SMP=y\n')
+
+            self.s.prepare(None)
+
+            self.assertEqual(2, mocked_symbols.call_count)
+
+    def test_comparison_path(self):
+        '''sources.Sources()._comparison_path'''
+
+        self.mock_directory_name('linux-3.12.6-gentoo')
+
+        self.prepare_sources()
+
+        self.assertEqual('/var/lib/upkern/configuration.json', self.s._comparison_path)
+
+        self.prepare_sources(build_root = '/mnt/scratch')
+
+        self.assertEqual('/mnt/scratch/linux-3.12.6-gentoo/.upkern-configuration', self.s._comparison_path)
+
+    def test_build_with_compiler_cache(self):
+        '''sources.Sources(compiler_cache = True).build()'''
 
-    def _configure_wrapper(self, command, *args, **kwargs):
         for source in SOURCES['all']:
             logger.info('testing %s', source['package_name'])
 
+            self.mock_directory_name(source['directory_name'])
             self.mock_portage_configuration(source['portage_configuration'])
-            self.mock_subprocess_call()
+            self.mock_system_make()
+            self.mock_fingerprint()
+
+            _ = mock.patch('upkern.sources.system.ccache.CompilerCache.prepare')
+
+            self.addCleanup(_.stop)
+
+            mocked_prepare = _.start()
+
+            _ = mock.patch('upkern.sources.system.ccache.CompilerCache.report')
+
+            self.addCleanup(_.stop)
+
+            mocked_report = _.start()
+
+            _ = mock.patch('upkern.sources.system.make.compiler_version')
+
+            self.addCleanup(_.stop)
+
+            _.start().return_value = 'gcc (Gentoo 4.7.3-r1 p1.4, pie-0.5.5) 4.7.3'
+
+            self.prepare_sources(source['name'], compiler_cache = True)
+
+            self.s.build()
+
+            self.assertTrue(mocked_prepare.called)
+            self.assertTrue(mocked_report.called)
+
+            options = [ 'CC=ccache gcc', 'HOSTCC=ccache gcc' ]
+            environment = { 'CCACHE_DIR': '/var/cache/upkern/ccache/' + sources.kernel_series(source['directory_name']) + '-gcc-4.7.3' }
+
+            self.mocked_system_make_stage.assert_any_call('modules', [ 'modules' ], options, '/usr/src/linux', self.mocked_system_make_jobserver.return_value, environment, self.mocked_system_make_output.return_value)
+
+    mocks.add('system.commands.Command')
+    def mock_system_commands_command(self):
+        if 'system.commands.Command' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.sources.system.commands.Command')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_system_commands_command = _.start()
+
+    def _configure_wrapper(self, target, *args, **kwargs):
+        for source in SOURCES['all']:
+            logger.info('testing %s', source['package_name'])
+
+            self.mock_portage_configuration(source['portage_configuration'])
+            self.mock_system_commands_run()
+            self.mock_system_commands_command()
 
             self.prepare_sources(source['name'])
 
             self.s.configure(*args, **kwargs)
 
-            command = command.format(source['portage_configuration']['MAKEOPTS'])
-            self.mocked_subprocess_call.assert_called_once_with(command, shell = True)
+            stdin = None
+            if kwargs.get('accept_defaults'):
+                self.assertEqual(1, self.mocked_system_commands_command.call_count)
+                self.assertEqual(( [ 'yes', '' ], ), self.mocked_system_commands_command.call_args[0])
+
+                stdin = self.mocked_system_commands_run.call_args[1]['stdin']
+
+                self.assertIsInstance(stdin, int)
+                self.mocked_system_commands_command.return_value.start.return_value.wait.assert_called_once_with()
+            else:
+                self.assertFalse(self.mocked_system_commands_command.called)
+
+            command = [ 'make', source['portage_configuration']['MAKEOPTS'], target ]
+            self.mocked_system_commands_run.assert_called_once_with(command, directory = '/usr/src/linux', stdin = stdin)
 
     def test_configure(self):
         '''sources.Sources().configure()'''
 
-        self._configure_wrapper('make {0} menuconfig')
+        self._configure_wrapper('menuconfig')
 
     def test_configure_with_configurator(self):
         '''sources.Sources().configure(configurator = ?)'''
 
         for configurator in [ 'menuconfig', 'oldconfig', 'silentoldconfig' ]:
-            self._configure_wrapper('make {{0}} {0}'.format(configurator), configurator = configurator)
+            self._configure_wrapper(configurator, configurator = configurator)
 
     def test_configure_with_accept_defaults(self):
         '''sources.Sources().configure(accept_defaults = True)'''
 
-        self._configure_wrapper('yes "" | make {0} menuconfig', accept_defaults = True)
+        self._configure_wrapper('menuconfig', accept_defaults = True)
 
     def _emerge_wrapper(self, installed, force = False, called = True):
         for source in SOURCES['all']:
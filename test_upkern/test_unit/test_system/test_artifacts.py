@@ -0,0 +1,218 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+from upkern.system import artifacts
+
+FINGERPRINT = {
+    'package': 'sys-kernel/gentoo-sources-3.12.6',
+    'sources': 'linux-3.12.6-gentoo',
+    'configuration': '0123456789abcdef',
+    'architecture': 'x86_64',
+    'compiler': 'gcc (Gentoo 4.7.3-r1 p1.4, pie-0.5.5) 4.7.3',
+    'options': [],
+}
+
+
+class TestArtifactCache(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    def setUp(self):
+        super(TestArtifactCache, self).setUp()
+
+        self.directory = tempfile.mkdtemp()
+
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.artifacts = {}
+
+        for name in artifacts.ARTIFACTS:
+            self.artifacts[name] = self._write(os.path.join('build', name), name)
+
+        self.modules_directory = os.path.join(self.directory, 'lib', 'modules', '3.12.6-gentoo')
+
+        self._write(os.path.join('lib', 'modules', '3.12.6-gentoo', 'kernel', 'fs', 'ext4', 'ext4.ko'), 'ext4')
+
+        self.c = artifacts.ArtifactCache(os.path.join(self.directory, 'cache'))
+
+    def _write(self, path, contents):
+        path = os.path.join(self.directory, path)
+
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        with open(path, 'w') as fh:
+            fh.write(contents)
+
+        return path
+
+    def test_fetch_empty(self):
+        '''system.artifacts.ArtifactCache().fetch()—empty'''
+
+        self.assertIsNone(self.c.fetch(FINGERPRINT))
+
+    def test_store_fetch(self):
+        '''system.artifacts.ArtifactCache().store()'''
+
+        self.c.store(FINGERPRINT, self.artifacts, self.modules_directory)
+
+        _ = self.c.fetch(FINGERPRINT)
+
+        for name in artifacts.ARTIFACTS:
+            with open(_[name], 'r') as fh:
+                self.assertEqual(name, fh.read())
+
+        self.assertEqual('3.12.6-gentoo', _[artifacts.RELEASE])
+
+        self.assertEqual([ artifacts.key(FINGERPRINT) ], os.listdir(self.c.directory))
+
+        self.assertIsNone(self.c.fetch(dict(FINGERPRINT, configuration = 'fedcba9876543210')))
+
+    def test_extract_modules(self):
+        '''system.artifacts.extract_modules()'''
+
+        os.symlink('/usr/src/linux-3.12.6-gentoo', os.path.join(self.modules_directory, 'build'))
+
+        self.c.store(FINGERPRINT, self.artifacts, self.modules_directory)
+
+        destination = os.path.join(self.directory, 'target')
+
+        _ = self.c.fetch(FINGERPRINT)
+
+        artifacts.extract_modules(_[artifacts.MODULES], destination, _[artifacts.RELEASE])
+
+        with open(os.path.join(destination, '3.12.6-gentoo', 'kernel', 'fs', 'ext4', 'ext4.ko'), 'r') as fh:
+            self.assertEqual('ext4', fh.read())
+
+        self.assertEqual('/usr/src/linux-3.12.6-gentoo', os.readlink(os.path.join(destination, '3.12.6-gentoo', 'build')))
+
+    def test_extract_modules_escaping(self):
+        '''system.artifacts.extract_modules()—members escaping the destination'''
+
+        def symlink(name, target):
+            _ = tarfile.TarInfo(name)
+            _.type, _.linkname = tarfile.SYMTYPE, target
+            return _
+
+        def hardlink(name, target):
+            _ = tarfile.TarInfo(name)
+            _.type, _.linkname = tarfile.LNKTYPE, target
+            return _
+
+        def device(name):
+            _ = tarfile.TarInfo(name)
+            _.type = tarfile.CHRTYPE
+            return _
+
+        destination = os.path.join(self.directory, 'target')
+
+        for members in (
+                [ tarfile.TarInfo('3.12.6-gentoo/../../etc/passwd') ],
+                [ tarfile.TarInfo('/etc/passwd') ],
+                [ tarfile.TarInfo('3.10.7-gentoo/kernel/evil.ko') ],
+                [ symlink('3.12.6-gentoo/build', '/etc'), tarfile.TarInfo('3.12.6-gentoo/build/passwd') ],
+                [ hardlink('3.12.6-gentoo/shadow', 'etc/shadow') ],
+                [ device('3.12.6-gentoo/mem') ],
+                ):
+            tarball = os.path.join(self.directory, 'evil.tar.gz')
+
+            with tarfile.open(tarball, 'w:gz') as tar:
+                for member in members:
+                    tar.addfile(member, io.BytesIO(b'') if member.isfile() else None)
+
+            with self.assertRaises(RuntimeError):
+                artifacts.extract_modules(tarball, destination, '3.12.6-gentoo')
+
+            self.assertFalse(os.path.exists(destination))
+
+    def test_fetch_without_release(self):
+        '''system.artifacts.ArtifactCache().fetch()—entry without a release'''
+
+        self.c.store(FINGERPRINT, self.artifacts, self.modules_directory)
+
+        os.remove(os.path.join(self.c.entry(FINGERPRINT), artifacts.RELEASE))
+
+        self.assertIsNone(self.c.fetch(FINGERPRINT))
+
+    def test_store_failure(self):
+        '''system.artifacts.ArtifactCache().store()—missing artifact'''
+
+        os.remove(self.artifacts['System.map'])
+
+        self.c.store(FINGERPRINT, self.artifacts, self.modules_directory)
+
+        self.assertIsNone(self.c.fetch(FINGERPRINT))
+        self.assertEqual([], os.listdir(self.c.directory))
+
+
+class TestArchive(TestArtifactCache):
+    def setUp(self):
+        super(TestArchive, self).setUp()
+
+        self.modules = os.path.join(self.directory, artifacts.MODULES)
+
+        artifacts.pack_modules(self.modules_directory, self.modules)
+
+        self.archive = os.path.join(self.directory, 'linux-3.12.6-gentoo.tar.gz')
+
+        self.target = os.path.join(self.directory, 'unpacked')
+
+        os.makedirs(self.target)
+
+    def test_export_unpack(self):
+        '''system.artifacts.export()'''
+
+        artifacts.export(self.archive, { 'kernel': 'linux-3.12.6-gentoo', 'fingerprint': FINGERPRINT }, self.artifacts, self.modules)
+
+        self.assertTrue(os.path.exists(self.archive + '.sha256'))
+        self.assertFalse(os.path.exists(self.archive + '.partial'))
+
+        manifest, paths = artifacts.unpack(self.archive, self.target)
+
+        self.assertEqual('linux-3.12.6-gentoo', manifest['kernel'])
+        self.assertEqual(FINGERPRINT, manifest['fingerprint'])
+
+        for name in artifacts.ARTIFACTS:
+            with open(paths[name], 'r') as fh:
+                self.assertEqual(name, fh.read())
+
+        self.assertEqual(artifacts.checksum(self.modules), artifacts.checksum(paths[artifacts.MODULES]))
+
+    def test_unpack_corrupted(self):
+        '''system.artifacts.unpack()—corrupted'''
+
+        artifacts.export(self.archive, { 'kernel': 'linux-3.12.6-gentoo' }, self.artifacts, self.modules)
+
+        with open(self.archive, 'ab') as fh:
+            fh.write(b'\0')
+
+        self.assertRaises(RuntimeError, artifacts.unpack, self.archive, self.target)
+
+    def test_unpack_tampered(self):
+        '''system.artifacts.unpack()—tampered member'''
+
+        artifacts.export(self.archive, { 'kernel': 'linux-3.12.6-gentoo' }, self.artifacts, self.modules)
+
+        os.remove(self.archive + '.sha256')
+
+        with tarfile.open(self.archive, 'r:gz') as tar:
+            members = [ ( member, tar.extractfile(member).read() ) for member in tar ]
+
+        with tarfile.open(self.archive, 'w:gz') as tar:
+            for member, contents in members:
+                if member.name == 'System.map':
+                    contents = b'tampered'
+                    member.size = len(contents)
+
+                tar.addfile(member, io.BytesIO(contents))
+
+        self.assertRaises(RuntimeError, artifacts.unpack, self.archive, self.target)
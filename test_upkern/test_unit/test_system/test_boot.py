@@ -0,0 +1,98 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import mock
+import unittest
+
+from upkern.system import boot
+
+
+class TestBoot(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    def setUp(self):
+        super(TestBoot, self).setUp()
+
+        _ = mock.patch.multiple(boot, _mounted = None, _inventory = None)
+
+        self.addCleanup(_.stop)
+
+        _.start()
+
+    mocks.add('utilities')
+    def mock_utilities(self):
+        if 'utilities' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.system.boot.utilities')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_utilities = _.start()
+
+    mocks.add('os.listdir')
+    def mock_os_listdir(self, names):
+        if 'os.listdir' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.system.boot.os.listdir')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_os_listdir = _.start()
+        self.mocked_os_listdir.return_value = names
+
+    def test_mount_once(self):
+        '''system.boot.mount()—repeated'''
+
+        self.mock_utilities()
+
+        boot.mount()
+        boot.mount()
+
+        self.mocked_utilities.acquire.assert_called_once_with('/boot')
+
+    def test_release(self):
+        '''system.boot.release()'''
+
+        self.mock_utilities()
+
+        boot.mount()
+        boot.release()
+
+        self.mocked_utilities.release.assert_called_once_with('/boot')
+
+    def test_release_unmounted(self):
+        '''system.boot.release()—never mounted'''
+
+        self.mock_utilities()
+
+        boot.release()
+
+        self.assertFalse(self.mocked_utilities.release.called)
+
+    def test_inventory_cached(self):
+        '''system.boot.inventory()—cached'''
+
+        self.mock_utilities()
+        self.mock_os_listdir([ 'config-3.12.6-gentoo' ])
+
+        self.assertEqual([ 'config-3.12.6-gentoo' ], boot.inventory())
+        self.assertEqual([ 'config-3.12.6-gentoo' ], boot.inventory())
+
+        self.mocked_os_listdir.assert_called_once_with('/boot')
+
+    def test_inventory_invalidate(self):
+        '''system.boot.invalidate()'''
+
+        self.mock_utilities()
+        self.mock_os_listdir([ 'config-3.12.6-gentoo' ])
+
+        boot.inventory()
+        boot.invalidate()
+        boot.inventory()
+
+        self.assertEqual(2, self.mocked_os_listdir.call_count)
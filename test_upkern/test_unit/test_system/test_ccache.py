@@ -0,0 +1,84 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import mock
+import unittest
+
+from upkern.system import ccache
+
+STATISTICS = {}
+
+STATISTICS['ccache-3'] = (
+    'cache directory                     /var/cache/upkern/ccache/linux-3.12.6-gentoo\n'
+    'cache hit (direct)                 10213\n'
+    'cache hit (preprocessed)             118\n'
+    'cache miss                            37\n'
+    'files in cache                     20745\n'
+)
+
+STATISTICS['ccache-4'] = (
+    'Cacheable calls:   10368 / 10401 (99.68%)\n'
+    '  Hits:            10331 / 10368 (99.64%)\n'
+    '    Direct:        10213 / 10331 (98.86%)\n'
+    '    Preprocessed:    118 / 10331 ( 1.14%)\n'
+    '  Misses:             37 / 10368 ( 0.36%)\n'
+    'Local storage:\n'
+    '  Cache size (GB):   1.2 /   5.0 (24.00%)\n'
+    '  Hits:            10331 / 10368 (99.64%)\n'
+    '  Misses:             37 / 10368 ( 0.36%)\n'
+)
+
+
+class TestKey(unittest.TestCase):
+    def test_key(self):
+        '''system.ccache.key()'''
+
+        _ = ccache.key('gentoo-3.12', 'gcc (Gentoo 4.7.3-r1 p1.4, pie-0.5.5) 4.7.3')
+
+        self.assertEqual('gentoo-3.12-gcc-4.7.3', _)
+        self.assertEqual(_, ccache.key('gentoo-3.12', 'gcc (Gentoo 4.7.3-r1 p1.4, pie-0.5.5) 4.7.3'))
+        self.assertNotEqual(_, ccache.key('gentoo-3.12', 'gcc (Gentoo 4.8.2 p1.3r1, pie-0.5.8r1) 4.8.2'))
+        self.assertEqual('gentoo-3.12', ccache.key('gentoo-3.12', None))
+
+
+class TestCompilerCache(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    mocks.add('commands.output')
+    def mock_commands_output(self, output = ''):
+        if 'commands.output' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.system.ccache.commands.output')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_commands_output = _.start()
+        self.mocked_commands_output.return_value = output
+
+    def test_arguments(self):
+        '''system.ccache.CompilerCache().arguments'''
+
+        c = ccache.CompilerCache('gentoo-3.12-gcc-4.7.3')
+
+        self.assertEqual([ 'CC=ccache gcc', 'HOSTCC=ccache gcc' ], c.arguments)
+
+    def test_directory(self):
+        '''system.ccache.CompilerCache().directory'''
+
+        c = ccache.CompilerCache('gentoo-3.12-gcc-4.7.3')
+
+        self.assertEqual('/var/cache/upkern/ccache/gentoo-3.12-gcc-4.7.3', c.directory)
+
+    def test_statistics(self):
+        '''system.ccache.CompilerCache().statistics()'''
+
+        for version, output in STATISTICS.items():
+            self.mock_commands_output(output)
+
+            c = ccache.CompilerCache('gentoo-3.12-gcc-4.7.3')
+
+            self.assertEqual({ 'hits': 10331, 'misses': 37 }, c.statistics(), version)
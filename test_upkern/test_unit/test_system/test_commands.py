@@ -0,0 +1,128 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import io
+import mock
+import subprocess
+import unittest
+
+from upkern.system import commands
+
+
+class TestCommand(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    mocks.add('subprocess.Popen')
+    def mock_subprocess_popen(self, result = 0):
+        if 'subprocess.Popen' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.system.commands.subprocess.Popen')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_subprocess_popen = _.start()
+        self.mocked_subprocess_popen.return_value.wait.return_value = result
+
+    mocks.add('journal.record')
+    def mock_journal_record(self):
+        if 'journal.record' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.system.commands.journal.record')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_journal_record = _.start()
+
+    def test_run(self):
+        '''system.commands.run()'''
+
+        self.mock_subprocess_popen()
+        self.mock_journal_record()
+
+        self.assertEqual(0, commands.run([ 'mount', '/boot' ]))
+
+        self.mocked_subprocess_popen.assert_called_once_with([ 'mount', '/boot' ], cwd = None, env = None, stdin = None, stdout = None, pass_fds = ())
+
+    def test_output(self):
+        '''system.commands.output()'''
+
+        self.mock_subprocess_popen()
+        self.mock_journal_record()
+
+        self.mocked_subprocess_popen.return_value.stdout = io.BytesIO(b'gcc (Gentoo 4.7.3-r1 p1.4, pie-0.5.5) 4.7.3\n')
+
+        self.assertEqual('gcc (Gentoo 4.7.3-r1 p1.4, pie-0.5.5) 4.7.3\n', commands.output([ 'gcc', '--version' ]))
+
+        self.assertEqual(( 'command', ), self.mocked_journal_record.call_args[0])
+
+    def test_output_status(self):
+        '''system.commands.output()—failure'''
+
+        self.mock_subprocess_popen(1)
+        self.mock_journal_record()
+
+        self.mocked_subprocess_popen.return_value.stdout = io.BytesIO(b'')
+
+        self.assertRaises(RuntimeError, commands.output, [ 'gcc', '--version' ])
+
+    def test_run_status(self):
+        '''system.commands.run()—failure'''
+
+        self.mock_subprocess_popen(32)
+        self.mock_journal_record()
+
+        self.assertEqual(32, commands.run([ 'mount', '/boot' ]))
+
+        _ = self.mocked_journal_record.call_args
+        self.assertEqual(( 'command', ), _[0])
+        self.assertEqual([ 'mount', '/boot' ], _[1]['command'])
+        self.assertEqual(32, _[1]['status'])
+        self.assertIn('duration', _[1])
+
+    def test_run_with_fields(self):
+        '''system.commands.run(fields = ?)'''
+
+        self.mock_subprocess_popen()
+        self.mock_journal_record()
+
+        commands.run([ 'make', 'modules' ], directory = '/usr/src/linux', fields = { 'stage': 'modules' })
+
+        self.assertEqual('/usr/src/linux', self.mocked_subprocess_popen.call_args[1]['cwd'])
+        self.assertEqual('modules', self.mocked_journal_record.call_args[1]['stage'])
+
+    def test_run_timeout(self):
+        '''system.commands.run(timeout = ?)—timed out'''
+
+        self.mock_subprocess_popen()
+        self.mock_journal_record()
+
+        process = self.mocked_subprocess_popen.return_value
+        process.wait.side_effect = [ subprocess.TimeoutExpired('mount', 1), -9 ]
+
+        with self.assertRaises(RuntimeError):
+            commands.run([ 'mount', '/boot' ], timeout = 1)
+
+        self.assertTrue(process.kill.called)
+        self.assertEqual(-9, self.mocked_journal_record.call_args[1]['status'])
+
+    def test_run_output(self):
+        '''system.commands.run(output = ?)'''
+
+        self.mock_subprocess_popen()
+        self.mock_journal_record()
+
+        self.mocked_subprocess_popen.return_value.stdout = io.BytesIO(b'CC init/main.o\nLD \xff\n')
+
+        lines = []
+
+        commands.run([ 'make', 'modules' ], output = lines.append)
+
+        self.assertEqual([ 'CC init/main.o\n', 'LD �\n' ], lines)
+
+        self.assertNotIn('errors', self.mocked_subprocess_popen.call_args[1])
+        self.assertNotIn('universal_newlines', self.mocked_subprocess_popen.call_args[1])
@@ -0,0 +1,162 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import errno
+import mock
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from upkern.system import files
+
+
+class TestFiles(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    def setUp(self):
+        super(TestFiles, self).setUp()
+
+        self.directory = tempfile.mkdtemp()
+
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.source = os.path.join(self.directory, 'bzImage')
+
+        with open(self.source, 'wb') as fh:
+            fh.write(os.urandom(3 * 4096 + 17))
+
+        os.chmod(self.source, 0o600)
+
+        self.destination = os.path.join(self.directory, 'boot', 'bzImage-3.12.6-gentoo')
+
+        os.makedirs(os.path.dirname(self.destination))
+
+    mocks.add('fcntl.ioctl')
+    def mock_fcntl_ioctl(self):
+        if 'fcntl.ioctl' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.system.files.fcntl.ioctl')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_fcntl_ioctl = _.start()
+        self.mocked_fcntl_ioctl.side_effect = OSError(errno.EOPNOTSUPP, 'Operation not supported')
+
+    def contents(self, path):
+        with open(path, 'rb') as fh:
+            return fh.read()
+
+    def copy(self):
+        with open(self.source, 'rb') as source, open(self.destination, 'wb') as destination:
+            return files.copy(source, destination)
+
+    def test_copy(self):
+        '''system.files.copy()'''
+
+        self.mock_fcntl_ioctl()
+
+        self.assertIn(self.copy(), ( 'copy_file_range', 'sendfile' ))
+
+        self.assertEqual(self.contents(self.source), self.contents(self.destination))
+
+    def test_copy_fallback(self):
+        '''system.files.copy()—kernel copies unsupported'''
+
+        self.mock_fcntl_ioctl()
+
+        def partial(source_fd, destination_fd, count):
+            os.write(destination_fd, os.read(source_fd, 4096))
+            raise OSError(errno.EXDEV, 'Invalid cross-device link')
+
+        _ = mock.patch.object(files, '_RANGE_COPIES', ( ( 'copy_file_range', partial ), ( 'sendfile', partial ) ))
+
+        self.addCleanup(_.stop)
+
+        _.start()
+
+        self.assertEqual('read', self.copy())
+
+        self.assertEqual(self.contents(self.source), self.contents(self.destination))
+
+    def test_copy_short(self):
+        '''system.files.copy()—kernel copy stops early'''
+
+        self.mock_fcntl_ioctl()
+
+        def short(source_fd, destination_fd, count):
+            if os.lseek(source_fd, 0, os.SEEK_CUR) >= 4096:
+                return 0
+
+            os.write(destination_fd, os.read(source_fd, 4096))
+
+            return 4096
+
+        _ = mock.patch.object(files, '_RANGE_COPIES', ( ( 'copy_file_range', short ), ))
+
+        self.addCleanup(_.stop)
+
+        _.start()
+
+        self.assertEqual('read', self.copy())
+
+        self.assertEqual(self.contents(self.source), self.contents(self.destination))
+
+    def test_copy_error(self):
+        '''system.files.copy()—I/O error'''
+
+        self.mock_fcntl_ioctl()
+
+        self.mocked_fcntl_ioctl.side_effect = OSError(errno.EIO, 'Input/output error')
+
+        self.assertRaises(OSError, self.copy)
+
+    def test_installer_copy(self):
+        '''system.files.Installer().copy()'''
+
+        installer = files.Installer()
+
+        self.assertEqual(os.path.getsize(self.source), installer.copy(self.source, self.destination))
+
+        self.assertEqual(self.contents(self.source), self.contents(self.destination))
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(self.destination).st_mode))
+
+        self.assertEqual([ 'bzImage-3.12.6-gentoo' ], os.listdir(os.path.dirname(self.destination)))
+        self.assertEqual(set([ os.path.dirname(self.destination) ]), installer.directories)
+
+        installer.sync()
+
+        self.assertEqual(set(), installer.directories)
+
+    def test_installer_write(self):
+        '''system.files.Installer().write()'''
+
+        with open(self.destination, 'wb') as fh:
+            fh.write(b'previous')
+
+        files.Installer().write(self.destination, b'{}')
+
+        self.assertEqual(b'{}', self.contents(self.destination))
+        self.assertEqual(0o644, stat.S_IMODE(os.stat(self.destination).st_mode))
+
+    def test_installer_copy_failure(self):
+        '''system.files.Installer().copy()—failure leaves the target intact'''
+
+        with open(self.destination, 'wb') as fh:
+            fh.write(b'previous')
+
+        _ = mock.patch('upkern.system.files.copy')
+
+        self.addCleanup(_.stop)
+
+        _.start().side_effect = OSError(errno.ENOSPC, 'No space left on device')
+
+        self.assertRaises(OSError, files.Installer().copy, self.source, self.destination)
+
+        self.assertEqual(b'previous', self.contents(self.destination))
+        self.assertEqual([ 'bzImage-3.12.6-gentoo' ], os.listdir(os.path.dirname(self.destination)))
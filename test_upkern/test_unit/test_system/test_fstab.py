@@ -0,0 +1,122 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from upkern.system import fstab
+
+FSTAB = '''\
+# /etc/fstab: static file system information.
+#
+# <fs>                  <mountpoint>    <type>          <opts>          <dump/pass>
+
+UUID=2f0c0b3e-6f5e-4b8a-9d1c-1f2e3d4c5b6a /boot vfat noauto,noatime 1 2
+/dev/sda3               /               ext4            noatime         0 1
+LABEL=my\\040swap        none            swap            sw              0 0
+PARTUUID=0000-0003      /home           ext4            defaults
+/dev/sda5               /var            ext4            noatime         x 2
+'''
+
+
+class TestFSTab(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    def setUp(self):
+        super(TestFSTab, self).setUp()
+
+        self.directory = tempfile.mkdtemp()
+
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.fstab = os.path.join(self.directory, 'fstab')
+
+        with open(self.fstab, 'w') as fh:
+            fh.write(FSTAB)
+
+        for tag, name, device in (
+                ( 'by-uuid', '2f0c0b3e-6f5e-4b8a-9d1c-1f2e3d4c5b6a', 'sda1' ),
+                ( 'by-label', 'my\\x20swap', 'sda2' ),
+                ):
+            if not os.path.isdir(os.path.join(self.directory, tag)):
+                os.makedirs(os.path.join(self.directory, tag))
+
+            os.symlink('../../' + device, os.path.join(self.directory, tag, name))
+
+        _ = mock.patch.multiple(fstab, FSTAB = self.fstab, _cache = None, _devices = None, DEVICE_DIRECTORIES = {
+            'UUID': os.path.join(self.directory, 'by-uuid'),
+            'LABEL': os.path.join(self.directory, 'by-label'),
+            'PARTUUID': os.path.join(self.directory, 'by-partuuid'),
+            })
+
+        self.addCleanup(_.stop)
+
+        _.start()
+
+    def test_getitem(self):
+        '''system.fstab.FSTab()[?]'''
+
+        f = fstab.FSTab()
+
+        self.assertEqual('/dev/sda3', f['/'])
+        self.assertEqual('UUID=2f0c0b3e-6f5e-4b8a-9d1c-1f2e3d4c5b6a', f['/boot'])
+        self.assertEqual('LABEL=my swap', f['none'])
+        self.assertIsNone(f['/usr'])
+
+        self.assertIn('/boot', f)
+        self.assertNotIn('/boot/grub2', f)
+
+    def test_entry(self):
+        '''system.fstab.FSTab().entry()'''
+
+        f = fstab.FSTab()
+
+        self.assertEqual(fstab.Entry('UUID=2f0c0b3e-6f5e-4b8a-9d1c-1f2e3d4c5b6a', '/boot', 'vfat', [ 'noauto', 'noatime' ], 1, 2), f.entry('/boot'))
+        self.assertEqual(fstab.Entry('PARTUUID=0000-0003', '/home', 'ext4', [ 'defaults' ], 0, 0), f.entry('/home'))
+        self.assertEqual(fstab.Entry('/dev/sda5', '/var', 'ext4', [ 'noatime' ], 0, 2), f.entry('/var'))
+
+    def test_device(self):
+        '''system.fstab.FSTab().device()'''
+
+        f = fstab.FSTab()
+
+        self.assertEqual(os.path.join(os.path.dirname(self.directory), 'sda1'), f.device('/boot'))
+        self.assertEqual(os.path.join(os.path.dirname(self.directory), 'sda2'), f.device('none'))
+        self.assertEqual('/dev/sda3', f.device('/'))
+        self.assertEqual('PARTUUID=0000-0003', f.device('/home'))
+
+    def test_cache(self):
+        '''system.fstab.FSTab()—cached'''
+
+        fstab.FSTab()
+
+        with mock.patch('upkern.system.fstab.open', create = True) as mocked_open:
+            fstab.FSTab()
+
+            self.assertFalse(mocked_open.called)
+
+    def test_cache_invalidation(self):
+        '''system.fstab.FSTab()—/etc/fstab changed'''
+
+        self.assertNotIn('/usr', fstab.FSTab())
+
+        with open(self.fstab, 'a') as fh:
+            fh.write('/dev/sda4 /usr ext4 noatime 0 2\n')
+
+        self.assertEqual('/dev/sda4', fstab.FSTab()['/usr'])
+
+    def test_device_invalidation(self):
+        '''system.fstab.FSTab().device()—/dev/disk changed'''
+
+        self.assertEqual('PARTUUID=0000-0003', fstab.FSTab().device('/home'))
+
+        os.makedirs(os.path.join(self.directory, 'by-partuuid'))
+        os.symlink('../../sda4', os.path.join(self.directory, 'by-partuuid', '0000-0003'))
+
+        self.assertEqual(os.path.join(os.path.dirname(self.directory), 'sda4'), fstab.FSTab().device('/home'))
@@ -0,0 +1,151 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from upkern.system import kconfig
+
+KCONFIGS = {}
+
+KCONFIGS['Kconfig'] = (
+    'mainmenu "Linux/$(ARCH) $(KERNELVERSION) Kernel Configuration"\n'
+    '\n'
+    'config 64BIT\n'
+    '\tbool "64-bit kernel" if "$(ARCH)" = "x86"\n'
+    '\tdefault ARCH != "i386"\n'
+    '\thelp\n'
+    '\t  Say yes to build a 64-bit kernel.\n'
+    '\t  default y\n'
+    '\n'
+    'config LOCALVERSION\n'
+    '\tstring "Local version - append to kernel release"\n'
+    '\tdefault ""\n'
+    '\n'
+    'source "fs/Kconfig"\n'
+)
+
+KCONFIGS['fs/Kconfig'] = (
+    'menu "File systems"\n'
+    '\n'
+    'config EXT4_FS\n'
+    '\ttristate "The Extended 4 (ext4) filesystem"\n'
+    '\tselect JBD2\n'
+    '\n'
+    'config EXT4_USE_FOR_EXT2\n'
+    '\tbool\n'
+    '\tdefault y if EXT4_FS\n'
+    '\tdefault n\n'
+    '\n'
+    'config FS_NEW\n'
+    '\tdef_tristate m\n'
+    '\n'
+    'config BTRFS_FS\n'
+    '\tbool "Btrfs filesystem support"\n'
+    '\n'
+    'endmenu\n'
+)
+
+KCONFIGS['arch/x86/Kconfig'] = 'config X86\n\tdef_bool y\n'
+KCONFIGS['arch/arm/Kconfig'] = 'config ARM\n\tdef_bool y\n'
+KCONFIGS['scripts/kconfig/tests/Kconfig'] = 'config TEST\n\tdef_bool y\n'
+
+CONFIGURATION = (
+    '#\n'
+    '# Automatically generated file; DO NOT EDIT.\n'
+    '#\n'
+    'CONFIG_64BIT=y\n'
+    'CONFIG_X86=y\n'
+    'CONFIG_LOCALVERSION=""\n'
+    'CONFIG_EXT4_FS=m\n'
+    '# CONFIG_EXT4_USE_FOR_EXT2 is not set\n'
+    'CONFIG_BTRFS_FS=m\n'
+    'CONFIG_REMOVED_FS=y\n'
+    '# CONFIG_REMOVED_UNSET is not set\n'
+)
+
+
+class TestKConfig(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    def setUp(self):
+        super(TestKConfig, self).setUp()
+
+        self.directory = tempfile.mkdtemp()
+
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        for path, contents in KCONFIGS.items():
+            path = os.path.join(self.directory, path)
+
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+
+            with open(path, 'w') as fh:
+                fh.write(contents)
+
+        self.configuration = os.path.join(self.directory, '.config')
+
+        with open(self.configuration, 'w') as fh:
+            fh.write(CONFIGURATION)
+
+    def test_parse(self):
+        '''system.kconfig.parse()'''
+
+        _ = {
+            '64BIT': 'y',
+            'X86': 'y',
+            'LOCALVERSION': '""',
+            'EXT4_FS': 'm',
+            'EXT4_USE_FOR_EXT2': 'n',
+            'BTRFS_FS': 'm',
+            'REMOVED_FS': 'y',
+            'REMOVED_UNSET': 'n',
+        }
+
+        self.assertEqual(_, kconfig.parse(self.configuration))
+
+    def test_symbols(self):
+        '''system.kconfig.symbols()'''
+
+        _ = {
+            '64BIT': kconfig.Symbol('bool', None),
+            'LOCALVERSION': kconfig.Symbol('string', '""'),
+            'X86': kconfig.Symbol('bool', 'y'),
+            'EXT4_FS': kconfig.Symbol('tristate', 'n'),
+            'EXT4_USE_FOR_EXT2': kconfig.Symbol('bool', None),
+            'FS_NEW': kconfig.Symbol('tristate', 'm'),
+            'BTRFS_FS': kconfig.Symbol('bool', 'n'),
+        }
+
+        self.assertEqual(_, kconfig.symbols(self.directory, 'x86_64'))
+
+    def test_compare(self):
+        '''system.kconfig.compare()'''
+
+        _ = kconfig.compare(kconfig.parse(self.configuration), kconfig.symbols(self.directory, 'x86_64'))
+
+        self.assertEqual({ 'FS_NEW': 'm' }, _.added)
+        self.assertEqual({ 'REMOVED_FS': 'y' }, _.removed)
+        self.assertEqual({ 'BTRFS_FS': ( 'm', 'bool' ) }, _.changed)
+
+    def test_diff(self):
+        '''system.kconfig.diff()'''
+
+        old = kconfig.parse(self.configuration)
+
+        new = dict(old)
+        new['EXT4_FS'] = 'y'
+        new['XFS_FS'] = 'm'
+        del new['REMOVED_FS']
+
+        _ = kconfig.diff(old, new)
+
+        self.assertEqual({ 'XFS_FS': 'm' }, _.added)
+        self.assertEqual({ 'REMOVED_FS': 'y' }, _.removed)
+        self.assertEqual({ 'EXT4_FS': ( 'm', 'y' ) }, _.changed)
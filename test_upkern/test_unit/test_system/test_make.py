@@ -0,0 +1,240 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import io
+import mock
+import os
+import subprocess
+import tempfile
+import unittest
+
+from upkern.system import make
+
+from test_upkern.test_unit import TestBaseUnit
+
+BUILD_OUTPUT = (
+    '  CHK     include/config/kernel.release\n'
+    '  CC      kernel/fork.o\n'
+    '  CC [M]  fs/ext4/inode.o\n'
+    '  LD      kernel/built-in.o\n'
+    'fs/ext4/inode.c:12:1: warning: unused variable\n'
+    '  LD [M]  fs/ext4/ext4.ko\n'
+    'make: *** [modules] Error 2\n'
+)
+
+CONFIGURATION = (
+    '# Automatically generated file; DO NOT EDIT.\n'
+    'CONFIG_64BIT=y\n'
+    'CONFIG_EXT4_FS=m\n'
+    '# CONFIG_BTRFS_FS is not set\n'
+    'CONFIG_LOCALVERSION=""\n'
+)
+
+
+class TestSplitJobs(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    def test_split_jobs(self):
+        '''system.make.split_jobs()'''
+
+        for options, result in (
+                ( '', ( 1, [] ) ),
+                ( '-j5', ( 5, [] ) ),
+                ( '-j 5 -l4', ( 5, [ '-l4' ] ) ),
+                ( '--jobs=3 -s', ( 3, [ '-s' ] ) ),
+                ( '-j -l8', ( None, [ '-l8' ] ) ),
+                ):
+            self.assertEqual(result, make.split_jobs(options))
+
+
+class TestPlan(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    def mock_limits(self, cpus, load, memory_jobs):
+        for name, value in ( ( '_cpu_limit', cpus ), ( '_memory_limit', memory_jobs ) ):
+            _ = mock.patch('upkern.system.make.' + name)
+
+            self.addCleanup(_.stop)
+
+            _.start().return_value = value
+
+        _ = mock.patch('upkern.system.make.os.getloadavg')
+
+        self.addCleanup(_.stop)
+
+        _.start().return_value = ( load, load, load )
+
+    def test_plan(self):
+        '''system.make.plan()'''
+
+        for cpus, load, memory_jobs, result in (
+                ( 64, 0.0, 128, ( 64, 64 ) ),
+                ( 64, 0.0, 16, ( 16, 64 ) ),
+                ( 64, 60.5, 128, ( 4, 64 ) ),
+                ( 4, 12.0, 128, ( 1, 4 ) ),
+                ( 8, 0.0, None, ( 8, 8 ) ),
+                ):
+            self.mock_limits(cpus, load, memory_jobs)
+
+            self.assertEqual(result, make.plan())
+
+    def test_replan(self):
+        '''system.make.replan()'''
+
+        for options in ( '-j2 -l2 -s', '-j 2 --load-average 2 -s', '-s' ):
+            self.mock_limits(16, 0.0, 32)
+
+            self.assertEqual('-j16 -l16 -s', make.replan(options))
+
+
+class TestJobServer(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    def test_jobserver_tokens(self):
+        '''system.make.JobServer(5)'''
+
+        j = make.JobServer(5)
+
+        self.addCleanup(j.close)
+
+        self.assertEqual(b'++++', os.read(j.fds[0], 16))
+        self.assertEqual(' -j --jobserver-fds={0},{1}'.format(*j.fds), j.environment['MAKEFLAGS'])
+
+    def test_jobserver_serial(self):
+        '''system.make.JobServer(1)'''
+
+        j = make.JobServer(1)
+
+        self.assertEqual((), j.fds)
+        self.assertEqual([], j.arguments)
+
+    def test_jobserver_unlimited(self):
+        '''system.make.JobServer(None)'''
+
+        j = make.JobServer(None)
+
+        self.assertEqual((), j.fds)
+        self.assertEqual([ '-j' ], j.arguments)
+
+
+class TestStage(TestBaseUnit):
+    mocks_mask = TestBaseUnit.mocks_mask
+    mocks = TestBaseUnit.mocks
+
+    mocks.add('subprocess.Popen')
+    def mock_subprocess_popen(self, result = 0, output = ''):
+        if 'subprocess.Popen' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.system.commands.subprocess.Popen')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_subprocess_popen = _.start()
+        self.mocked_subprocess_popen.return_value.wait.return_value = result
+        self.mocked_subprocess_popen.return_value.stdout = io.BytesIO(output.encode('utf-8'))
+
+    def test_stage_run(self):
+        '''system.make.Stage().run()'''
+
+        self.mock_subprocess_popen()
+
+        j = make.JobServer(4)
+
+        self.addCleanup(j.close)
+
+        make.Stage('modules', [ 'modules' ], [ '-s' ], '/usr/src/linux', j).run()
+
+        self.mocked_subprocess_popen.assert_called_once_with(
+                [ 'make', '-s', 'modules' ],
+                cwd = '/usr/src/linux',
+                env = j.environment,
+                stdin = None,
+                stdout = subprocess.PIPE,
+                stderr = subprocess.STDOUT,
+                pass_fds = j.fds,
+                )
+
+    def test_stage_run_with_output(self):
+        '''system.make.Stage(output = ?).run()'''
+
+        self.mock_subprocess_popen(output = BUILD_OUTPUT)
+
+        o = make.Output(expected = 8, echo = False)
+
+        make.Stage('modules', [ 'modules' ], output = o).run()
+
+        self.assertEqual(4, o.objects)
+        self.assertEqual(0.5, o.progress)
+
+    def test_stage_run_with_environment(self):
+        '''system.make.Stage(environment = ?).run()'''
+
+        self.mock_subprocess_popen()
+
+        make.Stage('modules', [ 'modules' ], environment = { 'CCACHE_DIR': '/tmp' }).run()
+
+        self.assertEqual('/tmp', self.mocked_subprocess_popen.call_args[1]['env']['CCACHE_DIR'])
+
+    def test_stage_run_failure(self):
+        '''system.make.Stage().run()—failure'''
+
+        self.mock_subprocess_popen(2)
+
+        with self.assertRaises(RuntimeError):
+            make.Stage('image', [ 'bzImage' ], output = make.Output(echo = False)).run()
+
+
+class TestOutput(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    def test_output_objects(self):
+        '''system.make.Output()—objects'''
+
+        o = make.Output(echo = False)
+
+        for line in BUILD_OUTPUT.splitlines(True):
+            o(line)
+
+        self.assertEqual(4, o.objects)
+        self.assertIsNone(o.progress)
+
+    def test_output_progress_bounded(self):
+        '''system.make.Output().progress—more objects than expected'''
+
+        o = make.Output(expected = 2, echo = False)
+
+        for line in BUILD_OUTPUT.splitlines(True):
+            o(line)
+
+        self.assertEqual(0.99, o.progress)
+
+    def test_output_tail(self):
+        '''system.make.Output().tail'''
+
+        o = make.Output(echo = False, lines = 2)
+
+        for line in BUILD_OUTPUT.splitlines(True):
+            o(line)
+
+        self.assertEqual([ '  LD [M]  fs/ext4/ext4.ko', 'make: *** [modules] Error 2' ], list(o.tail))
+
+    def test_expected_objects(self):
+        '''system.make.expected_objects()'''
+
+        with tempfile.NamedTemporaryFile('w', suffix = '.config') as fh:
+            fh.write(CONFIGURATION)
+            fh.flush()
+
+            self.assertEqual(2 * make.OBJECTS_PER_SYMBOL, make.expected_objects(fh.name))
+
+    def test_expected_objects_missing(self):
+        '''system.make.expected_objects()—missing .config'''
+
+        self.assertIsNone(make.expected_objects('/nonexistent/.config'))
@@ -0,0 +1,145 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from upkern.system import portage
+
+MAKE_CONF = '''\
+# These settings were set by the catalyst build script.
+CFLAGS="-O2 -pipe"
+MAKEOPTS="-j5
+    -l4"
+'''
+
+
+class TestSettings(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    def setUp(self):
+        super(TestSettings, self).setUp()
+
+        self.directory = tempfile.mkdtemp()
+
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.make_conf = os.path.join(self.directory, 'make.conf')
+
+        with open(self.make_conf, 'w') as fh:
+            fh.write(MAKE_CONF)
+
+        self.mock_make_conf(( os.path.join(self.directory, 'missing'), self.make_conf ))
+        self.mock_environment({})
+        self.mock_portage_config({ 'MAKEOPTS': '-j2', 'USE': 'X -gtk', 'ARCH': 'amd64' })
+
+        _ = mock.patch.object(portage, '_settings', None)
+
+        self.addCleanup(_.stop)
+
+        _.start()
+
+    mocks.add('portage.MAKE_CONF')
+    def mock_make_conf(self, paths):
+        if 'portage.MAKE_CONF' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.system.portage.MAKE_CONF', paths)
+
+        self.addCleanup(_.stop)
+
+        _.start()
+
+    mocks.add('os.environ')
+    def mock_environment(self, environment):
+        if 'os.environ' in self.mocks_mask:
+            return
+
+        _ = mock.patch.dict('upkern.system.portage.os.environ', environment, clear = True)
+
+        self.addCleanup(_.stop)
+
+        _.start()
+
+    mocks.add('portage.config')
+    def mock_portage_config(self, configuration):
+        if 'portage.config' in self.mocks_mask:
+            return
+
+        _ = mock.patch('portage.config')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_portage_config = _.start()
+        self.mocked_portage_config.return_value = configuration
+
+    def test_make_conf(self):
+        '''system.portage.Settings()[key]—make.conf'''
+
+        self.assertEqual('-j5\n    -l4', portage.settings()['MAKEOPTS'])
+
+        self.assertFalse(self.mocked_portage_config.called)
+
+    def test_make_conf_directory(self):
+        '''system.portage.Settings()[key]—make.conf directory'''
+
+        os.remove(self.make_conf)
+        os.mkdir(self.make_conf)
+
+        for name, contents in ( ( '00-flags', MAKE_CONF ), ( '10-jobs', 'MAKEOPTS="-j9"\n' ) ):
+            with open(os.path.join(self.make_conf, name), 'w') as fh:
+                fh.write(contents)
+
+        self.assertEqual('-j9', portage.settings()['MAKEOPTS'])
+        self.assertEqual('-O2 -pipe', portage.settings()['CFLAGS'])
+
+        self.assertFalse(self.mocked_portage_config.called)
+
+    def test_environment(self):
+        '''system.portage.Settings()[key]—environment'''
+
+        os.environ['MAKEOPTS'] = '-j3'
+
+        self.assertEqual('-j3', portage.settings()['MAKEOPTS'])
+
+        self.assertFalse(self.mocked_portage_config.called)
+
+    def test_profile(self):
+        '''system.portage.Settings()[key]—profile'''
+
+        self.assertEqual('amd64', portage.settings()['ARCH'])
+        self.assertEqual('X -gtk', portage.settings()['USE'])
+
+        self.mocked_portage_config.assert_called_once_with()
+
+    def test_make_conf_source(self):
+        '''system.portage.Settings()[key]—make.conf sources a file'''
+
+        with open(self.make_conf, 'a') as fh:
+            fh.write('source /var/lib/layman/make.conf\n')
+
+        self.assertEqual('-j2', portage.settings()['MAKEOPTS'])
+
+    def test_make_conf_source_environment(self):
+        '''system.portage.Settings()[key]—make.conf sources a file, key in the environment'''
+
+        with open(self.make_conf, 'a') as fh:
+            fh.write('source /var/lib/layman/make.conf\n')
+
+        os.environ['MAKEOPTS'] = '-j3'
+
+        self.assertEqual('-j3', portage.settings()['MAKEOPTS'])
+
+        self.assertFalse(self.mocked_portage_config.called)
+
+    def test_settings(self):
+        '''system.portage.settings()'''
+
+        self.assertIsInstance(portage.settings(), portage.Settings)
+        self.assertIs(portage.settings(), portage.settings())
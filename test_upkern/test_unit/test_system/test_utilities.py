@@ -0,0 +1,97 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import mock
+import unittest
+
+from upkern.system import utilities
+
+
+class TestMounted(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    def setUp(self):
+        super(TestMounted, self).setUp()
+
+        _ = mock.patch.dict(utilities._references, clear = True)
+
+        self.addCleanup(_.stop)
+
+        _.start()
+
+    mocks.add('mount')
+    def mock_mount(self, result = True):
+        if 'mount' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.system.utilities.mount')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_mount = _.start()
+        self.mocked_mount.return_value = result
+
+    mocks.add('unmount')
+    def mock_unmount(self):
+        if 'unmount' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.system.utilities.unmount')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_unmount = _.start()
+
+    def test_mounted(self):
+        '''system.utilities.mounted()'''
+
+        self.mock_mount()
+        self.mock_unmount()
+
+        with utilities.mounted('/boot'):
+            self.mocked_mount.assert_called_once_with('/boot')
+            self.assertFalse(self.mocked_unmount.called)
+
+        self.mocked_unmount.assert_called_once_with('/boot')
+
+    def test_mounted_nested(self):
+        '''system.utilities.mounted()—nested'''
+
+        self.mock_mount()
+        self.mock_unmount()
+
+        with utilities.mounted('/boot'):
+            with utilities.mounted('/boot'):
+                pass
+
+            self.assertFalse(self.mocked_unmount.called)
+
+        self.mocked_mount.assert_called_once_with('/boot')
+        self.mocked_unmount.assert_called_once_with('/boot')
+
+    def test_mounted_already_mounted(self):
+        '''system.utilities.mounted()—already mounted'''
+
+        self.mock_mount(result = False)
+        self.mock_unmount()
+
+        with utilities.mounted('/boot'):
+            pass
+
+        self.assertFalse(self.mocked_unmount.called)
+
+    def test_mounted_error(self):
+        '''system.utilities.mounted()—error'''
+
+        self.mock_mount()
+        self.mock_unmount()
+
+        with self.assertRaises(RuntimeError):
+            with utilities.mounted('/boot'):
+                raise RuntimeError('error')
+
+        self.mocked_unmount.assert_called_once_with('/boot')
+        self.assertEqual({}, utilities._references)
@@ -0,0 +1,167 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import json
+import mock
+import unittest
+
+from upkern import timing
+
+
+class TestTimings(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    mocks.add('timing._usage')
+    def mock_usage(self, usages):
+        if 'timing._usage' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.timing._usage')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_usage = _.start()
+        self.mocked_usage.side_effect = usages
+
+    mocks.add('time.time')
+    def mock_time(self, times):
+        if 'time.time' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.timing.time')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_time = _.start()
+        self.mocked_time.time.side_effect = times
+
+    def prepare_timings(self):
+        self.mock_time([ 0.0, 60.0, 60.0, 660.0 ])
+        self.mock_usage([
+            { 'cpu': 0.5, 'peak_rss': 20480 },
+            { 'cpu': 10.5, 'peak_rss': 40960 },
+            { 'cpu': 10.5, 'peak_rss': 40960 },
+            { 'cpu': 6410.5, 'peak_rss': 409600 },
+        ])
+
+        self.t = timing.Timings()
+
+        with self.t.phase('configure'):
+            pass
+
+        with self.t.phase('build'):
+            pass
+
+    def test_phase(self):
+        '''timing.Timings().phase()'''
+
+        self.prepare_timings()
+
+        _ = [
+            { 'phase': 'configure', 'wall': 60.0, 'cpu': 10.0, 'peak_rss': 40960 },
+            { 'phase': 'build', 'wall': 600.0, 'cpu': 6400.0, 'peak_rss': 409600 },
+        ]
+        self.assertEqual(_, self.t.phases)
+
+    def test_phase_exception(self):
+        '''timing.Timings().phase()—exception'''
+
+        self.mock_time([ 0.0, 1.0 ])
+        self.mock_usage([ { 'cpu': 0.0, 'peak_rss': 0 }, { 'cpu': 1.0, 'peak_rss': 0 } ])
+
+        t = timing.Timings()
+
+        with self.assertRaises(RuntimeError):
+            with t.phase('build'):
+                raise RuntimeError('kernel did not build correctly')
+
+        self.assertEqual([ 'build' ], [ _['phase'] for _ in t.phases ])
+
+    def test_table(self):
+        '''timing.Timings().table()'''
+
+        self.prepare_timings()
+
+        _ = self.t.table().splitlines()
+
+        self.assertEqual(4, len(_))
+        self.assertEqual([ 'build', '600.0', '6400.0', '400.0' ], _[2].split())
+        self.assertEqual([ 'total', '660.0', '6410.0' ], _[3].split())
+
+    def test_dump(self):
+        '''timing.Timings().dump()'''
+
+        self.prepare_timings()
+
+        with mock.patch('upkern.timing.open', mock.mock_open(), create = True) as mocked_open:
+            self.t.dump('/tmp/upkern.json')
+
+        mocked_open.assert_called_once_with('/tmp/upkern.json', 'w')
+
+        written = ''.join([ _[0][0] for _ in mocked_open().write.call_args_list ])
+
+        self.assertEqual(self.t.phases, json.loads(written)['phases'])
+
+
+IMPORT_TIMES = [
+        'import time: self [us] | cumulative | imported package',
+        'import time:       300 |        300 |   encodings',
+        'import time:      1000 |       1000 |       argparse',
+        'import time:       200 |       1200 |     upkern.arguments',
+        'import time:       500 |        500 |       tarfile',
+        'import time:       100 |        600 |     upkern.system',
+        'import time:        60 |       1860 |   upkern',
+        'import time:     90000 |      95000 |   portage',
+        ]
+
+
+class TestImportTimings(unittest.TestCase):
+    def setUp(self):
+        self.t = timing.ImportTimings([ 'upkern' ], { 'upkern.sources': ( 'portage', ) })
+
+    def test_measure(self):
+        '''timing.ImportTimings().measure()'''
+
+        with mock.patch('upkern.timing.subprocess.Popen') as mocked_popen:
+            mocked_popen.return_value.communicate.return_value = ( b'', '\n'.join(IMPORT_TIMES).encode('utf-8') )
+            mocked_popen.return_value.returncode = 0
+
+            self.t.measure()
+
+        arguments = mocked_popen.call_args[0][0]
+
+        self.assertEqual([ '-X', 'importtime', '-c' ], arguments[1:4])
+        self.assertIn('import upkern', arguments[4])
+        self.assertIn('import portage', arguments[4])
+
+        self.assertEqual('upkern.sources', self.t.imports[-1]['importer'])
+
+    def test_parse(self):
+        '''timing.ImportTimings().parse()'''
+
+        self.t.parse(IMPORT_TIMES)
+
+        self.assertEqual({ 'upkern': 60, 'upkern.arguments': 200, 'upkern.system': 100 }, self.t.own)
+
+        _ = [
+            { 'importer': 'upkern.arguments', 'module': 'argparse', 'cumulative': 1000, 'deferred': False },
+            { 'importer': 'upkern.system', 'module': 'tarfile', 'cumulative': 500, 'deferred': False },
+            { 'importer': 'upkern.sources', 'module': 'portage', 'cumulative': 95000, 'deferred': True },
+        ]
+        self.assertEqual(_, self.t.imports)
+
+    def test_table(self):
+        '''timing.ImportTimings().table()'''
+
+        self.t.parse(IMPORT_TIMES)
+
+        _ = self.t.table().splitlines()
+
+        self.assertEqual([ 'upkern.sources', '0.0', '95.0' ], _[1].split())
+        self.assertEqual([ 'portage', '(deferred)', '95.0' ], _[2].split())
+        self.assertEqual([ 'upkern.arguments', '0.2', '1.2' ], _[3].split())
+        self.assertEqual([ 'argparse', '1.0' ], _[4].split())
+        self.assertEqual([ 'total', '0.4', '96.9' ], _[-1].split())
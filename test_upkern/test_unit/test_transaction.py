@@ -0,0 +1,293 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from upkern import transaction
+
+
+class TestTransaction(unittest.TestCase):
+    mocks_mask = set()
+    mocks = set()
+
+    def setUp(self):
+        super(TestTransaction, self).setUp()
+
+        self.directory = tempfile.mkdtemp()
+
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.transaction_directory = os.path.join(self.directory, 'var', 'lib', 'upkern', 'transaction')
+
+        for name in ( 'bzImage-3.12.6-gentoo', 'bzImage-3.10.7-gentoo' ):
+            self.write(os.path.join('boot', name), name)
+
+        os.symlink('linux-3.10.7-gentoo', self.path('linux'))
+
+        self.mock_current()
+        self.mock_system_boot()
+
+    mocks.add('transaction._current')
+    def mock_current(self):
+        if 'transaction._current' in self.mocks_mask:
+            return
+
+        _ = mock.patch.object(transaction, '_current', None)
+
+        self.addCleanup(_.stop)
+
+        _.start()
+
+        _ = mock.patch.object(transaction, '_lock', None)
+
+        self.addCleanup(_.stop)
+
+        _.start()
+
+        self.addCleanup(transaction._release)
+
+    mocks.add('system.boot')
+    def mock_system_boot(self):
+        if 'system.boot' in self.mocks_mask:
+            return
+
+        _ = mock.patch('upkern.transaction.system.boot')
+
+        self.addCleanup(_.stop)
+
+        self.mocked_system_boot = _.start()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write(self, name, contents):
+        if not os.path.isdir(os.path.dirname(self.path(name))):
+            os.makedirs(os.path.dirname(self.path(name)))
+
+        with open(self.path(name), 'w') as fh:
+            fh.write(contents)
+
+    def read(self, name):
+        with open(self.path(name), 'r') as fh:
+            return fh.read()
+
+    def change(self):
+        '''Upgrade the "system" in self.directory under protection.'''
+
+        transaction.protect(self.path('boot/bzImage-3.12.6-gentoo'))
+        self.write('boot/bzImage-3.12.6-gentoo', 'rebuilt')
+
+        transaction.protect(self.path('boot/bzImage-3.13.0-gentoo'))
+        self.write('boot/bzImage-3.13.0-gentoo', 'new')
+
+        transaction.protect(self.path('linux'))
+        os.remove(self.path('linux'))
+        os.symlink('linux-3.13.0-gentoo', self.path('linux'))
+
+        transaction.protect(self.path('boot/bzImage-3.12.6-gentoo'))
+        self.write('boot/bzImage-3.12.6-gentoo', 'rebuilt again')
+
+    def assertDiscarded(self):
+        self.assertEqual([ transaction.LOCK ], os.listdir(self.transaction_directory))
+
+    def assertUnchanged(self):
+        self.assertEqual([ 'bzImage-3.10.7-gentoo', 'bzImage-3.12.6-gentoo' ], sorted(os.listdir(self.path('boot'))))
+        self.assertEqual('bzImage-3.12.6-gentoo', self.read('boot/bzImage-3.12.6-gentoo'))
+        self.assertEqual('linux-3.10.7-gentoo', os.readlink(self.path('linux')))
+
+    def test_protect_inactive(self):
+        '''transaction.protect()—without a transaction'''
+
+        self.assertFalse(transaction.active())
+
+        transaction.protect(self.path('boot/bzImage-3.12.6-gentoo'))
+
+        self.assertFalse(os.path.exists(self.transaction_directory))
+
+    def test_commit(self):
+        '''transaction.commit()'''
+
+        transaction.begin(self.transaction_directory)
+
+        self.change()
+
+        transaction.commit()
+
+        self.assertFalse(transaction.active())
+        self.assertDiscarded()
+
+        self.assertEqual('rebuilt again', self.read('boot/bzImage-3.12.6-gentoo'))
+        self.assertEqual('linux-3.13.0-gentoo', os.readlink(self.path('linux')))
+
+    def test_rollback(self):
+        '''transaction.rollback()'''
+
+        transaction.begin(self.transaction_directory)
+
+        self.change()
+
+        self.assertEqual(3, len(transaction._current.operations))
+
+        transaction.rollback()
+
+        self.assertFalse(transaction.active())
+        self.assertDiscarded()
+
+        self.assertUnchanged()
+
+    def test_recover(self):
+        '''transaction.recover()—interrupted transaction'''
+
+        transaction.begin(self.transaction_directory)
+
+        self.change()
+
+        transaction._current = None  # crash
+        transaction._release()
+
+        transaction.recover(self.transaction_directory)
+
+        self.mocked_system_boot.mount.assert_called_once_with()
+
+        self.assertDiscarded()
+
+        self.assertUnchanged()
+
+    def test_recover_committed(self):
+        '''transaction.recover()—committed transaction'''
+
+        transaction.begin(self.transaction_directory)
+
+        self.change()
+
+        transaction._current.state = 'committed'
+        transaction._current._save()
+        transaction._current = None  # crash
+        transaction._release()
+
+        transaction.recover(self.transaction_directory)
+
+        self.assertDiscarded()
+
+        self.assertEqual('rebuilt again', self.read('boot/bzImage-3.12.6-gentoo'))
+
+    def test_recover_rolling_back(self):
+        '''transaction.recover()—interrupted rollback'''
+
+        transaction.begin(self.transaction_directory)
+
+        self.change()
+
+        undo = transaction.Transaction._undo
+
+        def crash(self, operation):
+            if operation['action'] != 'relink':
+                raise KeyboardInterrupt()  # crash
+
+            undo(self, operation)
+
+        with mock.patch.object(transaction.Transaction, '_undo', crash):
+            self.assertRaises(KeyboardInterrupt, transaction._current.rollback)
+
+        transaction._current = None
+        transaction._release()
+
+        self.assertEqual('linux-3.10.7-gentoo', os.readlink(self.path('linux')))
+
+        os.remove(self.path('linux'))
+        os.symlink('linux-3.11.7-gentoo', self.path('linux'))  # changed since
+
+        transaction.recover(self.transaction_directory)
+
+        self.assertDiscarded()
+
+        self.assertEqual('bzImage-3.12.6-gentoo', self.read('boot/bzImage-3.12.6-gentoo'))
+        self.assertFalse(os.path.exists(self.path('boot/bzImage-3.13.0-gentoo')))
+        self.assertEqual('linux-3.11.7-gentoo', os.readlink(self.path('linux')))
+
+    def test_recover_rolled_back(self):
+        '''transaction.recover()—rolled back transaction'''
+
+        transaction.begin(self.transaction_directory)
+
+        self.change()
+
+        transaction._current.state = 'rolled back'
+        transaction._current._save()
+        transaction._current = None  # crash
+        transaction._release()
+
+        transaction.recover(self.transaction_directory)
+
+        self.assertDiscarded()
+
+        self.assertEqual('rebuilt again', self.read('boot/bzImage-3.12.6-gentoo'))
+
+    def test_recover_locked(self):
+        '''transaction.recover()—transaction in progress in another run'''
+
+        transaction.begin(self.transaction_directory)
+
+        self.change()
+
+        held = transaction._lock
+
+        self.addCleanup(held[1].close)
+
+        transaction._current, transaction._lock = None, None  # another run
+
+        self.assertRaises(RuntimeError, transaction.recover, self.transaction_directory)
+        self.assertRaises(RuntimeError, transaction.begin, self.transaction_directory)
+
+        self.assertFalse(self.mocked_system_boot.mount.called)
+        self.assertEqual('rebuilt again', self.read('boot/bzImage-3.12.6-gentoo'))
+
+        held[1].close()
+
+        transaction.recover(self.transaction_directory)
+
+        self.assertUnchanged()
+
+    def test_recover_nothing(self):
+        '''transaction.recover()—nothing to recover'''
+
+        transaction.recover(self.transaction_directory)
+
+        self.assertFalse(self.mocked_system_boot.mount.called)
+
+    def test_atomic(self):
+        '''transaction.atomic()'''
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.change()
+
+                raise RuntimeError('failed')
+
+        self.assertFalse(transaction.active())
+
+        self.assertUnchanged()
+
+    def test_atomic_nested(self):
+        '''transaction.atomic()—inside a transaction'''
+
+        transaction.begin(self.transaction_directory)
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.change()
+
+                raise RuntimeError('failed')
+
+        self.assertTrue(transaction.active())
+        self.assertEqual('linux-3.13.0-gentoo', os.readlink(self.path('linux')))
+
+        transaction.rollback()
+
+        self.assertUnchanged()
@@ -6,61 +6,55 @@
 import logging
 
 from upkern.arguments import ARGUMENTS
-from upkern.bootloaders import BootLoader
-from upkern.initramfs import InitialRAMFileSystem
-from upkern.sources import Sources
-from upkern.system import rebuild_modules
 
-def run():
-    '''Main execution function for upkern.'''
-
-    p = ARGUMENTS.parse_args()
-
-    logging.basicConfig(level = getattr(logging, p.level.upper()))
+logger = logging.getLogger(__name__)
 
-    sources = Sources(name = p.name)
-
-    sources.emerge(force = p.force)
+def run():
+    '''Main execution function for upkern.
 
-    sources.prepare(configuration = p.configuration)
-    sources.configure(configurator = p.configurator, accept_defaults = p.yes)
+    .. note::
+        Only the arguments are loaded up front; thus, --help and --version
+        return without importing the rest of upkern (see
+        `upkern.application`) or portage.
 
-    if p.time:
-        start = datetime.datetime.now()
+    '''
 
-    sources.build()
+    p = ARGUMENTS.parse_args()
 
-    if p.time:
-        delta = datetime.datetime.now() - start
+    logging.basicConfig(level = getattr(logging, p.level.upper()))
 
-    if p.module_rebuild:
-        rebuild_modules()
+    if p.profile_startup:
+        profile_startup()
+        return
 
-    sources.install()
+    from upkern import application
 
-    initramfs = None
+    application.run(p)
 
-    if p.initramfs:
-        initramfs = InitialRAMFileSystem(p.initramfs_preparer)
-        initramfs.configure(*p.initramfs_options)
 
-        initramfs.build()
+def profile_startup():
+    '''Log the import time of upkern's modules and their imports.
 
-        initramfs.install()
+    Measures what a run imports: the entry point, `upkern.application`, the
+    imports upkern.sources and upkern.system.portage defer until they're
+    needed and the bootloader and initial ramdisk plugins.
 
-    bootloader = Bootloader()
-    bootloader.configure(sources = sources, kernel_options = p.kernel_options, initramfs = initramfs)
+    '''
 
-    bootloader.build()
+    from upkern import bootloaders
+    from upkern import initramfs
+    from upkern import sources
+    from upkern import system
+    from upkern import timing
 
-    bootloader.install()
+    deferred = {
+            'upkern.sources': sources.DEFERRED_IMPORTS,
+            'upkern.system.portage': system.portage.DEFERRED_IMPORTS,
+            'upkern.bootloaders': sorted(set([ _.partition(':')[0] for _ in bootloaders.BOOTLOADERS.references.values() ])),
+            'upkern.initramfs': sorted(set([ _.partition(':')[0] for _ in initramfs.PREPARERS.references.values() ])),
+            }
 
-    logger.info(
-            'The kernel, %s, has been successfully installed.  Please, check ' \
-            'that all configuration files are installed correctly and the ' \
-            'bootloader is configured correctly',
-            sources.binary_name
-            )
+    timings = timing.ImportTimings([ 'upkern', 'upkern.application' ], deferred)
+    timings.measure()
 
-    if p.time:
-        logger.info('The kernel\'s build time was %s', str(delta))
+    logger.info('upkern\'s imports took:\n%s', timings.table())
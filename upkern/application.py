@@ -0,0 +1,160 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import logging
+import os
+import shlex
+import shutil
+import tempfile
+
+from upkern import journal
+from upkern import system
+from upkern import transaction
+from upkern.bootloaders import BootLoader
+from upkern.initramfs import InitialRAMFileSystem
+from upkern.sources import Sources
+from upkern.system import rebuild_modules
+from upkern.timing import Timings
+
+logger = logging.getLogger(__name__)
+
+def run(p):
+    '''Run upkern as requested by the parsed arguments, p.'''
+
+    journal.start(path = p.journal, fd = p.journal_fd)
+
+    staging = None
+    sources = None
+    timings = None
+    up_to_date = False
+
+    try:
+        transaction.recover()
+        transaction.begin()
+
+        if p.export is not None or p.import_archive is not None:
+            staging = tempfile.mkdtemp(prefix = 'upkern.')
+
+        sources = Sources(
+                name = p.name,
+                plan_jobs = p.plan_jobs,
+                compiler_cache = p.compiler_cache,
+                compiler_cache_size = p.compiler_cache_size,
+                incremental = p.incremental,
+                build_root = p.build_root,
+                artifact_cache = p.artifact_cache,
+                modules_root = staging if p.export is not None else None,
+                )
+
+        timings = Timings()
+
+        if p.import_archive is not None:
+            with timings.phase('import'):
+                sources.import_archive(p.import_archive, staging)
+
+            with timings.phase('install'):
+                sources.install()
+        else:
+            with timings.phase('emerge'):
+                sources.emerge(force = p.force)
+
+            with timings.phase('prepare'):
+                sources.prepare(configuration = p.configuration)
+
+            with timings.phase('configure'):
+                sources.configure(configurator = p.configurator, accept_defaults = p.yes)
+
+            # The fingerprint covers the .config; thus, it's only known once
+            # prepare and configure (which may change it) have run.
+            up_to_date = p.export is None and not p.force and sources.up_to_date
+
+            journal.record('fingerprint', up_to_date = up_to_date)
+
+            if up_to_date:
+                logger.info('%s is already built and installed from this configuration; skipping build, install, initramfs and bootloader', sources.binary_name)
+            else:
+                with timings.phase('build'):
+                    sources.build()
+
+                if p.export is not None:
+                    with timings.phase('export'):
+                        sources.export(p.export)
+                else:
+                    if p.module_rebuild:
+                        sources.finish_modules_install()  # emerge reads /lib/modules
+
+                        with timings.phase('module-rebuild'):
+                            rebuild_modules()
+
+                    with timings.phase('install'):
+                        sources.install()
+
+        if p.export is not None:
+            logger.info('The kernel, %s, has been successfully exported to %s', sources.binary_name, p.export)
+        elif up_to_date:
+            logger.info('The kernel, %s, is already installed', sources.binary_name)
+        else:
+            initramfs = None
+
+            if p.initramfs:
+                with timings.phase('initramfs'):
+                    initramfs = InitialRAMFileSystem(
+                            p.initramfs_preparer,
+                            kernel_release = sources.kernel_release,
+                            kernel_directory = os.path.join('/usr/src', sources.directory_name),
+                            build_directory = sources.build_directory if p.import_archive is None else None,
+                            )
+                    initramfs.configure(*shlex.split(p.initramfs_options or ''))
+
+                    initramfs.build()
+
+                    initramfs.install()
+
+            with timings.phase('bootloader'):
+                bootloader = BootLoader()
+
+                if bootloader is None:
+                    logger.warning('no supported bootloader is installed; skipping bootloader configuration')
+                else:
+                    bootloader.prepare(kernel = sources.binary_name, kernel_options = p.kernel_options or '', initrd = initramfs is not None)
+
+                    bootloader.install()
+
+            logger.info(
+                    'The kernel, %s, has been successfully installed.  Please, check ' \
+                    'that all configuration files are installed correctly and the ' \
+                    'bootloader is configured correctly',
+                    sources.binary_name
+                    )
+
+        if p.time:
+            logger.info('The kernel\'s build phases took:\n%s', timings.table())
+
+        if p.time_json is not None:
+            timings.dump(p.time_json)
+    except BaseException:
+        if sources is not None:
+            try:
+                sources.finish_modules_install()
+            except Exception as e:
+                logger.error('modules_install failed as well: %s', e)
+
+        transaction.rollback()
+        raise
+    else:
+        transaction.commit()
+    finally:
+        if staging is not None:
+            shutil.rmtree(staging, ignore_errors = True)
+
+        try:
+            system.boot.release()
+        except Exception as e:
+            logger.error('failed to release /boot: %s', e)
+        finally:
+            if timings is not None:
+                journal.record('phases', phases = timings.phases)
+
+            journal.stop()
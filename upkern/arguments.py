@@ -20,13 +20,29 @@ ARGUMENTS.add_argument(
                 '`logging`.  Default: %(default)s'
         )
 
+ARGUMENTS.add_argument(
+        '--journal',
+        help = \
+                'Append a machine readable journal (JSON lines) of every ' \
+                'step, command, exit status and copy to the specified file.'
+        )
+
+ARGUMENTS.add_argument(
+        '--journal-fd',
+        type = int,
+        help = \
+                'Write the journal (see --journal) to the specified, already ' \
+                'open, file descriptor.'
+        )
+
 ARGUMENTS.add_argument(
         '--force',
         '-f',
         action = 'store_true',
         help = \
                 'Force any actions that might otherwise block the requested ' \
-                'tasks.'
+                'tasks (e.g. rebuild a kernel that is already installed from ' \
+                'the same sources and configuration).'
         )
 
 ARGUMENTS.add_argument(
@@ -34,7 +50,98 @@ ARGUMENTS.add_argument(
         '-t',
         action = 'store_true',
         help = \
-                'Time the kernel build.'
+                'Report the wall time, CPU time and peak memory of every ' \
+                'phase (emerge, prepare, configure, build, etc).'
+        )
+
+ARGUMENTS.add_argument(
+        '--time-json',
+        help = \
+                'Write the timing of every phase as JSON to the specified ' \
+                'file.'
+        )
+
+ARGUMENTS.add_argument(
+        '--profile-startup',
+        action = 'store_true',
+        help = \
+                'Report the import time of each of upkern\'s modules and of ' \
+                'the modules (e.g. portage) each of them imports, then exit ' \
+                'without building anything.'
+        )
+
+ARGUMENTS.add_argument(
+        '--plan-jobs',
+        action = 'store_true',
+        help = \
+                'Derive make\'s job and load limits from the CPU count, cgroup ' \
+                'CPU quota, available memory and current load instead of ' \
+                'using MAKEOPTS verbatim.'
+        )
+
+ARGUMENTS.add_argument(
+        '--compiler-cache',
+        action = 'store_true',
+        help = \
+                'Compile through a ccache shared by every patch level of the ' \
+                'kernel series (and compiler) being built and report its hit ' \
+                'and miss statistics.'
+        )
+
+ARGUMENTS.add_argument(
+        '--compiler-cache-size',
+        default = '5G',
+        help = \
+                'Maximum size of the compiler cache (in `ccache -M` syntax).  ' \
+                'Default: %(default)s'
+        )
+
+ARGUMENTS.add_argument(
+        '--incremental',
+        action = 'store_true',
+        help = \
+                'Build into a persistent directory per kernel series and ' \
+                'flavour and reuse the previous build\'s objects and ' \
+                'configuration when upgrading between patch levels.'
+        )
+
+ARGUMENTS.add_argument(
+        '--build-root',
+        help = \
+                'Directory (e.g. on tmpfs or fast local storage) to place ' \
+                'the kernel\'s configuration and objects under instead of ' \
+                'building inside `/usr/src/linux`.  Default: in-tree or ' \
+                '`/var/tmp/upkern/build` with --incremental'
+        )
+
+ARGUMENTS.add_argument(
+        '--artifact-cache',
+        help = \
+                'Directory (local or a shared mount) of built kernels keyed ' \
+                'by sources, configuration, architecture and toolchain.  A ' \
+                'matching kernel is installed from the cache instead of ' \
+                'being built; a freshly built kernel is added to it.'
+        )
+
+_ARCHIVE = ARGUMENTS.add_mutually_exclusive_group()
+
+_ARCHIVE.add_argument(
+        '--export',
+        metavar = 'ARCHIVE',
+        help = \
+                'Build the kernel and pack its image, configuration, ' \
+                'System.map and modules into the specified (checksummed) ' \
+                'archive instead of installing it.'
+        )
+
+_ARCHIVE.add_argument(
+        '--import',
+        dest = 'import_archive',
+        metavar = 'ARCHIVE',
+        help = \
+                'Install the kernel from the specified archive (see ' \
+                '--export) instead of building sources; the initial ramdisk ' \
+                'and bootloader are configured as usual.'
         )
 
 ARGUMENTS.add_argument(
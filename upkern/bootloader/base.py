@@ -55,15 +55,29 @@ class BaseBootLoader(object):
 
     @property
     def root_partition(self):
-        """Get the system's root partition."""
+        """Get the system's root partition (as written in /etc/fstab)."""
         return FSTab()["/"]
 
     @property
     def boot_partition(self):
-        """Get the system's boot partition."""
-        if "/boot" in FSTab():
-            return FSTab()["/boot"]
-        return FSTab()["/"]
+        """Get the system's boot partition (as written in /etc/fstab)."""
+        fstab = FSTab()
+        if "/boot" in fstab:
+            return fstab["/boot"]
+        return fstab["/"]
+
+    @property
+    def boot_device(self):
+        """Get the /dev node of the system's boot partition (if resolvable).
+
+        Unlike boot_partition, tags (e.g. UUID=...) are resolved; use this
+        only to inspect the device, not to write it into a configuration.
+
+        """
+        fstab = FSTab()
+        if "/boot" in fstab:
+            return fstab.device("/boot")
+        return fstab.device("/")
 
     @property
     def configuration(self):
@@ -75,8 +89,23 @@ class BaseBootLoader(object):
         """The configuration file for the bootlaoder."""
         raise AttributeError("configuration")
 
+    @staticmethod
+    def initrd_image(kernel):
+        """Get the name of the initial ramdisk for the kernel image in /boot.
+
+        e.g. initramfs-3.12.6-gentoo.img for bzImage-3.12.6-gentoo
+
+        """
+        return "initramfs" + "".join(kernel.partition("-")[1:]) + ".img"
+
     def prepare(self, kernel = None, kernel_options = "", initrd = False):
-        """Prepare the configuration of the bootloader."""
+        """Prepare the configuration of the bootloader.
+
+        kernel is the name of the kernel image in /boot (e.g.
+        bzImage-3.12.6-gentoo), kernel_options the literal options to pass to
+        the kernel and initrd whether an initial ramdisk was installed for it.
+
+        """
         raise NotImplementedError("prepare")
 
     def install(self):
@@ -16,8 +16,10 @@
 # this program; if not, write to the Free Software Foundation, Inc., 59 Temple
 # Place - Suite 330, Boston, MA  02111-1307, USA.            
 
-"""The module that includes all the supported bootloaders."""
+"""The module that includes all the supported bootloaders.
 
-from grub import Grub
-from grub2 import Grub2
+Bootloaders are imported individually when selected (see
+upkern.bootloaders.BOOTLOADERS).
+
+"""
 
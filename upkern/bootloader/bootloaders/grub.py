@@ -21,9 +21,10 @@
 import re
 import datetime
 import os
-import shutil
 import upkern.helpers as helpers
 
+from upkern import journal
+from upkern import transaction
 from upkern.bootloader.base import BaseBootLoader
 from upkern.helpers import mountedboot
 
@@ -55,11 +56,11 @@ class Grub(BaseBootLoader):
         """The grub root parameter."""
         if not hasattr(self, "_grub_root"):
             match = re.match(r"/dev/[\w\d]+(?P<letter>\w)(?P<number>\d+)",
-                    self.boot_partition)
+                    self.boot_device)
 
             if self.arguments["debug"]:
                 helpers.debug({
-                    "self.boot_partition": self.boot_partition,
+                    "self.boot_device": self.boot_device,
                     })
 
             self._grub_root = "(hd{letter!s},{number!s})".format(
@@ -85,6 +86,7 @@ class Grub(BaseBootLoader):
         """The grub configuration file (mutable)."""
         self._configuration = value
 
+    @journal.journaled('bootloader.prepare', lambda _: { 'bootloader': 'grub' })
     @mountedboot
     def prepare(self, kernel = None, kernel_options = "", initrd = False):
         """Prepare the configuration file."""
@@ -92,7 +94,7 @@ class Grub(BaseBootLoader):
         if not self.arguments["quiet"]:
             print("Preparing GRUB configuration ...")
 
-        if not self._has_kernel(kernel.name):
+        if not self._has_kernel(kernel):
             new_configuration = []
 
             options = []
@@ -130,7 +132,7 @@ class Grub(BaseBootLoader):
 
             if len(kernel_options):
                 kernel_options = " ".join(list(set(
-                    kernel_options.split(" ").extend(options))))
+                    kernel_options.split(" ") + options)))
             else:
                 kernel_options = " ".join(list(set(options)))
 
@@ -145,10 +147,10 @@ class Grub(BaseBootLoader):
                     "",
                     "# Kernel added {time!s}:".format(
                         time = datetime.datetime.now()),
-                    "title={kernel_name}".format(kernel_name = kernel.name),
+                    "title={kernel_name}".format(kernel_name = kernel),
                     "  root {grub_root}".format(grub_root = self.grub_root),
                     "  kernel /boot/{image} root={root} {options}".format(
-                        image = kernel.image, root = self.root_partition,
+                        image = kernel, root = self.root_partition,
                         options = kernel_options),
                     ]
 
@@ -161,7 +163,7 @@ class Grub(BaseBootLoader):
             if initrd:
                 kernel_entry.append(
                         "  initrd /boot/{initrd}".format(
-                            initrd = kernel.initrd))
+                            initrd = self.initrd_image(kernel)))
 
             new_configuration.extend(kernel_entry)
 
@@ -170,6 +172,7 @@ class Grub(BaseBootLoader):
             if not self.arguments["quiet"]:
                 print("GRUB configuration prepared.")
 
+    @journal.journaled('bootloader.install', lambda _: { 'bootloader': 'grub' })
     @mountedboot
     def install(self):
         """Install the configuration and make the system bootable."""
@@ -189,23 +192,12 @@ class Grub(BaseBootLoader):
             helpers.colorize("GREEN", "\n".join(dry_list))
         else:
             if os.access(self.configuration_uri, os.W_OK):
-                try:
-                    shutil.copy(self.configuration_uri, "{config}.bak".format(
-                        config = self.configuration_uri))
+                with transaction.atomic():
+                    transaction.protect(self.configuration_uri)
                     configuration = open(self.configuration_uri, "w")
                     configuration.write("\n".join(self.configuration))
                     configuration.flush()
                     configuration.close()
-                except Exception as error:
-                    os.rename("{config}.bak".format(
-                        config = self.configuration_uri),
-                        self.configuration_uri)
-                    raise error
-                finally:
-                    if os.access("{config}.bak".format(
-                        config = self.configuration_uri), os.W_OK):
-                        os.remove("{config}.bak".format(
-                            config = self.configuration_uri))
 
         if not self.arguments["quiet"]:
             print("GRUB configuration installed.")
@@ -215,4 +207,3 @@ class Grub(BaseBootLoader):
         return len([
             line for line in self.configuration if re.search(kernel_name, line)
             ])
-
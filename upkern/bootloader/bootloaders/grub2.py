@@ -20,34 +20,31 @@
 
 import re
 import os
-import shutil
-import subprocess
 import upkern.helpers as helpers
 
+from upkern import journal
+from upkern import transaction
 from upkern.bootloader.base import BaseBootLoader
 from upkern.helpers import mountedboot
-from upkern.system import FSTab
+from upkern.system import commands
+from upkern.system import utilities
+from upkern.system.fstab import FSTab
 
 def mountedgrub(func):
-    """A decorator that checks if boot is mounted before running the function.
+    """A decorator that checks if /boot/grub2 is mounted before running the function.
 
-    If boot is not mounted; it gets mounted and unmounted properly.
+    If /boot/grub2 is a separate filesystem, it's held mounted (nesting with
+    any other users of the mount) while the function runs.
 
     """
 
     def new_func(*args, **kargs):
         """Closure definition."""
-        if FSTab()["/boot/grub2"] and os.path.ismount("/boot/grub2"):
-            res = func(*args, **kargs)
-        else:
-            os.system('mount /boot/grub2')
-            try:
-                res = func(*args, **kargs)
-            except Exception as error:
-                raise error
-            finally:
-                os.system('umount /boot/grub2')
-        return res
+        if "/boot/grub2" not in FSTab():
+            return func(*args, **kargs)
+
+        with utilities.mounted("/boot/grub2"):
+            return func(*args, **kargs)
     return new_func
 
 class Grub2(BaseBootLoader):
@@ -96,17 +93,23 @@ class Grub2(BaseBootLoader):
         """The grub configuration file (mutable)."""
         self._configuration = value
 
+    @journal.journaled('bootloader.prepare', lambda _: { 'bootloader': 'grub2' })
     @mountedboot
-    def prepare(self, kernel = None, kernel_options = ""):
-        """Prepare the configuration file."""
+    def prepare(self, kernel = None, kernel_options = "", initrd = False):
+        """Prepare the configuration file.
 
-        grub_image = "kernel" + "".join(kernel.image.partition("-")[1:])
+        grub2-mkconfig finds the initial ramdisk next to the kernel on its own;
+        thus, initrd is ignored.
+
+        """
+
+        grub_image = "kernel" + "".join(kernel.partition("-")[1:])
 
         if self.arguments["dry_run"]:
             dry_list = [
                     "pushd /boot",
                     "ln -s {kernel_image} {grub_image}".format(
-                        grub_image = grub_image, kernel_image = kernel.image),
+                        grub_image = grub_image, kernel_image = kernel),
                     "popd",
                     # TODO find a better way to depict this ...
                     "".join([
@@ -120,7 +123,8 @@ class Grub2(BaseBootLoader):
             original_pwd = os.getcwd()
             os.chdir("/boot")
             if not os.path.islink(grub_image):
-                os.symlink(kernel.image, grub_image)
+                transaction.protect(os.path.join("/boot", grub_image))
+                os.symlink(kernel, grub_image)
             os.chdir(original_pwd)
 
             new_grub_defaults = []
@@ -142,15 +146,24 @@ class Grub2(BaseBootLoader):
                 else:
                     new_grub_defaults.append(line.rstrip("\n"))
 
+            transaction.protect(self.grub_defaults_uri)
+
             grub_defaults = open(self.grub_defaults_uri, "w")
             grub_defaults.write("\n".join(new_grub_defaults))
             grub_defaults.flush()
             grub_defaults.close()
 
+    @journal.journaled('bootloader.install', lambda _: { 'bootloader': 'grub2' })
     @mountedgrub
     @mountedboot
     def install(self):
-        """Install the configuration and make the system bootable."""
+        """Install the configuration and make the system bootable.
+
+        The previous configuration is protected by the surrounding transaction
+        (see upkern.transaction) or, without one, restored if grub2-mkconfig
+        fails.
+
+        """
         if self.arguments["dry_run"]:
             dry_list = [
                     "pushd /boot/grub2",
@@ -165,31 +178,16 @@ class Grub2(BaseBootLoader):
             original_directory = os.getcwd()
             try:
                 os.chdir("/boot/grub2")
-                if os.access(self.configuration_uri, os.W_OK):
-                    shutil.copy(self.configuration_uri, "{grub_config}.bak".format(grub_config = self.configuration_uri))
-                status = subprocess.call(
-                        "grub2-mkconfig -o {grub_config}".format(
-                            grub_config = self.configuration_uri),
-                        shell = True)
-                if status != 0:
-                    pass # TODO raise an appropriate error
-
+                with transaction.atomic():
+                    transaction.protect(self.configuration_uri)
+                    status = commands.run([ "grub2-mkconfig", "-o", self.configuration_uri ])
+                    if status != 0:
+                        raise RuntimeError("grub2-mkconfig failed with status {0}".format(status))
             except Exception as error:
                 if self.arguments["debug"]:
                     helpers.debug({
                         "error": error,
                         })
-    
-                if os.access("{grub_config}.bak".format(
-                    grub_config = self.configuration_uri), os.W_OK):
-                    os.rename("{grub_config}.bak".format(
-                        grub_config = self.configuration_uri),
-                        self.configuration_uri)
                 raise error
             finally:
-                if os.access("{grub_config}.bak".format(
-                    grub_config = self.configuration_uri), os.W_OK):
-                    os.remove("{grub_config}.bak".format(
-                        grub_config = self.configuration_uri))
                 os.chdir(original_directory)
-
@@ -3,36 +3,60 @@
 # upkern is freely distributable under the terms of an MIT-style license.
 # See COPYING or http://www.opensource.org/licenses/mit-license.php.
 
-BOOTLOADERS = {}
+import logging
 
-from upkern.bootloaders import *
+from upkern import journal
+from upkern import plugins
+from upkern import system
+
+logger = logging.getLogger(__name__)
+
+BOOTLOADERS = plugins.Registry('upkern.bootloaders', {
+    'grub': ( 'upkern.bootloader.bootloaders.grub:Grub', { 'package': 'sys-boot/grub', 'slot': '0' } ),
+    'grub2': ( 'upkern.bootloader.bootloaders.grub2:Grub2', { 'package': 'sys-boot/grub', 'slot': '2' } ),
+    })
 
 def BootLoader(*args, **kwargs):
     '''Bootloader factory.
 
-    Returns an instance of the first BootLoader class that matches an installed
-    bootloader on the system.
+    Returns an instance of the BootLoader class (registered in BOOTLOADERS)
+    matching an installed bootloader on the system.
+
+    Every registered bootloader declares the package (e.g. sys-boot/grub) and
+    SLOT it handles: the built in ones in the registry's manifest, third party
+    ones as package and slot class attributes.  Only those packages are looked
+    up in the (cached) installed package database (see
+    `upkern.system.vdb.installed`).  If several are installed, the most
+    recently merged wins.  Only the chosen bootloader's module is imported.
 
     All arguments passed are proxied to the returned BootLoader implementation.
 
     '''
 
-    installed_bootloaders = get_installed_cpvs(lambda _: _.startswith('sys-boot'))
-    installed_bootloaders = [ split_cpv(bootloader)[1] + Package(_).environment('SLOT') for _ in installed_bootloaders ]
+    declared = dict([ ( name, BOOTLOADERS.metadata(name, 'package', 'slot') ) for name in BOOTLOADERS ])
+
+    installed = system.vdb.installed(sorted(set([ _['package'] for _ in declared.values() ])))
 
-    logger.debug('installed_bootloaders: %s', installed_bootloaders)
+    logger.debug('installed: %s', installed)
 
-    eligible_bootloaders = set(BOOTLOADERS.keys()) & set(installed_bootloaders)
+    eligible = []
 
-    logger.debug('eligible_bootloaders: %s', eligible_bootloaders)
+    for name, bootloader in declared.items():
+        for _ in installed[bootloader['package']]:
+            if _.slot == bootloader['slot']:
+                eligible.append(( _.counter, name ))
+
+    eligible.sort()
+
+    logger.debug('eligible: %s', eligible)
 
     bootloader = None
 
-    try:
-        bootloader = eligible_bootloaders.pop()(*args, **kwargs)
-    except KeyError:
-        pass
+    if len(eligible):
+        bootloader = BOOTLOADERS[eligible[-1][1]](*args, **kwargs)
 
     logger.info('using %s as the bootloader', bootloader)
 
+    journal.record('bootloader', installed = sorted([ _[1] for _ in eligible ]), selected = type(bootloader).__name__ if bootloader is not None else None)
+
     return bootloader
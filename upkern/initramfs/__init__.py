@@ -4,15 +4,14 @@
 # See COPYING or http://www.opensource.org/licenses/mit-license.php.
 
 import logging
-import os
 
-from upkern import helpers
+from upkern import plugins
 
 logger = logging.getLogger(__name__)
 
-PREPARERS = {}
-
-helpers.load_all_modules(__name__, os.path.dirname(__file__))
+PREPARERS = plugins.Registry('upkern.preparers', {
+    'genkernel': ( 'upkern.initramfs.genkernel:GenKernelPreparer', {} ),
+    })
 
 
 class InitialRAMFileSystem(object):
@@ -4,14 +4,97 @@
 # See COPYING or http://www.opensource.org/licenses/mit-license.php.
 
 import logging
-import subprocess
+import os
+import re
+import shlex
 
-from upkern.initramfs import PREPARERS
+from upkern import journal
+from upkern import system
+from upkern import transaction
 
 logger = logging.getLogger(__name__)
 
 
 class GenKernelPreparer(object):
+    '''Initial ramdisk built by genkernel.
+
+    Parameters
+    ----------
+
+    :``kernel_release``:   Release of the kernel (e.g. 3.12.6-gentoo) the
+                           initial ramdisk is built for.  Default: the
+                           release of the sources `/usr/src/linux` points at
+                           (which is what genkernel builds for).
+    :``kernel_directory``: Sources of that kernel (genkernel's --kerneldir).
+                           Default: genkernel's own (`/usr/src/linux`).
+    :``build_directory``:  Directory the kernel was built in if not the
+                           sources themselves (genkernel's
+                           --kernel-outputdir).
+
+    '''
+
+    def __init__(self, kernel_release = None, kernel_directory = None, build_directory = None):
+        self._kernel_release = kernel_release
+
+        self.kernel_directory = kernel_directory
+        self.build_directory = build_directory
+
+    @property
+    def kernel_release(self):
+        '''Release of the kernel the initial ramdisk is built for.'''
+
+        if self._kernel_release is None:
+            self._kernel_release = re.sub(r'^linux-', '', os.path.basename(os.path.realpath('/usr/src/linux')))
+
+        return self._kernel_release
+
+    def images(self, names):
+        '''The names (of files in `/boot`) of this kernel's initial ramdisks.
+
+        Both genkernel's naming schemes (initramfs-genkernel-ARCH-RELEASE and
+        initramfs-RELEASE.img) and its backups (.old) are recognized.
+
+        Examples
+        --------
+
+        >>> sorted(GenKernelPreparer('3.12.6-gentoo').images([
+        ...     'initramfs-genkernel-x86_64-3.12.6-gentoo',
+        ...     'initramfs-genkernel-x86_64-3.12.6-gentoo-r1',
+        ...     'initramfs-3.12.6-gentoo.img.old',
+        ...     'bzImage-3.12.6-gentoo',
+        ...     ]))
+        ['initramfs-3.12.6-gentoo.img.old', 'initramfs-genkernel-x86_64-3.12.6-gentoo']
+
+        '''
+
+        expression = re.compile(r'^initramfs-(?:.*-)?' + re.escape(self.kernel_release) + r'(?:\.img)?(?:\.old)?$')
+
+        return [ _ for _ in names if expression.match(_) ]
+
+    @property
+    def kernel_options(self):
+        '''List of genkernel options selecting the kernel to build for.
+
+        .. note::
+            Raises a RuntimeError if `kernel_directory` is missing (e.g. an
+            imported kernel whose sources aren't installed) rather than
+            letting genkernel build for whatever `/usr/src/linux` points at.
+
+        '''
+
+        options = []
+
+        if self.kernel_directory is not None:
+            if not os.path.isdir(self.kernel_directory):
+                raise RuntimeError('genkernel needs the sources of {0} in {1}'.format(self.kernel_release, self.kernel_directory))
+
+            options.append('--kerneldir=' + self.kernel_directory)
+
+        if self.build_directory is not None and os.path.realpath(self.build_directory) != os.path.realpath(self.kernel_directory or '/usr/src/linux'):
+            options.append('--kernel-outputdir=' + self.build_directory)
+
+        return options
+
     @property
     def options(self):
         '''List of options that will be passed to genkernel.
@@ -28,27 +111,49 @@ class GenKernelPreparer(object):
 
         return self._options
 
+    @journal.journaled('initramfs.build', lambda _: { 'preparer': 'genkernel' })
     def build(self):
         '''Build the initramfs object.
 
-        Invoke genkernel to build initramfs.
+        Invoke genkernel to build initramfs.  Genkernel writes into the
+        session's `/boot` mount rather than mounting it again.
+
+        .. note::
+            The existing initramfs images of this kernel (which genkernel may
+            replace or rename) are protected by the surrounding transaction
+            and the images genkernel creates are recorded in it; other
+            kernels' images are left alone.
 
         '''
 
         logger.info('building the initramfs')
 
-        command = 'genkernel --no-ramdisk-modules {0} initramfs'.format(self.options)
-        command = ' '.join(command.split())
+        command = [ 'genkernel', '--no-mountboot', '--no-ramdisk-modules' ] + self.kernel_options + shlex.split(self.options) + [ 'initramfs' ]
 
         logger.debug('command: %s', command)
 
-        status = subprocess.call(command, shell = True)
+        system.boot.mount()
+
+        before = set(system.boot.inventory())
+
+        for name in sorted(self.images(before)):
+            transaction.protect(os.path.join(system.boot.BOOT_DIRECTORY, name))
+
+        try:
+            status = system.commands.run(command)
+        finally:
+            system.boot.invalidate()
+
+            if transaction.active():
+                for name in sorted(set(system.boot.inventory()) - before):
+                    transaction.created(os.path.join(system.boot.BOOT_DIRECTORY, name))
 
         if status != 0:
             raise RuntimeError('initramfs did not build correctly')
 
         logger.info('finished building the initramfs')
 
+    @journal.journaled('initramfs.configure', lambda _: { 'preparer': 'genkernel' })
     def configure(self, *args):
         '''Set the options for this initramfs from the passed arguments
 
@@ -59,4 +164,14 @@ class GenKernelPreparer(object):
 
         self._options = ' '.join([ '--' + _ for _ in args ])
 
-PREPARERS['genkernel'] = GenKernelPreparer
+    @journal.journaled('initramfs.install', lambda _: { 'preparer': 'genkernel' })
+    def install(self):
+        '''Install the initramfs.
+
+        .. note::
+            Nothing is left to do: genkernel writes the image straight into
+            `/boot` while building (see `build`).
+
+        '''
+
+        logger.info('genkernel installed the initramfs into /boot while building')
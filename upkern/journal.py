@@ -0,0 +1,113 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import functools
+import json
+import logging
+import os
+import socket
+import sys
+import time
+
+from upkern import information
+
+logger = logging.getLogger(__name__)
+
+_stream = None
+
+
+def start(path = None, fd = None):
+    '''Start writing the journal to the given path or file descriptor.
+
+    The journal is a stream of JSON objects, one per line, each carrying at
+    least an ``event`` and a ``timestamp`` (seconds since the epoch).  The first
+    event identifies the host, upkern version and command line of the run.
+
+    '''
+
+    global _stream
+
+    if path is not None:
+        _stream = open(path, 'a')
+    elif fd is not None:
+        _stream = os.fdopen(fd, 'a')
+    else:
+        return
+
+    logger.info('journaling to %s', path if path is not None else 'fd ' + str(fd))
+
+    record('journal', host = socket.gethostname(), version = information.VERSION, argv = sys.argv)
+
+
+def stop():
+    '''Stop writing the journal.'''
+
+    global _stream
+
+    if _stream is not None:
+        _stream.close()
+
+    _stream = None
+
+
+def enabled():
+    '''True if a journal is being written; otherwise, False.'''
+
+    return _stream is not None
+
+
+def record(event, **fields):
+    '''Write a single event to the journal (if enabled).'''
+
+    if _stream is None:
+        return
+
+    fields['event'] = event
+    fields['timestamp'] = time.time()
+
+    _stream.write(json.dumps(fields, sort_keys = True) + '\n')
+    _stream.flush()
+
+
+def journaled(step, fields = None):
+    '''Decorator recording start and stop events around a method.
+
+    Parameters
+    ----------
+
+    :``step``:   Name of the step (e.g. sources.build) the method performs.
+    :``fields``: Callable taking the method's instance and returning extra
+                 fields (e.g. the kernel version) for both events.
+
+    The stop event includes the step's ``duration`` and its ``status`` (ok or
+    failed with the ``error``).
+
+    '''
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapped(self, *args, **kwargs):
+            if not enabled():
+                return function(self, *args, **kwargs)
+
+            _ = {}
+            if fields is not None:
+                _ = fields(self)
+
+            record('start', step = step, **_)
+
+            started = time.time()
+
+            try:
+                result = function(self, *args, **kwargs)
+            except Exception as e:
+                record('stop', step = step, status = 'failed', error = str(e), duration = time.time() - started, **_)
+                raise
+
+            record('stop', step = step, status = 'ok', duration = time.time() - started, **_)
+
+            return result
+        return wrapped
+    return decorator
@@ -0,0 +1,157 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import collections.abc
+import importlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _entry_points(group):
+    '''Map the names of the setuptools entry points in group to references.
+
+    .. note::
+        Empty if neither importlib.metadata (Python 3.8) nor pkg_resources is
+        available.
+
+    '''
+
+    try:
+        from importlib import metadata
+    except ImportError:
+        try:
+            import pkg_resources
+        except ImportError:
+            logger.debug('no entry point support; skipping %s', group)
+            return {}
+
+        return dict([ ( _.name, _.module_name + ':' + '.'.join(_.attrs) ) for _ in pkg_resources.iter_entry_points(group) ])
+
+    _ = metadata.entry_points()
+
+    if hasattr(_, 'select'):
+        _ = _.select(group = group)
+    else:
+        _ = _.get(group, [])
+
+    return dict([ ( entry_point.name, entry_point.value ) for entry_point in _ ])
+
+
+class Registry(collections.abc.Mapping):
+    '''Mapping of plugin names to plugin classes imported on first use.
+
+    Names are known up front (from the manifest of built in plugins and the
+    setuptools entry points in group) without importing anything; a plugin's
+    module is imported only when the plugin is looked up.  Plugins may also
+    register (already imported) classes directly by assignment.
+
+    The manifest is the only record of the built in plugins: their metadata
+    isn't repeated on their classes and setup.py declares their entry points
+    from it (see `entry_points`).  Third party plugins carry their metadata as
+    class attributes.
+
+    Parameters
+    ----------
+
+    :``group``:    Entry point group of third party plugins (e.g.
+                   upkern.bootloaders).
+    :``manifest``: Dictionary mapping the names of the built in plugins to
+                   their reference (module:class) and a dictionary of
+                   metadata (see `metadata`).
+
+    Examples
+    --------
+
+    >>> r = Registry('upkern.examples', { 'ordered': ( 'collections:OrderedDict', { 'ordered': True } ) })
+    >>> r.metadata('ordered', 'ordered')
+    {'ordered': True}
+    >>> r['ordered']
+    <class 'collections.OrderedDict'>
+
+    '''
+
+    def __init__(self, group, manifest = None):
+        self.group = group
+
+        self._manifest = dict(manifest or {})
+        self._references = None
+        self._loaded = {}
+
+    @property
+    def references(self):
+        '''Dictionary mapping every plugin name to its reference.
+
+        .. note::
+            This property is cached after the first invocation until the object
+            is garbage collected.
+
+        '''
+
+        if self._references is None:
+            self._references = _entry_points(self.group)
+            self._references.update([ ( name, reference ) for name, ( reference, metadata ) in self._manifest.items() ])
+
+            logger.debug('%s plugins: %s', self.group, self._references)
+
+        return self._references
+
+    def entry_points(self):
+        '''Setuptools entry point declarations of the built in plugins.
+
+        Examples
+        --------
+
+        >>> Registry('upkern.examples', { 'ordered': ( 'collections:OrderedDict', {} ) }).entry_points()
+        ['ordered = collections:OrderedDict']
+
+        '''
+
+        return sorted([ name + ' = ' + reference for name, ( reference, metadata ) in self._manifest.items() ])
+
+    def metadata(self, name, *keys):
+        '''Dictionary of the named plugin's metadata for the given keys.
+
+        Taken from the manifest when it records all of them (nothing is
+        imported); otherwise, from the plugin class' attributes.
+
+        '''
+
+        if name in self._manifest and all([ _ in self._manifest[name][1] for _ in keys ]):
+            return dict([ ( _, self._manifest[name][1][_] ) for _ in keys ])
+
+        return dict([ ( _, getattr(self[name], _) ) for _ in keys ])
+
+    def __getitem__(self, name):
+        if name not in self._loaded:
+            if name in self._manifest:
+                reference = self._manifest[name][0]
+            else:
+                reference = self.references[name]
+
+            module_name, _, attribute = reference.partition(':')
+
+            logger.info('loading %s plugin %s from %s', self.group, name, module_name)
+
+            plugin = importlib.import_module(module_name)
+
+            for _ in attribute.split('.'):
+                plugin = getattr(plugin, _)
+
+            self._loaded.setdefault(name, plugin)
+
+        return self._loaded[name]
+
+    def __setitem__(self, name, plugin):
+        self._loaded[name] = plugin
+
+    def __iter__(self):
+        return iter(sorted(set(self.references) | set(self._loaded)))
+
+    def __len__(self):
+        return len(set(self.references) | set(self._loaded))
+
+    def __contains__(self, name):
+        return name in self._loaded or name in self._manifest or name in self.references
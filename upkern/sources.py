@@ -3,32 +3,157 @@
 # upkern is freely distributable under the terms of an MIT-style license.
 # See COPYING or http://www.opensource.org/licenses/mit-license.php.
 
-import gentoolkit.helpers
-import gentoolkit.query
+import functools
+import hashlib
+import json
 import logging
 import os
 import platform
-import portage
 import re
+import shlex
 import shutil
-import subprocess
 
+from upkern import journal
+from upkern import transaction
 from upkern import system
 
 logger = logging.getLogger(__name__)
 
-_kernel_index_expression = re.compile(
-        r'.*?(?P<major>\d+)\.'
-        r'(?P<minor>\d+)'
-        r'(?:\.(?P<patch>\d+))?'
-        r'-[^-]*(?:-r(?P<revision>\d+))?'
+# Imported by the Sources methods that use them rather than here: importing
+# them takes longer than everything else upkern does for --help or --version
+# (portage itself is deferred by upkern.system.portage).
+DEFERRED_IMPORTS = ( 'gentoolkit.query', )
+
+_kernel_version_expression = re.compile(
+        r'^\D*?(?P<numbers>\d+(?:\.\d+)*)'
+        r'(?:-rc(?P<rc>\d+))?'
+        r'(?:-(?P<flavour>(?!r\d+$)[^-]+))?'
+        r'(?:-rc(?P<flavour_rc>\d+))?'
+        r'(?:-r(?P<revision>\d+))?$'
         )
 
+@functools.total_ordering
+class KernelVersion(object):
+    '''Parsed, comparable kernel version.
+
+    Orders by the numeric version (any number of parts; trailing zeros are
+    insignificant), then release candidates before the release, then the
+    flavour and finally the ebuild revision.
+
+    Examples
+    --------
+
+    >>> KernelVersion('linux-3.13-rc8-git') < KernelVersion('linux-3.13.0-gentoo')
+    True
+
+    >>> KernelVersion('linux-2.6.32.61-gentoo') < KernelVersion('linux-2.6.32.7-gentoo')
+    False
+
+    >>> KernelVersion('config-3.10.7-gentoo-r1').series
+    'gentoo-3.10'
+
+    '''
+
+    __slots__ = ( 'string', 'numbers', 'rc', 'flavour', 'revision', 'key' )
+
+    def __init__(self, string):
+        self.string = string
+
+        self.numbers = ()
+        self.rc = None
+        self.flavour = ''
+        self.revision = 0
+
+        _ = _kernel_version_expression.match(string)
+
+        if _:
+            self.numbers = tuple([ int(number) for number in _.group('numbers').split('.') ])
+
+            rc = _.group('rc') or _.group('flavour_rc')
+            if rc is not None:
+                self.rc = int(rc)
+
+            self.flavour = _.group('flavour') or ''
+            self.revision = int(_.group('revision') or 0)
+
+        numbers = list(self.numbers)
+        while len(numbers) and numbers[-1] == 0:
+            numbers.pop()
+
+        self.key = ( tuple(numbers), self.rc is None, self.rc or 0, self.flavour, self.revision )
+
+    @property
+    def series(self):
+        '''Flavour and major.minor series (e.g. gentoo-3.12).
+
+        Kernels of the same series differ only by patch level (and revision).
+
+        .. note::
+            Unparseable strings are their own series.
+
+        '''
+
+        if not len(self.numbers):
+            return self.string
+
+        return '{0}-{1}'.format(self.flavour or 'vanilla', '.'.join([ str(_) for _ in ( self.numbers + ( 0, 0 ) )[:2] ]))
+
+    def __eq__(self, other):
+        if not isinstance(other, KernelVersion):
+            return NotImplemented
+
+        return self.key == other.key
+
+    def __lt__(self, other):
+        if not isinstance(other, KernelVersion):
+            return NotImplemented
+
+        return self.key < other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return 'KernelVersion({0!r})'.format(self.string)
+
+@functools.lru_cache(maxsize = None)
+def kernel_version(kernel_string):
+    '''Memoized KernelVersion for the kernel_string.
+
+    Suitable as a sort key: every string is parsed only once per process.
+
+    '''
+
+    return KernelVersion(kernel_string)
+
+def kernel_series(kernel_string):
+    '''Map the kernel_string to its flavour and major.minor series.
+
+    Kernels of the same series differ only by patch level (and revision).
+
+    Examples
+    --------
+
+    >>> kernel_series('linux-3.10.7-gentoo-r1')
+    'gentoo-3.10'
+
+    >>> kernel_series('linux-3.11.7-hardened-r1')
+    'hardened-3.11'
+
+    '''
+
+    return kernel_version(kernel_string).series
+
 def kernel_index(kernel_string):
     '''Map the kernel_string to an integer.
 
     The generated integer is always greater for a newer kernel version.
 
+    .. note::
+        Only the first three version numbers and the revision are encoded;
+        compare `kernel_version`s (see KernelVersion) to also order release
+        candidates, flavours and longer versions.
+
     Examples
     --------
 
@@ -40,26 +165,40 @@ def kernel_index(kernel_string):
 
     '''
 
-    logger.debug('kernel_string: %s', kernel_string)
+    _ = kernel_version(kernel_string)
+
+    major, minor, patch = ( _.numbers + ( 0, 0, 0 ) )[:3]
+
+    return int('{:03d}{:03d}{:03d}{:03d}'.format(major, minor, patch, _.revision))
 
-    _ = _kernel_index_expression.match(kernel_string)
+INCREMENTAL_DIRECTORY = '/var/tmp/upkern/build'
+STATE_DIRECTORY = '/var/lib/upkern'
 
-    major = minor = patch = revision = '0'
-    if _:
-        major, minor, patch, revision = _.groups('0')
+def _package_fields(sources):
+    '''Journal fields identifying the sources' package.'''
 
-    key = '{:03d}{:03d}{:03d}{:03d}'.format(int(major), int(minor), int(patch), int(revision))
+    return { 'package': sources.package_name }
 
-    logger.debug('kernel_index: %s', key)
+def _kernel_fields(sources):
+    '''Journal fields identifying the sources' package and kernel version.'''
 
-    return int(key)
+    return { 'package': sources.package_name, 'kernel': sources.directory_name }
 
 class Sources(object):
-    def __init__(self, name = None):
+    def __init__(self, name = None, plan_jobs = False, compiler_cache = False, compiler_cache_size = '5G', incremental = False, build_root = None, artifact_cache = None, modules_root = None):
         self.name = name
+        self.modules_root = modules_root
+        self.artifact_cache = artifact_cache
+        self.incremental = incremental
+        self.build_root = build_root
+        self.plan_jobs = plan_jobs
+        self.compiler_cache = compiler_cache
+        self.compiler_cache_size = compiler_cache_size
         self.built = False
+        self.stages = []
 
         self._packages = {}
+        self._cached_artifacts = None
 
     @property
     def binary_name(self):
@@ -71,24 +210,83 @@ class Sources(object):
 
         return 'bzImage' + self.kernel_suffix
 
+    @property
+    def build_directory(self):
+        '''Directory holding the build's configuration and objects.
+
+        The source directory (an in-tree build) unless `build_root` or
+        `incremental` is set.  Then, it's an output directory (make's O=) under
+        `build_root` (default: `/var/tmp/upkern/build` for incremental builds)
+        named after the sources or, for incremental builds, shared by every
+        patch level of the same kernel series and flavour (e.g.
+        `/var/tmp/upkern/build/gentoo-3.12`).
+
+        '''
+
+        if self.build_root is None and not self.incremental:
+            return '/usr/src/linux'
+
+        root = self.build_root
+        if root is None:
+            root = INCREMENTAL_DIRECTORY
+
+        if self.incremental:
+            return os.path.join(root, kernel_series(self.directory_name))
+
+        return os.path.join(root, self.directory_name)
+
+    @property
+    def build_options(self):
+        '''Make arguments that direct output into `build_directory`.
+
+        Make runs inside the output directory with kbuild's O= sub-make
+        arguments (what `make O=` re-invokes itself with) so the sources are
+        referenced through the `/usr/src/linux` symlink.  A plain `make O=`
+        records the resolved source directory in every object's command line
+        which would force a full rebuild on every upgrade.
+
+        '''
+
+        if self.build_directory == '/usr/src/linux':
+            return []
+
+        return [ '-f', '/usr/src/linux/Makefile', 'KBUILD_SRC=/usr/src/linux' ]
+
+    @property
+    def configuration_difference(self):
+        '''Changes the build's `.config` needs to match these sources.
+
+        Compares the `.config` in `build_directory` against the symbols
+        declared by the sources' Kconfig files (see
+        `upkern.system.kconfig.compare`).  Without added, removed or changed
+        symbols, configuring leaves the configuration as is.
+
+        .. note::
+            None if the build directory has no `.config` (yet).
+
+        '''
+
+        configuration = os.path.join(self.build_directory, '.config')
+
+        if not os.path.exists(configuration):
+            return None
+
+        return system.kconfig.compare(system.kconfig.parse(configuration), system.kconfig.symbols('/usr/src/linux', platform.machine()))
+
     @property
     def configuration_files(self):
         '''List of configuration files present in `/boot`.
 
         .. note::
-            This property will mount the /boot filesystem if possible.
+            This property uses the session's `/boot` inventory (mounting /boot
+            if possible).
 
         '''
 
         if not hasattr(self, '_configuration_files'):
-            boot_mounted = system.utilities.mount('/boot')
-
-            self._configuration_files = [ _ for _ in os.listdir('/boot') if re.match('config-.+', _) ]
+            self._configuration_files = [ _ for _ in system.boot.inventory() if re.match('config-.+', _) ]
 
-            if boot_mounted:
-                system.utilities.unmount('/boot')
-
-            self._configuration_files = sorted(self._configuration_files, key = kernel_index, reverse = True)
+            self._configuration_files = sorted(self._configuration_files, key = kernel_version, reverse = True)
 
         return self._configuration_files
 
@@ -116,22 +314,16 @@ class Sources(object):
         '''
 
         if not hasattr(self, '_directory_name'):
-            finder = gentoolkit.helpers.FileOwner()
-
             logger.debug('self.source_directories: %s', self.source_directories)
 
-            for directory in self.source_directories:
-                logger.info('finding the owner of %s', directory)
+            self._resolve_packages()
 
-                package = self._packages.get(directory, str(finder(('/usr/src/' + directory, ))[0][0]))
+            logger.debug('self.package_name: %s', self.package_name)
 
-                logger.debug('package: %s', package)
-
-                logger.info('finished finding the owner of %s', directory)
-
-                self._packages[directory] = package
+            for directory in self.source_directories:
+                package = self._packages[directory]
 
-                logger.debug('self.package_name: %s', self.package_name)
+                logger.debug('package: %s', package)
 
                 if package == self.package_name.lstrip('='):
                     self._directory_name = directory
@@ -142,6 +334,55 @@ class Sources(object):
 
         return self._directory_name
 
+    @property
+    def fingerprint(self):
+        '''Identity of the kernel these sources build with the current `.config`.
+
+        Dictionary of the sources' package and directory, a hash of the
+        `.config`'s symbols (comments and timestamps don't matter), the
+        machine's architecture, the compiler's version and the make options
+        that can affect the build (all but the job and load limits).
+
+        '''
+
+        return {
+                'package': self.package_name.lstrip('='),
+                'sources': self.directory_name,
+                'configuration': self._configuration_digest(),
+                'architecture': platform.machine(),
+                'compiler': system.make.compiler_version(),
+                'options': system.make.relevant_options(self.make_options),
+                }
+
+    @property
+    def fingerprint_name(self):
+        '''Name of the installed fingerprint for these sources.
+
+        Simply suffixes the binary_name with .fingerprint
+
+        '''
+
+        return self.binary_name + '.fingerprint'
+
+    @property
+    def kernel_release(self):
+        '''Release of the built kernel (i.e. its `/lib/modules` directory).
+
+        Kbuild's `include/config/kernel.release` if present (or the release
+        recorded in an imported archive); otherwise, derived from the
+        directory_name.
+
+        '''
+
+        if hasattr(self, '_kernel_release'):
+            return self._kernel_release
+
+        try:
+            with open(os.path.join(self.build_directory, 'include', 'config', 'kernel.release'), 'r') as fh:
+                return fh.read().strip()
+        except (IOError, OSError):
+            return self.kernel_suffix.lstrip('-')
+
     @property
     def kernel_suffix(self):
         '''Suffix used in creation of other source properties.
@@ -155,6 +396,43 @@ class Sources(object):
 
         return self._kernel_suffix
 
+    @property
+    def make_options(self):
+        '''Options passed to every make invocation for these sources.
+
+        Portage's MAKEOPTS unless `plan_jobs` is set, in which case `-j` and
+        `-l` are derived from the machine's CPUs, memory and load (the other
+        MAKEOPTS are kept).
+
+        .. note::
+            This property is cached after the first invocation until the object
+            is garbage collected.
+
+        '''
+
+        if not hasattr(self, '_make_options'):
+            self._make_options = self.portage_configuration['MAKEOPTS']
+
+            if self.plan_jobs:
+                logger.info('planning make jobs')
+
+                self._make_options = system.make.replan(self._make_options)
+
+            logger.info('using make options: %s', self._make_options)
+
+        return self._make_options
+
+    @property
+    def modules_directory(self):
+        '''Directory the built kernel's modules are installed into.
+
+        `/lib/modules/${kernel_release}` under `modules_root` (make's
+        INSTALL_MOD_PATH) if set; otherwise, under `/`.
+
+        '''
+
+        return os.path.join(self.modules_root or os.path.sep, 'lib', 'modules', self.kernel_release)
+
     @property
     def package_name(self):
         '''Name of the kernel sources package.
@@ -162,8 +440,9 @@ class Sources(object):
         Using the specified name, we determine which sources should be mapped
         by this object.
 
-        If the name is not set, we use the most up to date source directory and
-        use portage to determine the package name.
+        If the name is not set, we use the most up to date source directory
+        owned by an installed package and use portage to determine the package
+        name.
 
         .. note::
             This property is cached after the first invocation until the object
@@ -181,17 +460,18 @@ class Sources(object):
             if self.name is None:
                 logger.info('using latest kernel sources')
 
-                finder = gentoolkit.helpers.FileOwner()
+                self._resolve_packages()
 
-                logger.info('finding the owner of %s', self.source_directories[0])
+                owned = [ _ for _ in self.source_directories if self._packages[_] is not None ]
 
-                package = '=' + self._packages.get(self.source_directories[0], str(finder(('/usr/src/' + self.source_directories[0], ))[0][0]))
+                logger.debug('owned: %s', owned)
 
-                logger.debug('package: %s', package)
+                if not len(owned):
+                    raise RuntimeError('no source directory in /usr/src is owned by an installed package')
 
-                logger.info('finished finding the owner of %s', self.source_directories[0])
+                package = '=' + self._packages[owned[0]]
 
-                self._packages[self.source_directories[0]] = package
+                logger.debug('package: %s', package)
 
                 self._package_name = package
             else:
@@ -214,26 +494,21 @@ class Sources(object):
 
     @property
     def portage_configuration(self):
-        '''System's Portage configuration.
+        '''System's Portage settings (e.g. MAKEOPTS).
 
-        Basically, a dictionary of `emerge -info` output.
-
-        .. note::
-            This property is cached after the first invocation until the object
-            is garbage collected.
+        The settings shared by the whole process (see
+        `upkern.system.portage.Settings`); single keys are read without
+        loading Portage's full configuration where possible.
 
         '''
 
-        if not hasattr(self, '_portage_configuration'):
-            self._portage_configuration = portage.config()
-
-        return self._portage_configuration
+        return system.portage.settings()
 
     @property
     def source_directories(self):
         '''List of source directories in `/usr/src`.
 
-        Uses an integer mapping of kernel versions to determine the ordering
+        Uses the parsed kernel versions (see KernelVersion) to determine the ordering
         for the directories in this list.  The ordering of the source
         directories will be most recent to least recent (by version number).
 
@@ -246,10 +521,70 @@ class Sources(object):
         if not hasattr(self, '_source_directories'):
             directories = [ _ for _ in os.listdir('/usr/src') if re.match(r'linux-.+$', _) ]
 
-            self._source_directories = sorted(directories, key = kernel_index, reverse = True)
+            self._source_directories = sorted(directories, key = kernel_version, reverse = True)
 
         return self._source_directories
 
+    @property
+    def up_to_date(self):
+        '''True if the installed kernel was built from these sources and `.config`.
+
+        Compares `fingerprint` with the fingerprint installed next to the
+        binary in `/boot`; thus, rebuilding and reinstalling can be skipped.
+
+        .. note::
+            If they differ, why (the fingerprint's changed fields and, for a
+            changed configuration, its changed symbols) is logged and
+            journaled.
+
+        '''
+
+        system.boot.mount()
+
+        try:
+            with open(os.path.join('/boot', self.fingerprint_name), 'r') as fh:
+                installed = json.load(fh)
+        except (IOError, OSError, ValueError) as e:
+            logger.debug('no installed fingerprint: %s', e)
+            return False
+
+        logger.debug('installed fingerprint: %s', installed)
+
+        if not os.path.exists(os.path.join('/boot', self.binary_name)):
+            return False
+
+        fingerprint = self.fingerprint
+
+        if installed == fingerprint:
+            return True
+
+        self._explain_rebuild(installed, fingerprint)
+
+        return False
+
+    def _explain_rebuild(self, installed, fingerprint):
+        '''Log and journal how fingerprint differs from the installed one.'''
+
+        reasons = sorted([ _ for _ in set(installed) | set(fingerprint) if installed.get(_) != fingerprint.get(_) ])
+
+        logger.info('rebuilding %s: its %s changed', self.binary_name, ', '.join(reasons))
+
+        difference = None
+
+        if 'configuration' in reasons:
+            try:
+                difference = system.kconfig.diff(system.kconfig.parse(os.path.join('/boot', self.configuration_name)), system.kconfig.parse(os.path.join(self.build_directory, '.config')))
+            except (IOError, OSError) as e:
+                logger.debug('cannot compare with the installed configuration: %s', e)
+
+        if difference is None:
+            journal.record('rebuild', reasons = reasons)
+        else:
+            logger.info('configuration changed by %s added, %s removed and %s changed symbols since the installed build', len(difference.added), len(difference.removed), len(difference.changed))
+            logger.debug('difference: %s', difference)
+
+            journal.record('rebuild', reasons = reasons, added = sorted(difference.added), removed = sorted(difference.removed), changed = sorted(difference.changed))
+
     @property
     def system_map_name(self):
         '''The name of the System.map for these sources.
@@ -260,72 +595,150 @@ class Sources(object):
 
         return 'System.map' + self.kernel_suffix
 
+    @journal.journaled('sources.build', _kernel_fields)
     def build(self):
         '''Build the kernel.
 
-        1. Enter the source directory
-        2. Run `make && make modules_install`
-        3. Leave the source directory
+        1. Run `make bzImage` in the build directory
+        2. Run `make modules` in the build directory
+        3. Start `make modules_install` in the build directory
+
+        Every stage is a separate, timed make invocation drawing from a single
+        jobserver sized by MAKEOPTS.  Make's output is streamed (and hidden when
+        logging quietly) while the image and modules stages report their
+        combined progress against the objects expected from the `.config`.
+        The image and modules stages run back to back (concurrent kbuild
+        invocations in one tree race on the shared prepare targets) but
+        `modules_install` is left running so it overlaps with copying the
+        image in `install`; see `finish_modules_install`.
+
+        If `compiler_cache` is set, CC and HOSTCC are routed through a ccache
+        shared by every patch level of this kernel series built by the same
+        compiler (see `upkern.system.ccache.key`) and its statistics are
+        logged once the compiling stages are done.
+
+        If `artifact_cache` is set and holds a build with the same fingerprint,
+        nothing is built; the cached modules are extracted (where
+        `modules_install` would have put them) and `install` installs the
+        cached build.
 
         '''
 
         logger.info('building the kernel sources')
 
-        original_directory = os.getcwd()
+        self._fingerprint = self.fingerprint
+        logger.debug('fingerprint: %s', self._fingerprint)
 
-        make_options = self.portage_configuration['MAKEOPTS']
-        if logger.level > 29:
-            make_options += ' -s'
+        if self.artifact_cache is not None:
+            self._cached_artifacts = system.artifacts.ArtifactCache(self.artifact_cache).fetch(self._fingerprint)
 
-        command = 'make {0} && make {0} modules_install'.format(make_options)
+            journal.record('artifacts', hit = self._cached_artifacts is not None)
 
-        logger.debug('command: %s', command)
+            if self._cached_artifacts is not None:
+                logger.info('using cached build instead of building the kernel sources')
 
-        os.chdir('/usr/src/linux')
+                self._kernel_release = self._cached_artifacts[system.artifacts.RELEASE]
 
-        status = subprocess.call(command, shell = True)
+                self._extract_cached_modules()
 
-        if status != 0:
-            raise RuntimeError('kernel did not build correctly')
+                self.built = True
+
+                return
+
+        jobs, make_options = system.make.split_jobs(self.make_options)
+
+        make_options.extend(self.build_options)
+
+        echo = logger.isEnabledFor(logging.INFO)
+
+        output = system.make.Output(system.make.expected_objects(os.path.join(self.build_directory, '.config')), echo)
+
+        environment = {}
+
+        cache = None
+
+        if self.compiler_cache:
+            cache = system.ccache.CompilerCache(system.ccache.key(kernel_series(self.directory_name), system.make.compiler_version()), self.compiler_cache_size)
+            cache.prepare()
+
+            make_options.extend(cache.arguments)
+            environment.update(cache.environment)
+
+        self._jobserver = system.make.JobServer(jobs)
+
+        for name, targets in ( ( 'image', [ 'bzImage' ] ), ( 'modules', [ 'modules' ] ) ):
+            stage = system.make.Stage(name, targets, make_options, self.build_directory, self._jobserver, environment, output)
+
+            try:
+                stage.run()
+            except RuntimeError:
+                self._jobserver.close()
+                raise
+
+            self.stages.append(stage)
+
+        if cache is not None:
+            cache.report()
 
-        os.chdir(original_directory)
+        if self.modules_root is not None:
+            make_options.append('INSTALL_MOD_PATH=' + self.modules_root)
+
+        transaction.protect(self.modules_directory)
+
+        self._modules_install = system.make.Stage('modules_install', [ 'modules_install' ], make_options, self.build_directory, self._jobserver, environment, system.make.Output(echo = echo)).start()
+
+        try:
+            if self.incremental:
+                with open(os.path.join(self.build_directory, '.upkern-sources'), 'w') as fh:
+                    fh.write(self.directory_name)
+        except Exception:
+            self.finish_modules_install()
+            raise
+
+        self.built = True
 
         logger.info('finished building the kernel sources')
 
+    @journal.journaled('sources.configure', _kernel_fields)
     def configure(self, configurator = 'menuconfig', accept_defaults = False):
         '''Configure the kernel sources.
 
-        1. Enter the source directory.
-        2. Run `make ${CONFIGURATOR}`
-        3. Leave the source directory.
+        Run `make ${CONFIGURATOR}` in the build directory.  If accept_defaults
+        is set, every question is answered with its default (as `yes ""`
+        piped into make would).
 
         '''
 
         logger.info('configuring kernel sources')
 
-        original_directory = os.getcwd()
+        command = [ 'make' ] + shlex.split(self.make_options) + self.build_options + [ configurator ]
 
-        command = 'make {0} {1}'.format(
-                self.portage_configuration['MAKEOPTS'],
-                configurator
-                )
+        answers = stdin = None
 
         if accept_defaults:
-            command = 'yes "" | ' + command
+            stdin, stdout = os.pipe()
 
-        logger.debug('command: %s', command)
+            try:
+                answers = system.commands.Command([ 'yes', '' ], stdout = stdout).start()
+            except Exception:
+                os.close(stdin)
+                raise
+            finally:
+                os.close(stdout)
 
-        os.chdir('/usr/src/linux')
-
-        status = subprocess.call(command, shell = True)
+        try:
+            status = system.commands.run(command, directory = self.build_directory, stdin = stdin)
+        finally:
+            if answers is not None:
+                os.close(stdin)  # yes exits on the broken pipe
+                answers.wait()
 
         if status != 0:
             pass  # TODO raise an appropriate exception.
 
-        os.chdir(original_directory)
-
         logger.info('finished configuring kernel sources')
 
+    @journal.journaled('sources.emerge', _package_fields)
     def emerge(self, force = False):
         '''Install the kernel sources.
 
@@ -335,6 +748,8 @@ class Sources(object):
 
         logger.info('emerging kernel sources')
 
+        import gentoolkit.query
+
         _ = gentoolkit.query.Query(self.package_name).find_installed()
         logger.debug('installed: %s', _)
 
@@ -355,64 +770,319 @@ class Sources(object):
 
         logger.info('finished emerging kernel sources')
 
+    @journal.journaled('sources.install', _kernel_fields)
     def install(self):
         '''Install the compiled kernel binary.
 
-        Also installs the configuration and system map.
+        Also installs the configuration, system map and (if built by this
+        object) the build's fingerprint (see `up_to_date`).  A build found in
+        the `artifact_cache` is installed from there (modules included); a
+        fresh build is added to the `artifact_cache`.
+
+        Every file is installed crash safely (see
+        `upkern.system.files.Installer`): copied by the kernel where possible,
+        synced and renamed into place with one sync of each directory at the
+        end.
+
+        .. note::
+            Every change is protected by the surrounding transaction (see
+            `upkern.transaction`) or, without one, undone if installing fails.
 
         '''
 
         logger.info('installing binary kernel')
 
+        system.boot.mount()
+
+        artifacts = self._cached_artifacts or self._build_artifacts()
+
+        installer = system.files.Installer()
+
+        targets = [
+                ( artifacts['bzImage'], '/boot/' + self.binary_name ),
+                ( artifacts['config'], '/boot/' + self.configuration_name ),
+                ( artifacts['System.map'], '/boot/' + self.system_map_name ),
+                ( artifacts['System.map'], '/System.map' ),
+                ]
+
         try:
-            boot_mounted = system.utilities.mount('/boot')
+            with transaction.atomic():
+                for source, destination in targets:
+                    transaction.protect(destination)
+
+                    installer.copy(source, destination)
+
+                if self._cached_artifacts is not None:
+                    self._extract_cached_modules()
+                else:
+                    self.finish_modules_install()
 
-            shutil.copy('/usr/src/linux/arch/{0}/boot/bzImage'.format(re.sub(r'i\d86', 'x86', platform.machine())), '/boot/' + self.binary_name)
-            shutil.copy('/usr/src/linux/.config', '/boot/' + self.configuration_name)
-            shutil.copy('/usr/src/linux/System.map', '/boot/' + self.system_map_name)
+                if hasattr(self, '_fingerprint'):
+                    transaction.protect('/boot/' + self.fingerprint_name)
 
-            if os.path.lexists('/System.map'):
-                os.rename('/System.map', '/System.map.bak')
-            shutil.copy('/usr/src/linux/System.map', '/System.map')
+                    installer.write('/boot/' + self.fingerprint_name, json.dumps(self._fingerprint, sort_keys = True).encode('utf-8'))
+
+                installer.sync()
         except Exception as e:
             logger.exception(e)
             logger.error('failed installing binary kernel')
             logger.warn('please, submit a bug including the previous traceback')
 
-            if os.path.lexists('/boot/' + self.binary_name):
-                os.remove('/boot/' + self.binary_name)
+            raise
+        finally:
+            system.boot.invalidate()
+
+        self._store_artifacts(artifacts)
+
+    @journal.journaled('sources.export', _kernel_fields)
+    def export(self, path):
+        '''Pack the built kernel into a single archive.
 
-            if os.path.lexists('/boot/' + self.configuration_name):
-                os.remove('/boot/' + self.configuration_name)
+        The archive (see `upkern.system.artifacts.export`) holds the image,
+        configuration, System.map and modules of the build along with a
+        manifest naming the sources; `import_archive` installs it on another
+        host without the sources.
 
-            if os.path.lexists('/boot/' + self.system_map_name):
-                os.remove('/boot/' + self.system_map_name)
+        .. note::
+            Set `modules_root` before building to keep `modules_install` out of
+            this host's `/lib/modules`.
 
-            if os.path.lexists('/System.map.bak'):
-                os.rename('/System.map.bak', '/System.map')
+        '''
 
-            raise
+        logger.info('exporting the built kernel')
+
+        if self._cached_artifacts is not None:
+            artifacts = self._cached_artifacts
+            modules = artifacts[system.artifacts.MODULES]
+        else:
+            self.finish_modules_install()
+
+            artifacts = self._build_artifacts()
+            modules = path + '.modules.tar.gz'
+
+            system.artifacts.pack_modules(self.modules_directory, modules)
+
+        manifest = {
+                'package': self.package_name.lstrip('='),
+                'kernel': self.directory_name,
+                'release': self.kernel_release,
+                'fingerprint': getattr(self, '_fingerprint', None),
+                }
+
+        try:
+            system.artifacts.export(path, manifest, artifacts, modules)
         finally:
-            if boot_mounted:
-                system.utilities.unmount('/boot')
+            if self._cached_artifacts is None and os.path.lexists(modules):
+                os.remove(modules)
+
+        self._store_artifacts(artifacts)
+
+        logger.info('finished exporting the built kernel')
+
+    def import_archive(self, path, directory):
+        '''Use a kernel exported by `export` instead of building these sources.
+
+        Unpacks the archive into directory; afterwards, `install` installs the
+        archived kernel (modules included) exactly as if it had been built
+        here.  No sources are needed: the package and source directory are
+        taken from the archive's manifest.
+
+        .. note::
+            An archive built for another architecture, naming its kernel or
+            release with anything but a plain file name or holding modules
+            outside the release's `/lib/modules` directory (see
+            `upkern.system.artifacts.check_modules`) raises a RuntimeError
+            before anything is installed.
+
+        '''
+
+        logger.info('importing kernel from %s', path)
 
+        manifest, self._cached_artifacts = system.artifacts.unpack(path, directory)
+
+        logger.debug('manifest: %s', manifest)
+
+        fingerprint = manifest.get('fingerprint') or {}
+
+        if fingerprint.get('architecture', platform.machine()) != platform.machine():
+            raise RuntimeError('{0} was built for {1} not {2}'.format(path, fingerprint['architecture'], platform.machine()))
+
+        for key in ( 'kernel', 'release' ):
+            if not re.match(r'^[\w+-][\w.+-]*$', manifest.get(key) or ''):
+                raise RuntimeError('{0} has an invalid {1}: {2}'.format(path, key, manifest.get(key)))
+
+        system.artifacts.check_modules(self._cached_artifacts[system.artifacts.MODULES], manifest['release'])
+
+        self._package_name = '=' + manifest['package']
+        self._directory_name = manifest['kernel']
+        self._kernel_release = manifest['release']
+
+        if manifest.get('fingerprint') is not None:
+            self._fingerprint = manifest['fingerprint']
+
+        self.built = True
+
+        journal.record('import', archive = path, package = manifest['package'], kernel = manifest['kernel'])
+
+        logger.info('finished importing kernel from %s', path)
+
+    @journal.journaled('sources.prepare', _kernel_fields)
     def prepare(self, configuration):
         '''Prep the sources so they are ready to be built.
 
         1. Setup the `/usr/src/linux` symlink
-        2. Copy the current configuration file from `/boot`
+        2. Ready the build directory (reusing objects if incremental)
+        3. Copy the current configuration file from `/boot`
+        4. Report how the configuration differs from the sources' Kconfig
+
+        .. note::
+            An incremental build carries over the previous build's `.config`
+            unless a configuration is explicitly specified.
+
+        .. note::
+            Comparing the configuration walks every Kconfig file of the
+            sources.  Thus, it's skipped if neither the log nor the journal
+            would report the difference, or if the `.config` and sources are
+            the ones last compared (see `_comparison_path`).
 
         '''
 
         logger.info('preparing the kernel sources')
 
         self._setup_symlink()
-        self._copy_configuration(configuration)
+
+        if self.incremental:
+            self._prepare_build_directory()
+        elif not os.path.isdir(self.build_directory):
+            os.makedirs(self.build_directory)
+
+        if self.incremental and configuration is None and os.path.lexists(os.path.join(self.build_directory, '.config')):
+            logger.info('carrying over configuration from the previous build')
+        else:
+            self._copy_configuration(configuration)
+
+        difference = None
+
+        if not logger.isEnabledFor(logging.INFO) and not journal.enabled():
+            logger.debug('not comparing configuration: difference would not be reported')
+        else:
+            compared = self._compared_configuration()
+
+            logger.debug('compared: %s', compared)
+
+            if compared is not None and compared == self._configuration_comparison():
+                logger.info('configuration and sources unchanged since they were last compared')
+            else:
+                difference = self.configuration_difference
+
+                self._record_compared_configuration()
+
+        if difference is not None:
+            logger.info('configuration differs from the sources by %s added, %s removed and %s changed symbols', len(difference.added), len(difference.removed), len(difference.changed))
+            logger.debug('difference: %s', difference)
+
+            journal.record('configuration', added = sorted(difference.added), removed = sorted(difference.removed), changed = sorted(difference.changed))
 
         logger.info('finished preparing the kernel sources')
 
+    def _configuration_digest(self):
+        '''Hash of the symbols in `build_directory`'s `.config`.
+
+        Comments and timestamps don't matter.
+
+        '''
+
+        configuration = system.kconfig.parse(os.path.join(self.build_directory, '.config'))
+
+        return hashlib.sha256(json.dumps(configuration, sort_keys = True).encode('utf-8')).hexdigest()
+
+    def _configuration_comparison(self):
+        '''Identity of a configuration comparison: sources and `.config` hash.
+
+        .. note::
+            None if the build directory has no `.config` (yet).
+
+        '''
+
+        if not os.path.exists(os.path.join(self.build_directory, '.config')):
+            return None
+
+        return {
+                'sources': self.directory_name,
+                'configuration': self._configuration_digest(),
+                }
+
+    @property
+    def _comparison_path(self):
+        '''File recording the last configuration comparison.
+
+        `.upkern-configuration` in an out of tree `build_directory`; for
+        in-tree builds, `configuration.json` in STATE_DIRECTORY rather than
+        a stray file in the sources.
+
+        '''
+
+        if self.build_directory == '/usr/src/linux':
+            return os.path.join(STATE_DIRECTORY, 'configuration.json')
+
+        return os.path.join(self.build_directory, '.upkern-configuration')
+
+    def _compared_configuration(self):
+        '''The comparison last recorded (None if none).'''
+
+        try:
+            with open(self._comparison_path, 'r') as fh:
+                return json.load(fh)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _record_compared_configuration(self):
+        '''Record the current comparison (see `_comparison_path`).
+
+        .. note::
+            Failing to record only costs the next run a comparison.
+
+        '''
+
+        comparison = self._configuration_comparison()
+
+        if comparison is None:
+            return
+
+        try:
+            if not os.path.isdir(os.path.dirname(self._comparison_path)):
+                os.makedirs(os.path.dirname(self._comparison_path))
+
+            with open(self._comparison_path, 'w') as fh:
+                json.dump(comparison, fh, sort_keys = True)
+        except (IOError, OSError) as e:
+            logger.warning('failed to record the configuration comparison: %s', e)
+
+    def _build_artifacts(self):
+        '''Paths of the image, System.map and configuration in `build_directory`.'''
+
+        return {
+                'bzImage': os.path.join(self.build_directory, 'arch', re.sub(r'i\d86', 'x86', platform.machine()), 'boot', 'bzImage'),
+                'System.map': os.path.join(self.build_directory, 'System.map'),
+                'config': os.path.join(self.build_directory, '.config'),
+                }
+
+    def _store_artifacts(self, artifacts):
+        '''Add a fresh build to the `artifact_cache` (if any).'''
+
+        if self.artifact_cache is not None and self._cached_artifacts is None and hasattr(self, '_fingerprint'):
+            system.artifacts.ArtifactCache(self.artifact_cache).store(self._fingerprint, artifacts, self.modules_directory)
+
+    def _copy(self, source, destination):
+        '''Copy source to destination and journal the bytes copied.'''
+
+        shutil.copy(source, destination)
+
+        if journal.enabled():
+            journal.record('copy', source = source, destination = destination, bytes = os.path.getsize(destination))
+
     def _copy_configuration(self, configuration = None):
-        '''Copy the configuration file into /usr/src/linux.
+        '''Copy the configuration file into the build directory.
 
         .. note::
             This method leaves the environment in the state it found it even if
@@ -432,32 +1102,176 @@ class Sources(object):
 
         logger.info('using configuration: %s', configuration)
 
-        try:
-            if os.path.lexists('/usr/src/linux/.config'):
-                shutil.move('/usr/src/linux/.config', '/usr/src/linux/.config.bak')
+        target = os.path.join(self.build_directory, '.config')
 
-            boot_mounted = system.utilities.mount('/boot')
+        try:
+            if os.path.lexists(target):
+                shutil.move(target, target + '.bak')
 
-            shutil.copy(configuration, '/usr/src/linux/.config')
+            system.boot.mount()
 
-            if boot_mounted:
-                system.utilities.unmount('/boot')
+            self._copy(configuration, target)
 
         except Exception as e:
             logger.exception(e)
             logger.error('failed to copy kernel configuration')
             logger.warn('please, submit a bug report including the previous traceback')
 
-            if os.path.lexists('/usr/src/linux/.config.bak'):
-                shutil.move('/usr/src/linux/.config.bak', '/usr/src/linux/.config')
+            if os.path.lexists(target + '.bak'):
+                shutil.move(target + '.bak', target)
 
             raise
         else:
-            if os.path.lexists('/usr/src/linux/.config.bak'):
-                os.remove('/usr/src/linux/.config.bak')
+            if os.path.lexists(target + '.bak'):
+                os.remove(target + '.bak')
 
         logger.info('finished copying kernel configuration')
 
+    def _extract_cached_modules(self):
+        '''Extract the modules of a cached or imported build (once).
+
+        The modules land in `modules_directory` (named by the release recorded
+        with the build) exactly as `modules_install` would have put them.
+
+        '''
+
+        if getattr(self, '_cached_modules_extracted', False):
+            return
+
+        with transaction.atomic():
+            transaction.protect(self.modules_directory)
+
+            system.artifacts.extract_modules(self._cached_artifacts[system.artifacts.MODULES], os.path.dirname(self.modules_directory), self.kernel_release)
+
+        self._cached_modules_extracted = True
+
+    def finish_modules_install(self):
+        '''Wait for the background `modules_install` stage started by `build`.
+
+        Must be called before anything reads the kernel's `/lib/modules`
+        directory (e.g. `emerge @module-rebuild`) and before giving up on a
+        run (so the stage doesn't outlive it); `install` and `export` call it.
+
+        .. note::
+            Does nothing if `build` was not run by this object or the stage
+            has already finished.
+
+        '''
+
+        if not hasattr(self, '_modules_install'):
+            return
+
+        logger.info('waiting for modules_install to finish')
+
+        try:
+            self._modules_install.wait()
+        finally:
+            self._jobserver.close()
+
+        self.stages.append(self._modules_install)
+
+        del self._modules_install
+
+    def _prepare_build_directory(self):
+        '''Ready the persistent build directory for an incremental build.
+
+        The previous build's objects are kept when it was of another patch
+        level in the same series and its source tree is still installed; files
+        that differ between the two trees are touched so make's dependency
+        tracking rebuilds exactly what changed.  Otherwise, everything but the
+        `.config` is removed and the build starts from scratch.
+
+        '''
+
+        logger.info('preparing build directory %s', self.build_directory)
+
+        if not os.path.isdir(self.build_directory):
+            os.makedirs(self.build_directory)
+
+        previous = None
+
+        try:
+            with open(os.path.join(self.build_directory, '.upkern-sources'), 'r') as fh:
+                previous = fh.read().strip()
+        except (IOError, OSError):
+            pass
+
+        logger.debug('previous: %s', previous)
+
+        if previous == self.directory_name:
+            logger.info('reusing objects from the previous build of %s', previous)
+        elif previous is not None and os.path.isdir(os.path.join('/usr/src', previous)):
+            logger.info('reusing objects from %s', previous)
+
+            touched = 0
+
+            new_tree = os.path.join('/usr/src', self.directory_name)
+            old_tree = os.path.join('/usr/src', previous)
+
+            for root, directories, files in os.walk(new_tree):
+                for name in files:
+                    path = os.path.join(root, name)
+
+                    try:
+                        old_stat = os.stat(os.path.join(old_tree, os.path.relpath(path, new_tree)))
+                    except OSError:
+                        old_stat = None
+
+                    new_stat = os.stat(path)
+
+                    if old_stat is None or ( old_stat.st_size, old_stat.st_mtime ) != ( new_stat.st_size, new_stat.st_mtime ):
+                        os.utime(path, None)
+                        touched += 1
+
+            logger.info('%s files changed since %s', touched, previous)
+        else:
+            logger.info('starting a clean build in %s', self.build_directory)
+
+            for name in os.listdir(self.build_directory):
+                if name == '.config':
+                    continue
+
+                path = os.path.join(self.build_directory, name)
+
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+
+        logger.info('finished preparing build directory %s', self.build_directory)
+
+    def _resolve_packages(self):
+        '''Find the owning package of every source directory at once.
+
+        Fills `self._packages` from a single (persistently indexed) owner lookup
+        rather than scanning the installed package database once per
+        directory.
+
+        .. note::
+            Directories no installed package owns (e.g. left behind by an
+            unmerge) map to None.
+
+        '''
+
+        unresolved = [ _ for _ in self.source_directories if _ not in self._packages ]
+
+        logger.debug('unresolved: %s', unresolved)
+
+        if not len(unresolved):
+            return
+
+        logger.info('finding the owners of %s', unresolved)
+
+        owners = system.vdb.owners([ '/usr/src/' + _ for _ in unresolved ])
+
+        for directory in unresolved:
+            self._packages[directory] = owners.get('/usr/src/' + directory)
+
+            if self._packages[directory] is None:
+                logger.warning('ignoring /usr/src/%s: not owned by an installed package', directory)
+
+        logger.info('finished finding the owners of %s', unresolved)
+
     def _setup_symlink(self):
         '''Create the `/usr/src/linux` symlink.
 
@@ -469,24 +1283,18 @@ class Sources(object):
 
         logger.info('symlinking /usr/src/linux')
 
-        original_target = None
-
         try:
-            if os.path.islink('/usr/src/linux'):
-                original_target = os.readlink('/usr/src/linux')
-                os.remove('/usr/src/linux')
-            os.symlink(self.directory_name, '/usr/src/linux')
+            with transaction.atomic():
+                transaction.protect('/usr/src/linux')
+
+                if os.path.islink('/usr/src/linux'):
+                    os.remove('/usr/src/linux')
+                os.symlink(self.directory_name, '/usr/src/linux')
         except Exception as e:
             logger.exception(e)
             logger.error('failed to symlink /usr/src/linux')
             logger.warn('please, submit a bug report including the previous traceback')
 
-            if os.path.islink('/usr/src/linux'):
-                os.remove('/usr/src/linux')
-
-            if original_target is not None:
-                os.symlink(original_target, '/usr/src/linux')
-
             raise
 
         logger.info('finished symlinking /usr/src/linux')
@@ -5,7 +5,16 @@
 
 import logging
 
+from upkern.system import artifacts
+from upkern.system import boot
+from upkern.system import ccache
+from upkern.system import commands
+from upkern.system import files
+from upkern.system import kconfig
+from upkern.system import make
 from upkern.system import portage
+from upkern.system import utilities
+from upkern.system import vdb
 
 logger = logging.getLogger(__name__)
 
@@ -0,0 +1,409 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+ARTIFACTS = ( 'bzImage', 'System.map', 'config' )
+MODULES = 'modules.tar.gz'
+FINGERPRINT = 'fingerprint.json'
+RELEASE = 'release'
+MANIFEST = 'manifest.json'
+
+ARCHIVE_FORMAT = 1
+
+
+def key(fingerprint):
+    '''Content address of a build's fingerprint.
+
+    Examples
+    --------
+
+    >>> key({ 'configuration': 'f00', 'package': 'sys-kernel/gentoo-sources-3.12.6' })[:12]
+    'e26b55e0a448'
+
+    '''
+
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys = True).encode('utf-8')).hexdigest()
+
+
+class ArtifactCache(object):
+    '''Content addressed store of built kernels.
+
+    Every entry is a directory, named by the `key` of the build's fingerprint
+    (sources, .config hash, architecture and toolchain), holding the image
+    (bzImage), System.map, configuration (config), a tarball of the modules,
+    the kernel's release (its `/lib/modules` directory, which LOCALVERSION may
+    make differ from the sources' name) and the fingerprint itself.
+
+    Entries are assembled under a temporary name and renamed into place; thus,
+    the cache may be a directory shared (e.g. over NFS) between hosts without
+    anybody seeing a partial entry.
+
+    Parameters
+    ----------
+
+    :``directory``: Directory holding the cache's entries.
+
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def entry(self, fingerprint):
+        '''Directory of the entry for the fingerprint.'''
+
+        return os.path.join(self.directory, key(fingerprint))
+
+    def fetch(self, fingerprint):
+        '''Find the entry for the fingerprint.
+
+        Returns
+        -------
+
+        Dictionary mapping each of ARTIFACTS and MODULES to its path in the
+        cache and RELEASE to the cached kernel's release; None if the cache
+        has no (complete) entry for the fingerprint.
+
+        '''
+
+        entry = self.entry(fingerprint)
+
+        logger.info('looking for %s in the artifact cache', entry)
+
+        try:
+            with open(os.path.join(entry, FINGERPRINT), 'r') as fh:
+                cached = json.load(fh)
+        except (IOError, OSError, ValueError) as e:
+            logger.info('no cached artifacts for this build')
+            logger.debug('error: %s', e)
+            return None
+
+        if cached != fingerprint:
+            logger.warning('artifact cache entry %s does not match its fingerprint', entry)
+            return None
+
+        try:
+            with open(os.path.join(entry, RELEASE), 'r') as fh:
+                release = fh.read().strip()
+        except (IOError, OSError) as e:
+            logger.warning('artifact cache entry %s does not record its release', entry)
+            logger.debug('error: %s', e)
+            return None
+
+        if not re.match(r'^[\w+-][\w.+-]*$', release):
+            logger.warning('artifact cache entry %s has an invalid release: %s', entry, release)
+            return None
+
+        logger.debug('release: %s', release)
+
+        paths = dict([ ( _, os.path.join(entry, _) ) for _ in ARTIFACTS + ( MODULES, ) ])
+        paths[RELEASE] = release
+
+        return paths
+
+    def store(self, fingerprint, artifacts, modules_directory):
+        '''Add a build to the cache.
+
+        Parameters
+        ----------
+
+        :``fingerprint``:       The build's fingerprint.
+        :``artifacts``:         Dictionary mapping each of ARTIFACTS to the
+                                built file.
+        :``modules_directory``: Installed modules (e.g.
+                                `/lib/modules/3.12.6-gentoo`) of the build.
+
+        .. note::
+            An entry that appears concurrently (e.g. stored by another host)
+            wins; failures are logged and ignored since the cache is only an
+            optimization.
+
+        '''
+
+        entry = self.entry(fingerprint)
+
+        if os.path.isdir(entry):
+            logger.info('artifact cache already holds %s', entry)
+            return
+
+        logger.info('storing the build in the artifact cache as %s', entry)
+
+        temporary_entry = None
+
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+
+            temporary_entry = tempfile.mkdtemp(prefix = '.' + os.path.basename(entry) + '.', dir = self.directory)
+
+            for name in ARTIFACTS:
+                shutil.copy(artifacts[name], os.path.join(temporary_entry, name))
+
+            pack_modules(modules_directory, os.path.join(temporary_entry, MODULES))
+
+            with open(os.path.join(temporary_entry, RELEASE), 'w') as fh:
+                fh.write(os.path.basename(modules_directory.rstrip('/')) + '\n')
+
+            with open(os.path.join(temporary_entry, FINGERPRINT), 'w') as fh:
+                json.dump(fingerprint, fh, sort_keys = True)
+
+            os.chmod(temporary_entry, 0o755)
+            os.rename(temporary_entry, entry)
+        except (IOError, OSError, tarfile.TarError) as e:
+            logger.warning('failed storing the build in the artifact cache')
+            logger.debug('error: %s', e)
+
+            if temporary_entry is not None and os.path.isdir(temporary_entry):
+                shutil.rmtree(temporary_entry, ignore_errors = True)
+        else:
+            logger.info('finished storing the build in the artifact cache')
+
+
+def checksum(path):
+    '''SHA-256 (hex) of the file at path.'''
+
+    _ = hashlib.sha256()
+
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            _.update(block)
+
+    return _.hexdigest()
+
+
+def pack_modules(modules_directory, tarball):
+    '''Pack installed modules (e.g. `/lib/modules/3.12.6-gentoo`) into tarball.'''
+
+    logger.info('packing %s into %s', modules_directory, tarball)
+
+    with tarfile.open(tarball, 'w:gz') as tar:
+        tar.add(modules_directory, arcname = os.path.basename(modules_directory.rstrip('/')))
+
+    logger.info('finished packing %s into %s', modules_directory, tarball)
+
+
+def export(path, manifest, artifacts, modules):
+    '''Pack a build into a single archive for installation on other hosts.
+
+    The archive (a gzipped tar) holds a manifest, ARTIFACTS and the modules
+    tarball (MODULES) of the build.  The manifest records the SHA-256 of every
+    other member and the archive's own SHA-256 is written next to it (path
+    suffixed with .sha256 in `sha256sum` format).
+
+    Parameters
+    ----------
+
+    :``path``:      File to write the archive to.
+    :``manifest``:  Dictionary describing the build (e.g. package, kernel,
+                    release and fingerprint).
+    :``artifacts``: Dictionary mapping each of ARTIFACTS to the built file.
+    :``modules``:   Modules tarball of the build (see `pack_modules`).
+
+    Returns
+    -------
+
+    The manifest as written into the archive.
+
+    '''
+
+    logger.info('exporting the build to %s', path)
+
+    files = dict([ ( _, artifacts[_] ) for _ in ARTIFACTS ])
+    files[MODULES] = modules
+
+    manifest = dict(manifest)
+    manifest['format'] = ARCHIVE_FORMAT
+    manifest['checksums'] = dict([ ( name, checksum(files[name]) ) for name in files ])
+
+    contents = json.dumps(manifest, sort_keys = True, indent = 2).encode('utf-8')
+
+    temporary_path = path + '.partial'
+
+    try:
+        with tarfile.open(temporary_path, 'w:gz') as tar:
+            info = tarfile.TarInfo(MANIFEST)
+            info.size = len(contents)
+            info.mtime = time.time()
+
+            tar.addfile(info, io.BytesIO(contents))
+
+            for name in sorted(files):
+                tar.add(files[name], arcname = name)
+
+        os.rename(temporary_path, path)
+    except Exception:
+        if os.path.lexists(temporary_path):
+            os.remove(temporary_path)
+
+        raise
+
+    with open(path + '.sha256', 'w') as fh:
+        fh.write('{0}  {1}\n'.format(checksum(path), os.path.basename(path)))
+
+    logger.info('finished exporting the build to %s', path)
+
+    return manifest
+
+
+def unpack(path, directory):
+    '''Unpack and verify an archive written by `export`.
+
+    .. note::
+        The archive is checked against its .sha256 file (if present) and every
+        member against the manifest; anything else found in the archive, a
+        missing member or a mismatched checksum raises a RuntimeError.
+
+    Parameters
+    ----------
+
+    :``path``:      Archive to unpack.
+    :``directory``: (Empty) directory to unpack the archive's members into.
+
+    Returns
+    -------
+
+    The manifest and a dictionary mapping each of ARTIFACTS and MODULES to its
+    unpacked path.
+
+    '''
+
+    logger.info('unpacking %s into %s', path, directory)
+
+    if os.path.exists(path + '.sha256'):
+        with open(path + '.sha256', 'r') as fh:
+            expected = fh.read().split()[0]
+
+        if checksum(path) != expected:
+            raise RuntimeError('{0} does not match its checksum'.format(path))
+
+    names = ARTIFACTS + ( MODULES, )
+
+    checksums = {}
+
+    with tarfile.open(path, 'r:gz') as tar:
+        for member in tar:
+            if member.name not in names + ( MANIFEST, ) or not member.isfile():
+                raise RuntimeError('{0} is not an exported kernel: unexpected member {1}'.format(path, member.name))
+
+            _ = hashlib.sha256()
+
+            with tar.extractfile(member) as source, open(os.path.join(directory, member.name), 'wb') as destination:
+                for block in iter(lambda: source.read(1 << 20), b''):
+                    _.update(block)
+                    destination.write(block)
+
+            checksums[member.name] = _.hexdigest()
+
+    try:
+        with open(os.path.join(directory, MANIFEST), 'r') as fh:
+            manifest = json.load(fh)
+    except (IOError, OSError, ValueError):
+        raise RuntimeError('{0} is not an exported kernel: missing manifest'.format(path))
+
+    if manifest.get('format') != ARCHIVE_FORMAT:
+        raise RuntimeError('{0} has an unsupported format: {1}'.format(path, manifest.get('format')))
+
+    for name in names:
+        if name not in checksums or checksums[name] != manifest['checksums'].get(name):
+            raise RuntimeError('{0} of {1} does not match its checksum'.format(name, path))
+
+    logger.info('finished unpacking %s into %s', path, directory)
+
+    return manifest, dict([ ( _, os.path.join(directory, _) ) for _ in names ])
+
+
+def check_modules(tarball, release = None):
+    '''Verify that a modules tarball only holds a single kernel's modules.
+
+    Every member must be a regular file, directory or link inside one
+    top level directory (release, if given): absolute names, names with ..
+    components, names below a symbolic link in the tarball, hard links
+    leaving the directory and device or other special files raise a
+    RuntimeError.
+
+    .. note::
+        Symbolic links may point anywhere (e.g. build and source point into
+        `/usr/src`) since nothing is extracted through them.
+
+    Parameters
+    ----------
+
+    :``tarball``: Modules tarball (see `pack_modules`) to verify.
+    :``release``: Name of the directory (e.g. 3.12.6-gentoo) every member
+                  must be in; default: the first member's top directory.
+
+    Returns
+    -------
+
+    The tarball's members.
+
+    '''
+
+    with tarfile.open(tarball, 'r:gz') as tar:
+        return _check_members(tarball, tar.getmembers(), release)
+
+
+def _check_members(tarball, members, release):
+    '''Verify the members of a modules tarball (see `check_modules`).'''
+
+    logger.info('verifying the members of %s', tarball)
+
+    links = set()
+
+    def inside(name):
+        parts = name.split('/')
+
+        return not name.startswith('/') and '..' not in parts and parts[0] == release and not any([ '/'.join(parts[:_]) in links for _ in range(1, len(parts)) ])
+
+    for member in members:
+        name = os.path.normpath(member.name)
+
+        if release is None:
+            release = name.split('/')[0]
+
+        if not inside(name):
+            raise RuntimeError('{0} is not a modules tarball: unexpected member {1}'.format(tarball, member.name))
+
+        if member.islnk() and not inside(os.path.normpath(member.linkname)):
+            raise RuntimeError('{0} is not a modules tarball: {1} links to {2}'.format(tarball, member.name, member.linkname))
+
+        if not ( member.isfile() or member.isdir() or member.issym() or member.islnk() ):
+            raise RuntimeError('{0} is not a modules tarball: {1} is a special file'.format(tarball, member.name))
+
+        if member.issym():
+            links.add(name)
+
+    logger.info('finished verifying the members of %s', tarball)
+
+    return members
+
+
+def extract_modules(tarball, destination = '/lib/modules', release = None):
+    '''Unpack a modules tarball (verified by `check_modules`) into destination.'''
+
+    options = {}
+
+    if hasattr(tarfile, 'tar_filter'):  # Python 3.12 and backports
+        options['filter'] = 'tar'
+
+    with tarfile.open(tarball, 'r:gz') as tar:
+        members = _check_members(tarball, tar.getmembers(), release)
+
+        logger.info('extracting %s into %s', tarball, destination)
+
+        tar.extractall(destination, members = members, **options)
+
+    logger.info('finished extracting %s into %s', tarball, destination)
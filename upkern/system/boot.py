@@ -0,0 +1,86 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import logging
+import os
+
+from upkern.system import utilities
+
+logger = logging.getLogger(__name__)
+
+BOOT_DIRECTORY = '/boot'
+
+_mounted = None
+_inventory = None
+
+
+def mount():
+    '''Make sure `/boot` is mounted for the rest of this session.
+
+    The first call takes the session's reference to `/boot` (see
+    `upkern.system.utilities.acquire`); every later call is free.  Sources,
+    the initramfs preparers and the bootloaders all share the one mount which
+    is only released by `release`.
+
+    '''
+
+    global _mounted
+
+    if not _mounted:
+        logger.info('mounting %s for this session', BOOT_DIRECTORY)
+
+        utilities.acquire(BOOT_DIRECTORY)
+
+        _mounted = True
+
+
+def release():
+    '''End the session: drop the session's reference to `/boot`.
+
+    .. note::
+        `/boot` is unmounted only if the session mounted it and nothing else
+        holds it mounted.
+
+    '''
+
+    global _mounted
+
+    if _mounted:
+        logger.info('releasing %s', BOOT_DIRECTORY)
+
+        utilities.release(BOOT_DIRECTORY)
+
+    _mounted = None
+
+    invalidate()
+
+
+def inventory():
+    '''Names of the files in `/boot`.
+
+    .. note::
+        The listing is taken once per session (mounting `/boot` if necessary);
+        anything writing to `/boot` should call `invalidate` afterwards.
+
+    '''
+
+    global _inventory
+
+    if _inventory is None:
+        mount()
+
+        _inventory = os.listdir(BOOT_DIRECTORY)
+
+        logger.debug('inventory: %s', _inventory)
+
+    return list(_inventory)
+
+
+def invalidate():
+    '''Forget the cached `/boot` inventory.'''
+
+    global _inventory
+
+    _inventory = None
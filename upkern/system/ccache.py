@@ -0,0 +1,155 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import logging
+import os
+import re
+
+from upkern.system import commands
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIRECTORY = '/var/cache/upkern/ccache'
+
+# ccache 3 reports every counter once (hits split into direct and
+# preprocessed); ccache 4 leads with the totals and repeats them per storage.
+_statistics_expressions = {
+        'hits': (
+            re.compile(r'^cache hit \((?:direct|preprocessed)\)\s+(?P<count>\d+)', re.M),
+            re.compile(r'^\s*Hits:\s+(?P<count>\d+)', re.M),
+            ),
+        'misses': (
+            re.compile(r'^cache miss\s+(?P<count>\d+)', re.M),
+            re.compile(r'^\s*Misses:\s+(?P<count>\d+)', re.M),
+            ),
+        }
+
+
+def key(series, compiler_version = None):
+    '''Name of the cache shared by a kernel series built by a compiler.
+
+    Every patch level of a series (e.g. 3.12.6 and 3.12.7) shares the cache
+    (most of their objects are compiled from the same sources); a new
+    compiler starts a new cache rather than evicting the old one's objects.
+
+    Examples
+    --------
+
+    >>> key('gentoo-3.12', 'gcc (Gentoo 4.7.3-r1 p1.4, pie-0.5.5) 4.7.3')
+    'gentoo-3.12-gcc-4.7.3'
+
+    >>> key('gentoo-3.12')
+    'gentoo-3.12'
+
+    '''
+
+    if not compiler_version:
+        return series
+
+    versions = re.findall(r'\d+(?:\.\d+)+', compiler_version)
+
+    _ = [ series, re.sub(r'[^\w.+-]', '', os.path.basename(compiler_version.split()[0])) ]
+
+    if len(versions):
+        _.append(versions[-1])
+
+    return '-'.join(_)
+
+
+class CompilerCache(object):
+    '''A ccache instance shared by the builds of a kernel series.
+
+    Parameters
+    ----------
+
+    :``name``:     Name of the cache directory (see `key`, e.g.
+                   gentoo-3.12-gcc-4.7.3).
+    :``size``:     Maximum size of the cache (ccache -M syntax, e.g. 5G).
+    :``compiler``: Compiler to wrap with ccache.
+
+    '''
+
+    def __init__(self, name, size = '5G', compiler = 'gcc'):
+        self.name = name
+        self.size = size
+        self.compiler = compiler
+
+    @property
+    def arguments(self):
+        '''Make variable overrides routing compilation through ccache.'''
+
+        _ = 'ccache ' + self.compiler
+
+        return [ 'CC=' + _, 'HOSTCC=' + _ ]
+
+    @property
+    def directory(self):
+        '''Cache directory of this cache.'''
+
+        return os.path.join(CACHE_DIRECTORY, self.name)
+
+    @property
+    def environment(self):
+        '''Environment variables to set for make invocations using this cache.'''
+
+        return { 'CCACHE_DIR': self.directory }
+
+    def prepare(self):
+        '''Create the cache, apply the size cap and zero its statistics.'''
+
+        logger.info('preparing compiler cache %s', self.directory)
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        self._ccache('-M', self.size)
+        self._ccache('-z')
+
+        logger.info('finished preparing compiler cache %s', self.directory)
+
+    def statistics(self):
+        '''Hit and miss counts since `prepare`.
+
+        Understands the statistics output of both ccache 3 and ccache 4.
+
+        Returns
+        -------
+
+        Dictionary with ``hits`` and ``misses`` (None if not reported).
+
+        '''
+
+        output = self._ccache('-s')
+
+        _ = {}
+
+        for name, ( summed_expression, total_expression ) in _statistics_expressions.items():
+            _[name] = None
+
+            counts = [ int(match.group('count')) for match in summed_expression.finditer(output) ]
+
+            if len(counts):
+                _[name] = sum(counts)
+            else:
+                match = total_expression.search(output)
+
+                if match:
+                    _[name] = int(match.group('count'))
+
+        logger.debug('statistics: %s', _)
+
+        return _
+
+    def report(self):
+        '''Log the cache's hit and miss statistics.'''
+
+        _ = self.statistics()
+
+        logger.info('compiler cache hits: %s, misses: %s', _['hits'], _['misses'])
+
+    def _ccache(self, *arguments):
+        '''Run ccache against this cache and return its output.'''
+
+        return commands.output([ 'ccache' ] + list(arguments), environment = dict(os.environ, **self.environment))
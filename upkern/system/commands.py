@@ -0,0 +1,196 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import io
+import logging
+import subprocess
+import threading
+import time
+
+from upkern import journal
+
+logger = logging.getLogger(__name__)
+
+
+def run(arguments, **kwargs):
+    '''Run a command to completion.
+
+    Shorthand for ``Command(arguments, **kwargs).run()``.
+
+    Returns
+    -------
+
+    Exit status of the command.
+
+    '''
+
+    return Command(arguments, **kwargs).run()
+
+
+def output(arguments, **kwargs):
+    '''Run a command to completion and return its output.
+
+    Like ``run`` but standard output and error are collected (as text).
+
+    .. note::
+        A command exiting with a non-zero status raises a RuntimeError.
+
+    Returns
+    -------
+
+    Output of the command.
+
+    '''
+
+    lines = []
+
+    status = Command(arguments, output = lines.append, **kwargs).run()
+
+    if status != 0:
+        raise RuntimeError('{0} failed with status {1}'.format(arguments[0], status))
+
+    return ''.join(lines)
+
+
+class Command(object):
+    '''A single, timed external command executed without a shell.
+
+    The command's output streams straight through to upkern's standard output
+    and error unless an ``output`` callable is given; then, standard output and
+    error are read line by line (as they're produced) and handed to it.  The
+    command's duration and exit status are logged and journaled.
+
+    Parameters
+    ----------
+
+    :``arguments``:   Command to execute as a list of arguments.
+    :``directory``:   Directory to run the command in (default: current).
+    :``environment``: Complete environment for the command (default: upkern's).
+    :``timeout``:     Seconds after which the command is killed (default:
+                      unlimited).
+    :``stdin``:       File object or descriptor to use as standard input
+                      (default: upkern's).
+    :``stdout``:      File object or descriptor to use as standard output
+                      unless ``output`` is given (default: upkern's).
+    :``pass_fds``:    File descriptors to be inherited by the command.
+    :``fields``:      Dictionary of additional fields for the journal event.
+    :``output``:      Callable invoked with every line of output.
+
+    '''
+
+    def __init__(self, arguments, directory = None, environment = None, timeout = None, stdin = None, stdout = None, pass_fds = (), fields = None, output = None):
+        self.arguments = list(arguments)
+        self.directory = directory
+        self.environment = environment
+        self.timeout = timeout
+        self.stdin = stdin
+        self.stdout = stdout
+        self.pass_fds = pass_fds
+        self.fields = fields or {}
+        self.output = output
+
+        self.duration = None
+        self.status = None
+
+        self._process = None
+        self._reader = None
+
+    def start(self):
+        '''Start the command without waiting for it to finish.'''
+
+        logger.debug('command: %s', self.arguments)
+
+        self._started = time.time()
+
+        if self.output is None:
+            self._process = subprocess.Popen(
+                    self.arguments,
+                    cwd = self.directory,
+                    env = self.environment,
+                    stdin = self.stdin,
+                    stdout = self.stdout,
+                    pass_fds = self.pass_fds,
+                    )
+        else:
+            self._process = subprocess.Popen(
+                    self.arguments,
+                    cwd = self.directory,
+                    env = self.environment,
+                    stdin = self.stdin,
+                    stdout = subprocess.PIPE,
+                    stderr = subprocess.STDOUT,
+                    pass_fds = self.pass_fds,
+                    )
+
+            # Read continuously so a command left running (e.g. a background
+            # make stage) never blocks on a full pipe.
+            self._reader = threading.Thread(target = self._read)
+            self._reader.daemon = True
+            self._reader.start()
+
+        return self
+
+    def wait(self):
+        '''Wait for the command to finish.
+
+        .. note::
+            A command running past its timeout is killed and a RuntimeError is
+            raised.
+
+        Returns
+        -------
+
+        Exit status of the command.
+
+        '''
+
+        timeout = None
+        if self.timeout is not None:
+            timeout = max(0, self._started + self.timeout - time.time())
+
+        timed_out = False
+
+        try:
+            self.status = self._process.wait(timeout = timeout)
+        except subprocess.TimeoutExpired:
+            logger.error('killing %s after %s seconds', self.arguments[0], self.timeout)
+
+            self._process.kill()
+
+            self.status = self._process.wait()
+
+            timed_out = True
+
+        if self._reader is not None:
+            self._reader.join()
+
+        self.duration = time.time() - self._started
+
+        logger.debug('status: %s (%.1f seconds)', self.status, self.duration)
+
+        journal.record('command', command = self.arguments, status = self.status, duration = self.duration, **self.fields)
+
+        if timed_out:
+            raise RuntimeError('{0} timed out after {1} seconds'.format(self.arguments[0], self.timeout))
+
+        return self.status
+
+    def run(self):
+        '''Run the command to completion.'''
+
+        return self.start().wait()
+
+    def _read(self):
+        '''Hand every line of the command's output to ``output``.
+
+        .. note::
+            The pipe is opened in binary mode and decoded here (undecodable
+            bytes are replaced) since Popen only takes errors on Python 3.6+.
+
+        '''
+
+        with io.TextIOWrapper(self._process.stdout, errors = 'replace') as stdout:
+            for line in stdout:
+                self.output(line)
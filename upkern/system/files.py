@@ -0,0 +1,232 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import errno
+import fcntl
+import logging
+import os
+import shutil
+import stat
+import tempfile
+
+from upkern import journal
+
+logger = logging.getLogger(__name__)
+
+FICLONE = 0x40049409
+
+COPY_CHUNK = 1 << 30
+
+# Errors meaning "this mechanism doesn't work for these files" (e.g. a FAT
+# /boot, another filesystem or an old kernel); the next mechanism is tried.
+_UNSUPPORTED = set([
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTSUP,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EXDEV,
+    ])
+
+# Kernel side copies of count bytes from the current offsets (the os functions
+# are looked up late since older Pythons lack them).
+_RANGE_COPIES = (
+        ( 'copy_file_range', lambda source_fd, destination_fd, count: os.copy_file_range(source_fd, destination_fd, count) ),
+        ( 'sendfile', lambda source_fd, destination_fd, count: os.sendfile(destination_fd, source_fd, None, count) ),
+        )
+
+
+def copy(source, destination):
+    '''Copy the contents of one open file to another as cheaply as possible.
+
+    Tries, in order, a reflink (FICLONE: the copy shares the source's blocks),
+    `os.copy_file_range` and `os.sendfile` (the kernel copies without the data
+    passing through upkern) and, finally, reading and writing.  Mechanisms
+    unavailable in this Python or unsupported by the filesystems are skipped.
+
+    Parameters
+    ----------
+
+    :``source``:      File object (binary) to read from its start.
+    :``destination``: File object (binary) to write from its start.
+
+    Returns
+    -------
+
+    Name of the mechanism that copied the contents.
+
+    '''
+
+    source_fd, destination_fd = source.fileno(), destination.fileno()
+
+    try:
+        fcntl.ioctl(destination_fd, FICLONE, source_fd)
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED:
+            raise
+    else:
+        return 'reflink'
+
+    size = os.fstat(source_fd).st_size
+
+    for name, function in _RANGE_COPIES:
+        if not hasattr(os, name):
+            continue
+
+        try:
+            copied = _copy_range(function, source_fd, destination_fd, size)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+
+            logger.debug('%s unsupported: %s', name, e)
+
+            _rewind(source_fd, destination_fd)
+            continue
+
+        if copied == size:
+            return name
+
+        logger.warning('%s copied %s of %s bytes; falling back', name, copied, size)
+
+        _rewind(source_fd, destination_fd)
+
+    shutil.copyfileobj(source, destination)
+
+    return 'read'
+
+
+def _copy_range(function, source_fd, destination_fd, size):
+    '''Copy size bytes with one of _RANGE_COPIES.
+
+    Returns
+    -------
+
+    Number of bytes copied; less than size if the copy stopped early.
+
+    '''
+
+    copied = 0
+
+    while copied < size:
+        _ = function(source_fd, destination_fd, min(COPY_CHUNK, size - copied))
+
+        if _ == 0:
+            break
+
+        copied += _
+
+    return copied
+
+
+def _rewind(source_fd, destination_fd):
+    '''Undo a partial copy before falling back to another mechanism.'''
+
+    os.lseek(source_fd, 0, os.SEEK_SET)
+    os.lseek(destination_fd, 0, os.SEEK_SET)
+    os.ftruncate(destination_fd, 0)
+
+
+class Installer(object):
+    '''Crash safe installation of a batch of files.
+
+    Every file is written to a temporary file in its target directory, synced
+    and atomically renamed over the target; thus, a crash leaves either the
+    previous or the new file but never a truncated one.  The target
+    directories (whose entries the renames changed) are synced once each by
+    `sync` after the whole batch.
+
+    '''
+
+    def __init__(self):
+        self.directories = set()
+
+    def copy(self, source, destination):
+        '''Install a copy of source (contents and permissions) as destination.
+
+        Returns
+        -------
+
+        Number of bytes copied.
+
+        '''
+
+        with open(source, 'rb') as fh:
+            mode = stat.S_IMODE(os.fstat(fh.fileno()).st_mode)
+
+            method = self._install(destination, lambda _: copy(fh, _), mode)
+
+        size = os.path.getsize(destination)
+
+        logger.debug('copied %s to %s (%s bytes by %s)', source, destination, size, method)
+
+        if journal.enabled():
+            journal.record('copy', source = source, destination = destination, bytes = size, method = method)
+
+        return size
+
+    def write(self, destination, contents, mode = 0o644):
+        '''Install destination with the given contents (bytes).'''
+
+        def write(fh):
+            fh.write(contents)
+
+            return 'write'
+
+        self._install(destination, write, mode)
+
+    def sync(self):
+        '''Sync every directory a file was installed into (once each).
+
+        .. note::
+            Filesystems that can't sync directories are skipped.
+
+        '''
+
+        for directory in sorted(self.directories):
+            logger.debug('syncing %s', directory)
+
+            fd = os.open(directory, os.O_RDONLY)
+
+            try:
+                os.fsync(fd)
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+            finally:
+                os.close(fd)
+
+        self.directories.clear()
+
+    def _install(self, destination, fill, mode):
+        '''Atomically replace destination by a file filled by fill.'''
+
+        directory = os.path.dirname(destination) or os.path.curdir
+
+        fd, temporary = tempfile.mkstemp(prefix = '.' + os.path.basename(destination) + '.', dir = directory)
+
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                method = fill(fh)
+
+                fh.flush()
+
+                try:
+                    os.fchmod(fh.fileno(), mode)
+                except OSError as e:  # e.g. FAT
+                    logger.debug('cannot set the mode of %s: %s', destination, e)
+
+                os.fsync(fh.fileno())
+
+            os.replace(temporary, destination)
+        except Exception:
+            if os.path.lexists(temporary):
+                os.remove(temporary)
+
+            raise
+
+        self.directories.add(directory)
+
+        return method
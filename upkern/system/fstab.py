@@ -16,26 +16,160 @@
 # this program; if not, write to the Free Software Foundation, Inc., 59 Temple
 # Place - Suite 330, Boston, MA  02111-1307, USA.            
 
-"""Declares a very simple dictionary style model of /etc/fstab."""
+"""Declares a very simple dictionary style model of /etc/fstab.
 
+The parsed table is shared by every FSTab in the process and only reparsed
+when /etc/fstab changes (by modification time and size).  Likewise, the
+index of /dev/disk/by-* is only rebuilt when one of those directories
+changes (by modification time), e.g. after udev adds or removes a device.
+
+"""
+
+import collections
+import logging
+import os
 import re
 
+logger = logging.getLogger(__name__)
+
+FSTAB = "/etc/fstab"
+
+# Tags usable in place of a device and the udev directories resolving them.
+DEVICE_DIRECTORIES = {
+        "UUID": "/dev/disk/by-uuid",
+        "LABEL": "/dev/disk/by-label",
+        "PARTUUID": "/dev/disk/by-partuuid",
+        "PARTLABEL": "/dev/disk/by-partlabel",
+        }
+
+Entry = collections.namedtuple("Entry", [
+    "device", "mountpoint", "type", "options", "dump", "passno",
+    ])
+
+_cache = None
+_devices = None
+
+def _unescape_fstab(field):
+    """Decode fstab's octal escapes (e.g. \\040 for a space)."""
+    return re.sub(r"\\([0-7]{3})", lambda _: chr(int(_.group(1), 8)), field)
+
+def _unescape_udev(name):
+    """Decode udev's hexadecimal escapes (e.g. \\x20 for a space)."""
+    return re.sub(r"\\x([0-9A-Fa-f]{2})", lambda _: chr(int(_.group(1), 16)), name)
+
+def _parse(fstab):
+    """Entries (by mountpoint) of the lines of an fstab."""
+    entries = collections.OrderedDict()
+
+    for line in fstab:
+        if re.search(r"^(?:\s*#|\s*$)", line):
+            continue
+
+        fields = [ _unescape_fstab(_) for _ in line.split() ]
+
+        if len(fields) < 3:
+            logger.warning("ignoring malformed fstab line: %s", line.rstrip("\n"))
+            continue
+
+        fields.extend([ "defaults", "0", "0" ][len(fields) - 3:])
+
+        for index in ( 4, 5 ):
+            if not re.match(r"^\d+$", fields[index]):
+                logger.warning("using 0 for the malformed %s field of fstab line: %s", ( "dump", "pass" )[index - 4], line.rstrip("\n"))
+                fields[index] = "0"
+
+        entries[fields[1]] = Entry(fields[0], fields[1], fields[2], fields[3].split(","), int(fields[4]), int(fields[5]))
+
+    return entries
+
+def _index():
+    """Map every tag (e.g. UUID=...) known to udev to its /dev node."""
+    index = {}
+
+    for tag, directory in DEVICE_DIRECTORIES.items():
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            continue
+
+        for name in names:
+            index[tag + "=" + _unescape_udev(name)] = os.path.realpath(os.path.join(directory, name))
+
+    logger.debug("device index: %s", index)
+
+    return index
+
+def _devices_key():
+    """The modification times of the /dev/disk/by-* directories."""
+    key = []
+
+    for tag, directory in sorted(DEVICE_DIRECTORIES.items()):
+        try:
+            key.append(( tag, os.stat(directory).st_mtime ))
+        except OSError:
+            key.append(( tag, None ))
+
+    return tuple(key)
+
+def _load():
+    """The (cached) entries and device index for the current /etc/fstab."""
+    global _cache, _devices
+
+    status = os.stat(FSTAB)
+    key = ( status.st_mtime, status.st_size )
+
+    if _cache is None or _cache[0] != key:
+        logger.debug("parsing %s", FSTAB)
+
+        with open(FSTAB, "r") as fstab:
+            entries = _parse(fstab)
+
+        _cache = ( key, entries )
+
+    key = _devices_key()
+
+    if _devices is None or _devices[0] != key:
+        logger.debug("indexing %s", ", ".join(sorted(DEVICE_DIRECTORIES.values())))
+
+        _devices = ( key, _index() )
+
+    return _cache[1], _devices[1]
+
+def invalidate():
+    """Forget the parsed /etc/fstab and device index."""
+    global _cache, _devices
+
+    _cache = None
+    _devices = None
+
 class FSTab(object): #pylint: disable-msg=R0903
-    """Simply model of /etc/fstab."""
+    """Simply model of /etc/fstab.
+
+    Indexed by mountpoint, an FSTab provides the device (as written in
+    /etc/fstab, e.g. UUID=...) mounted there.
+
+    """
     def __init__(self):
-        fstab = open("/etc/fstab", "r")
-        self._partitions = dict([[
-            item for item in line.expandtabs(1).split(" ") if len(item)
-            ][1::-1] for line in fstab.readlines() \
-                    if not re.search(r"^(?:\s*#|$)", line)
-            ])
-        fstab.close()
+        self._entries, self._devices = _load()
 
     def __getitem__(self, name):
-        if name in self._partitions:
-            return self._partitions[name]
+        if name in self._entries:
+            return self._entries[name].device
         return None
 
     def __contains__(self, name):
-        return name in self._partitions
+        return name in self._entries
+
+    def entry(self, name):
+        """The full Entry for the mountpoint (None if not in /etc/fstab)."""
+        return self._entries.get(name)
+
+    def device(self, name):
+        """The /dev node mounted at the mountpoint.
+
+        Tags (UUID=, LABEL=, PARTUUID= and PARTLABEL=) are resolved through
+        /dev/disk; unresolvable tags and plain devices are returned as is.
 
+        """
+        device = self[name]
+        return self._devices.get(device, device)
@@ -0,0 +1,254 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import collections
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+_configuration_expression = re.compile(r'^(?:CONFIG_(?P<name>\w+)=(?P<value>.*)|# CONFIG_(?P<unset>\w+) is not set)$', re.M)
+
+_entry_expression = re.compile(r'^\s*(?:menu)?config\s+(?P<name>\w+)\s*$')
+_type_expression = re.compile(r'^\s*(?P<type>bool|boolean|tristate|string|int|hex)\b')
+_def_expression = re.compile(r'^\s*def_(?P<type>bool|tristate)\s+(?P<value>.+?)\s*$')
+_default_expression = re.compile(r'^\s*default\s+(?P<value>.+?)\s*$')
+_help_expression = re.compile(r'^\s*(?:---)?help(?:---)?\s*$')
+_block_expression = re.compile(r'^(?:config|menuconfig|choice|endchoice|menu|endmenu|if|endif|source|comment|mainmenu)\b')
+_constant_expression = re.compile(r'^(?:[ymn]|"[^"]*"|-?\d+|0x[0-9A-Fa-f]+)$')
+
+_values = {
+        'bool': re.compile(r'^[yn]$'),
+        'tristate': re.compile(r'^[ymn]$'),
+        'string': re.compile(r'^".*"$'),
+        'int': re.compile(r'^-?\d+$'),
+        'hex': re.compile(r'^0x[0-9A-Fa-f]+$'),
+        }
+
+_architectures = (
+        ( re.compile(r'^(?:i\d86|x86_64)$'), 'x86' ),
+        ( re.compile(r'^aarch64$'), 'arm64' ),
+        ( re.compile(r'^arm'), 'arm' ),
+        ( re.compile(r'^ppc'), 'powerpc' ),
+        )
+
+Symbol = collections.namedtuple('Symbol', [ 'type', 'default' ])
+Difference = collections.namedtuple('Difference', [ 'added', 'removed', 'changed' ])
+
+
+def architecture(machine):
+    '''Kernel architecture (arch/ directory) for a machine (uname -m).
+
+    Examples
+    --------
+
+    >>> architecture('x86_64')
+    'x86'
+
+    >>> architecture('aarch64')
+    'arm64'
+
+    '''
+
+    for expression, name in _architectures:
+        if expression.match(machine):
+            return name
+
+    return machine
+
+
+def parse(path):
+    '''Symbol table of a .config.
+
+    Returns
+    -------
+
+    Dictionary mapping symbol names (without CONFIG_) to their values: y, m, n
+    (for "is not set") or the literal value (e.g. a quoted string).
+
+    '''
+
+    with open(path, 'r', errors = 'replace') as fh:
+        contents = fh.read()
+
+    table = {}
+
+    for name, value, unset in _configuration_expression.findall(contents):
+        if unset:
+            table[unset] = 'n'
+        else:
+            table[name] = value
+
+    logger.debug('parsed %s symbols from %s', len(table), path)
+
+    return table
+
+
+def symbols(directory, machine):
+    '''Symbols declared by the Kconfig files of a source tree.
+
+    Reads every Kconfig file of the tree (skipping other architectures and the
+    kconfig test suites) without evaluating Kconfig's language.  Thus, only
+    constant, unconditional defaults are known.
+
+    Returns
+    -------
+
+    Dictionary mapping symbol names to Symbols (type and default; the default
+    is None if unknown or conditional and n for booleans without a default).
+
+    '''
+
+    arch = architecture(machine)
+
+    table = {}
+
+    for path, directories, filenames in os.walk(directory):
+        relative = os.path.relpath(path, directory)
+
+        if relative == '.':
+            directories[:] = [ _ for _ in directories if _ not in ( 'Documentation', 'scripts', 'tools' ) ]
+        elif relative == 'arch':
+            directories[:] = [ _ for _ in directories if _ == arch ]
+
+        directories.sort()
+
+        for filename in sorted(filenames):
+            if filename.startswith('Kconfig'):
+                for name, symbol in _declarations(os.path.join(path, filename)):
+                    if name not in table or ( table[name].default is None and symbol.default is not None ):
+                        table[name] = symbol
+
+    logger.debug('found %s symbols in %s', len(table), directory)
+
+    return table
+
+
+def diff(old, new):
+    '''Difference between two symbol tables (e.g. two parsed .configs).
+
+    Returns
+    -------
+
+    Difference of the added and removed symbols (dictionaries of name to value)
+    and the changed symbols (dictionary of name to old and new value).
+
+    '''
+
+    return Difference(
+            dict([ ( _, new[_] ) for _ in new if _ not in old ]),
+            dict([ ( _, old[_] ) for _ in old if _ not in new ]),
+            dict([ ( _, ( old[_], new[_] ) ) for _ in old if _ in new and old[_] != new[_] ]),
+            )
+
+
+def compare(configuration, declared):
+    '''Changes a configuration needs to match a (new) source tree.
+
+    Approximates what `make olddefconfig` would do to the configuration:
+
+    * added: undeclared symbols with a constant default other than n (symbols
+      defaulting to n leave the build unchanged),
+    * removed: set symbols the tree no longer declares, and
+    * changed: symbols whose value the tree's type for them rejects (e.g. m for
+      a symbol that became a bool).
+
+    Parameters
+    ----------
+
+    :``configuration``: Symbol table of the configuration (see `parse`).
+    :``declared``:      Symbols of the source tree (see `symbols`).
+
+    Returns
+    -------
+
+    Difference of the added (name to default), removed (name to value) and
+    changed (name to value and type) symbols.
+
+    '''
+
+    added = dict([ ( name, symbol.default ) for name, symbol in declared.items() if name not in configuration and symbol.default not in ( None, 'n' ) ])
+    removed = dict([ ( name, value ) for name, value in configuration.items() if name not in declared and value != 'n' ])
+
+    changed = {}
+
+    for name, value in configuration.items():
+        if name in declared and declared[name].type in _values and not _values[declared[name].type].match(value):
+            changed[name] = ( value, declared[name].type )
+
+    return Difference(added, removed, changed)
+
+
+def _declarations(path):
+    '''Yield the name and Symbol of every entry in a single Kconfig file.'''
+
+    name = type_ = default = None
+    conditional = in_help = False
+
+    try:
+        fh = open(path, 'r', errors = 'replace')
+    except (IOError, OSError) as e:
+        logger.debug('cannot read %s: %s', path, e)
+        return
+
+    with fh:
+        for line in fh:
+            if in_help:
+                if not _block_expression.match(line):
+                    continue
+
+                in_help = False
+
+            _ = _entry_expression.match(line)
+
+            if _ or _block_expression.match(line):
+                if name is not None:
+                    yield name, _symbol(type_, default, conditional)
+
+                name = type_ = default = None
+                conditional = False
+
+                if _:
+                    name = _.group('name')
+
+                continue
+
+            if name is None:
+                continue
+
+            if _help_expression.match(line):
+                in_help = True
+                continue
+
+            _ = _def_expression.match(line)
+            if _:
+                type_ = type_ or _.group('type')
+                line = 'default ' + _.group('value')
+
+            _ = _type_expression.match(line)
+            if _ and type_ is None:
+                type_ = _.group('type').replace('boolean', 'bool')
+
+            _ = _default_expression.match(line)
+            if _ and default is None and not conditional:
+                value = _.group('value')
+
+                if ' if ' in value or not _constant_expression.match(value):
+                    conditional = True
+                else:
+                    default = value
+
+    if name is not None:
+        yield name, _symbol(type_, default, conditional)
+
+
+def _symbol(type_, default, conditional):
+    '''Symbol for a parsed Kconfig entry.'''
+
+    if default is None and not conditional and type_ in ( 'bool', 'tristate' ):
+        default = 'n'
+
+    return Symbol(type_, default)
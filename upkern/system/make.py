@@ -0,0 +1,484 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import collections
+import logging
+import math
+import multiprocessing
+import os
+import re
+import shlex
+import sys
+import time
+
+from upkern import journal
+from upkern.system import commands
+
+logger = logging.getLogger(__name__)
+
+_jobs_expression = re.compile(r'^(?:-j|--jobs=?)(?P<jobs>\d*)$')
+_load_expression = re.compile(r'^(?:-l|--load-average=?|--max-load=?)[\d.]*$')
+_object_expression = re.compile(r'^\s+(?:CC|LD)(?: \[M\])?\s+\S+$')
+_enabled_expression = re.compile(r'^CONFIG_\w+=[ym]$', re.M)
+
+MEMORY_PER_JOB = 512 * 1024 * 1024
+
+OBJECTS_PER_SYMBOL = 3
+PROGRESS_INTERVAL = 10
+TAIL_LINES = 50
+
+
+def expected_objects(configuration):
+    '''Rough number of objects a build of the given .config compiles and links.
+
+    Every enabled (built in or module) symbol accounts for OBJECTS_PER_SYMBOL
+    objects on average.
+
+    Returns
+    -------
+
+    Estimated object count; None if the .config cannot be read.
+
+    '''
+
+    try:
+        with open(configuration, 'r') as fh:
+            enabled = len(_enabled_expression.findall(fh.read()))
+    except (IOError, OSError) as e:
+        logger.debug('cannot estimate objects: %s', e)
+        return None
+
+    logger.debug('enabled symbols: %s', enabled)
+
+    return max(1, enabled * OBJECTS_PER_SYMBOL)
+
+
+def plan(memory_per_job = MEMORY_PER_JOB):
+    '''Work out make's job and load limits for this machine.
+
+    The job count is the smallest of:
+
+    * the CPUs this process may use (affinity and cgroup CPU quota),
+    * the CPUs not already busy according to the 1 minute load average, and
+    * the number of ``memory_per_job`` sized jobs that fit in available memory.
+
+    The load limit is the usable CPU count so make backs off when other work
+    appears during the build.
+
+    Returns
+    -------
+
+    Tuple of the job count and load limit.
+
+    '''
+
+    cpus = _cpu_limit()
+    logger.debug('cpus: %s', cpus)
+
+    load = os.getloadavg()[0]
+    logger.debug('load: %s', load)
+
+    idle = max(1, cpus - int(load))
+    logger.debug('idle: %s', idle)
+
+    jobs = idle
+
+    memory_jobs = _memory_limit(memory_per_job)
+    logger.debug('memory_jobs: %s', memory_jobs)
+
+    if memory_jobs is not None:
+        jobs = max(1, min(jobs, memory_jobs))
+
+    logger.info('planned make jobs: -j%s -l%s (cpus: %s, load: %.2f, memory jobs: %s)', jobs, cpus, cpus, load, memory_jobs)
+
+    return jobs, cpus
+
+
+def replan(options):
+    '''Replace the job and load limits in a MAKEOPTS string with planned ones.
+
+    Returns
+    -------
+
+    MAKEOPTS string with `-j` and `-l` from `plan` and all other options kept.
+
+    '''
+
+    remaining = relevant_options(options)
+
+    jobs, load = plan()
+
+    return ' '.join([ '-j{0}'.format(jobs), '-l{0}'.format(load) ] + [ shlex.quote(_) for _ in remaining ])
+
+
+def relevant_options(options):
+    '''Options of a MAKEOPTS string that can affect what is built.
+
+    Examples
+    --------
+
+    >>> relevant_options('-j5 -l 4 V=1')
+    ['V=1']
+
+    Returns
+    -------
+
+    List of the arguments other than the job and load limits.
+
+    '''
+
+    _, arguments = split_jobs(options)
+
+    remaining = []
+
+    while len(arguments):
+        argument = arguments.pop(0)
+
+        if _load_expression.match(argument):
+            if argument in ( '-l', '--load-average' ) and len(arguments) and re.match(r'^[\d.]+$', arguments[0]):
+                arguments.pop(0)
+        else:
+            remaining.append(argument)
+
+    return remaining
+
+
+def compiler_version(compiler = 'gcc'):
+    '''First line of the compiler's `--version` output.
+
+    .. note::
+        None if the compiler cannot be run.
+
+    '''
+
+    try:
+        _ = commands.output([ compiler, '--version' ])
+    except (OSError, RuntimeError) as e:
+        logger.warning('cannot determine the version of %s', compiler)
+        logger.debug('error: %s', e)
+        return None
+
+    return _.splitlines()[0].strip() if len(_) else None
+
+
+def _cpu_limit():
+    '''Number of CPUs usable by this process.
+
+    Honours the scheduler affinity mask and a cgroup (v2 or v1) CPU quota.
+
+    '''
+
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = multiprocessing.cpu_count()
+
+    quota = period = None
+
+    try:
+        with open('/sys/fs/cgroup/cpu.max', 'r') as fh:
+            quota, period = fh.read().split()
+    except (IOError, OSError, ValueError):
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us', 'r') as fh:
+                quota = fh.read().strip()
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us', 'r') as fh:
+                period = fh.read().strip()
+        except (IOError, OSError):
+            pass
+
+    logger.debug('cgroup quota, period: %s, %s', quota, period)
+
+    if quota not in ( None, 'max', '-1' ) and period is not None:
+        cpus = min(cpus, max(1, int(math.ceil(float(quota) / float(period)))))
+
+    return cpus
+
+
+def _memory_limit(memory_per_job):
+    '''Number of jobs of ``memory_per_job`` bytes that fit in available memory.
+
+    .. note::
+        Unlimited (None) if `/proc/meminfo` cannot be read.
+
+    '''
+
+    try:
+        with open('/proc/meminfo', 'r') as fh:
+            meminfo = dict([ ( _.split(':')[0], _.split(':')[1] ) for _ in fh if ':' in _ ])
+    except (IOError, OSError):
+        return None
+
+    available = meminfo.get('MemAvailable', meminfo.get('MemFree'))
+
+    if available is None:
+        return None
+
+    available = int(available.split()[0]) * 1024
+    logger.debug('available memory: %s', available)
+
+    return max(1, available // memory_per_job)
+
+
+def split_jobs(options):
+    '''Separate the job count from the rest of a MAKEOPTS string.
+
+    Examples
+    --------
+
+    >>> split_jobs('-j5 -l4')
+    (5, ['-l4'])
+
+    >>> split_jobs('--jobs 3')
+    (3, [])
+
+    >>> split_jobs('-s')
+    (1, ['-s'])
+
+    Returns
+    -------
+
+    Tuple of the job count (None if unlimited) and the remaining options as a
+    list of arguments.
+
+    '''
+
+    jobs = 1
+    remaining = []
+
+    arguments = shlex.split(options)
+
+    while len(arguments):
+        argument = arguments.pop(0)
+
+        _ = _jobs_expression.match(argument)
+
+        if _:
+            jobs = _.group('jobs')
+
+            if not len(jobs) and len(arguments) and arguments[0].isdigit():
+                jobs = arguments.pop(0)
+
+            jobs = int(jobs) if len(jobs) else None
+        else:
+            remaining.append(argument)
+
+    logger.debug('jobs: %s', jobs)
+    logger.debug('remaining: %s', remaining)
+
+    return jobs, remaining
+
+
+class JobServer(object):
+    '''A GNU make jobserver shared between separate make invocations.
+
+    Every make started with this jobserver's ``environment`` draws job tokens
+    from the same pipe; thus, concurrently running stages never exceed the
+    configured number of jobs in total.
+
+    .. note::
+        A job count of None (unlimited) disables the jobserver and passes `-j`
+        through unchanged.
+
+    '''
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+
+        self._fds = ()
+
+        if self.jobs is not None and self.jobs > 1:
+            self._fds = os.pipe()
+
+            # Every make holds one implicit token; the pipe holds the rest.
+            os.write(self._fds[1], b'+' * (self.jobs - 1))
+
+    @property
+    def arguments(self):
+        '''Arguments to add to make's command line for this jobserver.'''
+
+        if self.jobs is None:
+            return [ '-j' ]
+
+        return []
+
+    @property
+    def environment(self):
+        '''Environment for a make invocation participating in this jobserver.'''
+
+        _ = dict(os.environ)
+
+        if len(self._fds):
+            _['MAKEFLAGS'] = ' -j --jobserver-fds={0},{1}'.format(*self._fds)
+
+        return _
+
+    @property
+    def fds(self):
+        '''File descriptors to be inherited by participating make invocations.'''
+
+        return self._fds
+
+    def close(self):
+        '''Release the jobserver's pipe.'''
+
+        for fd in self._fds:
+            os.close(fd)
+
+        self._fds = ()
+
+
+class Output(object):
+    '''Line by line consumer of make's output.
+
+    Keeps only the last ``lines`` lines (for failure reports) and counts the
+    objects compiled (kbuild's CC and LD lines) to estimate progress; the full
+    output is never held in memory.  Progress is logged (and journaled) at most
+    every PROGRESS_INTERVAL seconds.
+
+    Parameters
+    ----------
+
+    :``expected``: Number of objects expected (see `expected_objects`); None
+                   disables progress estimates.
+    :``echo``:     If True, every line is passed through to standard output.
+    :``lines``:    Number of trailing lines to keep.
+
+    .. note::
+        A single Output may be shared by consecutive stages to report their
+        combined progress.
+
+    '''
+
+    def __init__(self, expected = None, echo = True, lines = TAIL_LINES):
+        self.expected = expected
+        self.echo = echo
+        self.objects = 0
+        self.tail = collections.deque(maxlen = lines)
+
+        self._reported = time.time()
+
+    def __call__(self, line):
+        if self.echo:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+        line = line.rstrip('\n')
+
+        self.tail.append(line)
+
+        if _object_expression.match(line):
+            self.objects += 1
+
+            if self.expected is not None and time.time() - self._reported > PROGRESS_INTERVAL:
+                self.report()
+
+    @property
+    def progress(self):
+        '''Estimated fraction (0 to 0.99) of the expected objects built.
+
+        .. note::
+            None if no objects are expected.
+
+        '''
+
+        if self.expected is None:
+            return None
+
+        return min(0.99, float(self.objects) / self.expected)
+
+    def report(self):
+        '''Log (and journal) the current progress.'''
+
+        self._reported = time.time()
+
+        logger.info('building: %d%% (%d of ~%d objects)', self.progress * 100, self.objects, self.expected)
+
+        journal.record('progress', objects = self.objects, expected = self.expected)
+
+
+class Stage(object):
+    '''A single, timed make invocation.
+
+    Parameters
+    ----------
+
+    :``name``:        Name of the stage for reporting.
+    :``targets``:     List of make targets to build.
+    :``options``:     List of additional make arguments.
+    :``directory``:   Directory to run make in.
+    :``jobserver``:   JobServer to draw jobs from.
+    :``environment``: Dictionary of additional environment variables.
+    :``output``:      Output consuming make's output (default: a new Output
+                      without progress estimates).
+
+    '''
+
+    def __init__(self, name, targets, options = None, directory = '.', jobserver = None, environment = None, output = None):
+        self.name = name
+        self.targets = targets
+        self.options = options or []
+        self.directory = directory
+        self.jobserver = jobserver or JobServer(1)
+        self.environment = environment or {}
+        self.output = output or Output()
+
+        self.duration = None
+
+        self._command = None
+
+    @property
+    def command(self):
+        '''The make command (as an argument list) for this stage.'''
+
+        return [ 'make' ] + self.jobserver.arguments + self.options + self.targets
+
+    def start(self):
+        '''Start the stage without waiting for it to finish.'''
+
+        logger.info('starting %s stage', self.name)
+
+        self._command = commands.Command(
+                self.command,
+                directory = self.directory,
+                environment = dict(self.jobserver.environment, **self.environment),
+                pass_fds = self.jobserver.fds,
+                fields = { 'stage': self.name },
+                output = self.output,
+                ).start()
+
+        return self
+
+    def wait(self):
+        '''Wait for the stage to finish.
+
+        .. note::
+            On failure, the last lines of make's output are logged before a
+            RuntimeError is raised.
+
+        Returns
+        -------
+
+        Duration of the stage in seconds.
+
+        '''
+
+        status = self._command.wait()
+
+        self.duration = self._command.duration
+
+        logger.info('finished %s stage in %.1f seconds', self.name, self.duration)
+
+        if status != 0:
+            logger.error('last lines of the %s stage:\n%s', self.name, '\n'.join(self.output.tail))
+
+            raise RuntimeError('{0} stage did not build correctly'.format(self.name))
+
+        return self.duration
+
+    def run(self):
+        '''Run the stage to completion.'''
+
+        return self.start().wait()
@@ -3,12 +3,201 @@
 # upkern is freely distributable under the terms of an MIT-style license.
 # See COPYING or http://www.opensource.org/licenses/mit-license.php.
 
+import collections.abc
 import logging
 import os
-import subprocess
+import re
+import shlex
+
+from upkern.system import commands
 
 logger = logging.getLogger(__name__)
 
+# Imported by `Settings.configuration` rather than here (see
+# upkern.sources.DEFERRED_IMPORTS).
+DEFERRED_IMPORTS = ( 'portage', )
+
+# Read in order; a later file's assignments win.
+MAKE_CONF = ( '/etc/make.conf', '/etc/portage/make.conf' )
+
+# Settings portage accumulates over the profiles, make.conf and the
+# environment; none of them alone holds the value.
+INCREMENTALS = frozenset([
+    'ACCEPT_KEYWORDS',
+    'ACCEPT_LICENSE',
+    'ACCEPT_PROPERTIES',
+    'ACCEPT_RESTRICT',
+    'CONFIG_PROTECT',
+    'CONFIG_PROTECT_MASK',
+    'FEATURES',
+    'IUSE_IMPLICIT',
+    'PRELINK_PATH',
+    'PRELINK_PATH_MASK',
+    'PROFILE_ONLY_VARIABLES',
+    'USE',
+    'USE_EXPAND',
+    'USE_EXPAND_HIDDEN',
+    'USE_EXPAND_IMPLICIT',
+    'USE_EXPAND_UNPREFIXED',
+    ])
+
+_settings = None
+
+
+class Settings(collections.abc.Mapping):
+    '''Portage's settings (e.g. MAKEOPTS) read as cheaply as possible.
+
+    A (non-incremental) key set in the environment is read from there; as in
+    portage, the environment overrides make.conf and the profiles.  Other keys
+    set in make.conf (see MAKE_CONF) are read from there.  Portage's full
+    configuration (portage.config(), which parses make.conf, the whole
+    profile stack and the package.* files) is only created, once, for
+    anything else: incremental keys (e.g. USE), keys only the profiles set
+    and, if make.conf does more than assign constants (e.g. sources another
+    file), every key not in the environment.
+
+    Use `settings` for the instance shared by the whole process.
+
+    '''
+
+    @property
+    def configuration(self):
+        '''Portage's full configuration.
+
+        .. note::
+            This property is cached after the first invocation until the object
+            is garbage collected.
+
+        '''
+
+        if not hasattr(self, '_configuration'):
+            logger.info('loading portage configuration')
+
+            import portage
+
+            self._configuration = portage.config()
+
+            logger.info('finished loading portage configuration')
+
+        return self._configuration
+
+    @property
+    def make_conf(self):
+        '''Dictionary of the assignments in make.conf.
+
+        None if make.conf does more than assign constants.
+
+        .. note::
+            This property is cached after the first invocation until the object
+            is garbage collected.
+
+        '''
+
+        if not hasattr(self, '_make_conf'):
+            self._make_conf = {}
+
+            for path in MAKE_CONF:
+                if os.path.isdir(path):
+                    paths = [ os.path.join(path, _) for _ in sorted(os.listdir(path)) if not _.startswith('.') and not _.endswith('~') ]
+                else:
+                    paths = [ path ]
+
+                for _ in paths:
+                    try:
+                        with open(_, 'r') as fh:
+                            assignments = _parse_make_conf(fh.read())
+                    except (IOError, OSError) as e:
+                        logger.debug('skipping %s: %s', _, e)
+                        continue
+
+                    if assignments is None:
+                        logger.debug('%s does more than assign constants', _)
+
+                        self._make_conf = None
+                        break
+
+                    self._make_conf.update(assignments)
+
+                if self._make_conf is None:
+                    break
+
+            logger.debug('make.conf: %s', self._make_conf)
+
+        return self._make_conf
+
+    def __getitem__(self, key):
+        if not hasattr(self, '_configuration') and key not in INCREMENTALS:
+            if key in os.environ:
+                return os.environ[key]
+
+            if self.make_conf is not None and key in self.make_conf:
+                return self.make_conf[key]
+
+        return self.configuration[key]
+
+    def __iter__(self):
+        return iter(self.configuration)
+
+    def __len__(self):
+        return len(self.configuration)
+
+
+def settings():
+    '''The `Settings` shared by the whole process (created on first use).'''
+
+    global _settings
+
+    if _settings is None:
+        _settings = Settings()
+
+    return _settings
+
+
+def _parse_make_conf(text):
+    '''Assignments of constants in the text of a make.conf.
+
+    Returns
+    -------
+
+    Dictionary of the assigned values; None if the text does anything else
+    (e.g. sources a file or expands a variable).
+
+    Examples
+    --------
+
+    >>> sorted(_parse_make_conf('# Cores\\nMAKEOPTS="-j5 -l4"\\nexport CHOST=x86_64-pc-linux-gnu\\n').items())
+    [('CHOST', 'x86_64-pc-linux-gnu'), ('MAKEOPTS', '-j5 -l4')]
+    >>> _parse_make_conf('source /var/lib/layman/make.conf\\n') is None
+    True
+    >>> _parse_make_conf('CFLAGS="${COMMON_FLAGS}"\\n') is None
+    True
+
+    '''
+
+    lexer = shlex.shlex(text, posix = True)
+    lexer.whitespace_split = True
+    lexer.commenters = '#'
+
+    try:
+        tokens = list(lexer)
+    except ValueError:  # e.g. unbalanced quotes
+        return None
+
+    assignments = {}
+
+    for token in tokens:
+        if token == 'export':
+            continue
+
+        name, equals, value = token.partition('=')
+
+        if not equals or not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', name) or '$' in value or '`' in value:
+            return None
+
+        assignments[name] = value
+
+    return assignments
+
 
 def emerge(package, options = None):
     '''Wrapper for portage's emerge functionality.
@@ -21,19 +210,19 @@ def emerge(package, options = None):
 
     '''
 
-    command = 'emerge'
+    command = [ 'emerge' ]
 
     if options is not None:
-        command += ' ' + ' '.join(options)
+        command.extend(options)
 
-    command += ' ' + package
+    command.append(package)
 
     logger.debug('command: %s', command)
 
     if os.getuid() != 0:
         raise PermissionError('emerge requires root permissions')
     else:
-        status = subprocess.call(command, shell = True)
+        status = commands.run(command)
 
         if status != 0:
             pass  # TODO raise an appropriate exception
@@ -3,8 +3,74 @@
 # upkern is freely distributable under the terms of an MIT-style license.
 # See COPYING or http://www.opensource.org/licenses/mit-license.php.
 
+import contextlib
+import logging
 import os
-import subprocess
+
+from upkern.system import commands
+
+logger = logging.getLogger(__name__)
+
+MOUNT_TIMEOUT = 120
+
+_references = {}
+
+
+@contextlib.contextmanager
+def mounted(mountpoint):
+    '''Context manager keeping the specified location mounted.
+
+    Nests freely: only the outermost use of a mountpoint mounts it (unless it
+    was already mounted) and only the last exit unmounts it (if it was mounted
+    here).
+
+    '''
+
+    acquire(mountpoint)
+
+    try:
+        yield
+    finally:
+        release(mountpoint)
+
+
+def acquire(mountpoint):
+    '''Take a reference to the specified location, mounting it if necessary.
+
+    .. note::
+        Every `acquire` must be paired with a `release`; `mounted` does this
+        automatically.
+
+    '''
+
+    count, owned = _references.get(mountpoint, ( 0, False ))
+
+    if count == 0:
+        owned = mount(mountpoint)
+
+    _references[mountpoint] = ( count + 1, owned )
+
+    logger.debug('references to %s: %s', mountpoint, _references[mountpoint])
+
+
+def release(mountpoint):
+    '''Drop a reference to the specified location.
+
+    Unmounts the location when the last reference is dropped and the location
+    was mounted by `acquire`.
+
+    '''
+
+    count, owned = _references.pop(mountpoint)
+
+    count -= 1
+
+    logger.debug('references to %s: %s', mountpoint, ( count, owned ))
+
+    if count > 0:
+        _references[mountpoint] = ( count, owned )
+    elif owned:
+        unmount(mountpoint)
 
 
 def mount(mountpoint):
@@ -15,7 +81,8 @@ def mount(mountpoint):
 
     .. note::
         This assumes the mountpoint is defined in `/etc/fstab` and if not found
-        there, it will throw an error.
+        there, it will throw an error.  A mount taking longer than
+        MOUNT_TIMEOUT seconds is an error as well.
 
     Returns
     -------
@@ -27,8 +94,7 @@ def mount(mountpoint):
     if os.path.ismount(mountpoint):
         return False
 
-    command = 'mount {0}'.format(mountpoint)
-    status = subprocess.call(command, shell = True)
+    status = commands.run([ 'mount', mountpoint ], timeout = MOUNT_TIMEOUT)
 
     if status != 0:
         raise RuntimeError('mount encountered an error')
@@ -44,8 +110,7 @@ def unmount(mountpoint):
 
     '''
 
-    command = 'umount {0}'.format(mountpoint)
-    status = subprocess.call(command, shell = True)
+    status = commands.run([ 'umount', mountpoint ], timeout = MOUNT_TIMEOUT)
 
     if status != 0:
         raise RuntimeError('umount encountered an error')
@@ -0,0 +1,254 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import collections
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+VDB_DIRECTORY = '/var/db/pkg'
+OWNERS_INDEX = '/var/cache/upkern/owners.json'
+INSTALLED_INDEX = '/var/cache/upkern/installed.json'
+
+_version_expression = re.compile(r'-\d+(?:\.\d+)*[a-z]?(?:_(?:alpha|beta|pre|rc|p)\d*)*(?:-r\d+)?$')
+
+Installed = collections.namedtuple('Installed', [ 'cpv', 'slot', 'counter' ])
+
+
+def owners(paths):
+    '''Map each of the given paths to the CPV of the package that owns it.
+
+    Answers from a persistent owner index when possible and resolves any
+    remaining paths with a single walk of the installed package database.  The
+    index is discarded whenever the modification time of `/var/db/pkg` changes
+    (portage bumps it on every merge and unmerge).
+
+    Parameters
+    ----------
+
+    :``paths``: Iterable of absolute paths to find the owners of.
+
+    Returns
+    -------
+
+    Dictionary mapping each path to its owning CPV (None if unowned).
+
+    '''
+
+    paths = list(paths)
+
+    mtime = os.stat(VDB_DIRECTORY).st_mtime
+    logger.debug('mtime: %s', mtime)
+
+    index = _load_index(mtime, OWNERS_INDEX)
+
+    missing = [ _ for _ in paths if _ not in index ]
+    logger.debug('missing: %s', missing)
+
+    if len(missing):
+        logger.info('finding the owners of %s', missing)
+
+        found = _walk(missing)
+        logger.debug('found: %s', found)
+
+        for path in missing:
+            index[path] = found.get(path)
+
+        logger.info('finished finding the owners of %s', missing)
+
+        _save_index(mtime, index, OWNERS_INDEX)
+
+    return dict([ ( _, index[_] ) for _ in paths ])
+
+
+def installed(packages):
+    '''Map each of the given packages to its installed versions.
+
+    Only the vdb entries of the given packages are read and the answers are
+    kept in a persistent index that, like the owner index, is discarded
+    whenever the modification time of `/var/db/pkg` changes.
+
+    Parameters
+    ----------
+
+    :``packages``: Iterable of packages (category/name, e.g. sys-boot/grub).
+
+    Returns
+    -------
+
+    Dictionary mapping each package to a list of Installed (CPV, SLOT without
+    the sub-slot and merge COUNTER) ordered by COUNTER (empty if the package
+    isn't installed).
+
+    '''
+
+    packages = list(packages)
+
+    mtime = os.stat(VDB_DIRECTORY).st_mtime
+    logger.debug('mtime: %s', mtime)
+
+    index = _load_index(mtime, INSTALLED_INDEX)
+
+    missing = [ _ for _ in packages if _ not in index ]
+    logger.debug('missing: %s', missing)
+
+    if len(missing):
+        for package in missing:
+            index[package] = _versions(package)
+
+        _save_index(mtime, index, INSTALLED_INDEX)
+
+    return dict([ ( _, [ Installed(*installed) for installed in index[_] ] ) for _ in packages ])
+
+
+def _versions(package):
+    '''Read the installed versions of a single package from `/var/db/pkg`.
+
+    Returns
+    -------
+
+    List of CPV, SLOT and COUNTER lists ordered by COUNTER.
+
+    '''
+
+    category, name = package.split('/', 1)
+
+    try:
+        entries = os.listdir(os.path.join(VDB_DIRECTORY, category))
+    except OSError:
+        return []
+
+    versions = []
+
+    for entry in entries:
+        _ = _version_expression.search(entry)
+
+        if not _ or entry[:_.start()] != name:
+            continue
+
+        metadata = {}
+
+        for key in ( 'SLOT', 'COUNTER' ):
+            try:
+                with open(os.path.join(VDB_DIRECTORY, category, entry, key), 'r') as fh:
+                    metadata[key] = fh.read().strip()
+            except (IOError, OSError):
+                metadata[key] = ''
+
+        try:
+            counter = int(metadata['COUNTER'])
+        except ValueError:
+            counter = 0
+
+        versions.append([ category + '/' + entry, metadata['SLOT'].partition('/')[0] or '0', counter ])
+
+    logger.debug('installed %s: %s', package, versions)
+
+    return sorted(versions, key = lambda _: ( _[2], _[0] ))
+
+
+def _walk(paths):
+    '''Find the owners of the given paths in one pass over `/var/db/pkg`.
+
+    Every installed package's CONTENTS is read at most once and the walk stops
+    as soon as all paths have been claimed; thus, the cost is bounded by the
+    number of installed packages rather than packages times paths.
+
+    Returns
+    -------
+
+    Dictionary mapping each owned path to the owning CPV (first owner wins).
+
+    '''
+
+    remaining = set(paths)
+    found = {}
+
+    for category in sorted(os.listdir(VDB_DIRECTORY)):
+        category_directory = os.path.join(VDB_DIRECTORY, category)
+
+        if not os.path.isdir(category_directory):
+            continue
+
+        for package in sorted(os.listdir(category_directory)):
+            contents_path = os.path.join(category_directory, package, 'CONTENTS')
+
+            try:
+                fh = open(contents_path, 'r', errors = 'replace')
+            except (IOError, OSError):
+                continue
+
+            with fh:
+                for line in fh:
+                    entry_type, _, entry = line.rstrip('\n').partition(' ')
+
+                    if entry_type == 'dir':
+                        path = entry
+                    elif entry_type == 'obj':
+                        path = entry.rsplit(' ', 2)[0]
+                    elif entry_type == 'sym':
+                        path = entry.partition(' -> ')[0]
+                    else:
+                        continue
+
+                    if path in remaining:
+                        found[path] = category + '/' + package
+                        remaining.discard(path)
+
+            if not len(remaining):
+                return found
+
+    return found
+
+
+def _load_index(mtime, path):
+    '''Load the index at path if it is still valid for the given vdb mtime.
+
+    Returns
+    -------
+
+    Dictionary of the index's entries (e.g. path to CPV); empty if the index
+    is missing or stale.
+
+    '''
+
+    try:
+        with open(path, 'r') as fh:
+            _ = json.load(fh)
+    except (IOError, OSError, ValueError) as e:
+        logger.debug('index %s unavailable: %s', path, e)
+        return {}
+
+    if _.get('mtime') != mtime:
+        logger.info('discarding stale index %s', path)
+        return {}
+
+    return _.get('index', {})
+
+
+def _save_index(mtime, index, path):
+    '''Atomically write the index to path for the given vdb mtime.
+
+    .. note::
+        Failures are logged and ignored; the index is only an optimization.
+
+    '''
+
+    temporary_path = path + '.tmp'
+
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        with open(temporary_path, 'w') as fh:
+            json.dump({ 'mtime': mtime, 'index': index }, fh)
+
+        os.rename(temporary_path, path)
+    except (IOError, OSError) as e:
+        logger.warning('failed writing index %s', path)
+        logger.debug('error: %s', e)
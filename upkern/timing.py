@@ -0,0 +1,248 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import contextlib
+import json
+import logging
+import os
+import re
+import resource
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Timings(object):
+    '''Resource usage of each phase of an upkern run.
+
+    Every phase records its wall time, the CPU time (user and system) spent by
+    upkern and the child processes it waited for, and the peak resident set
+    size seen by the end of the phase.
+
+    .. note::
+        The peak RSS is a high-water mark (getrusage only reports the largest
+        process so far); a phase that doesn't raise it reports the previous
+        peak.
+
+    '''
+
+    def __init__(self):
+        self.phases = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''Context manager recording the resource usage of the named phase.'''
+
+        logger.debug('starting phase %s', name)
+
+        wall = time.time()
+        usage = _usage()
+
+        try:
+            yield
+        finally:
+            _ = _usage()
+
+            self.phases.append({
+                'phase': name,
+                'wall': time.time() - wall,
+                'cpu': _['cpu'] - usage['cpu'],
+                'peak_rss': _['peak_rss'],
+                })
+
+            logger.debug('finished phase %s: %s', name, self.phases[-1])
+
+    def table(self):
+        '''Human readable table of the recorded phases.'''
+
+        lines = [ '{0:<16} {1:>10} {2:>10} {3:>12}'.format('phase', 'wall (s)', 'cpu (s)', 'peak rss (MiB)') ]
+
+        for _ in self.phases:
+            lines.append('{0:<16} {1:>10.1f} {2:>10.1f} {3:>12.1f}'.format(_['phase'], _['wall'], _['cpu'], _['peak_rss'] / 1024.0))
+
+        lines.append('{0:<16} {1:>10.1f} {2:>10.1f}'.format('total', sum([ _['wall'] for _ in self.phases ]), sum([ _['cpu'] for _ in self.phases ])))
+
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        '''Write the recorded phases to path as JSON.'''
+
+        logger.info('writing timings to %s', path)
+
+        with open(path, 'w') as fh:
+            json.dump({ 'phases': self.phases }, fh, indent = 2, sort_keys = True)
+
+
+_import_time_expression = re.compile(
+        r'^import time:\s+(?P<self>\d+)\s+\|\s+(?P<cumulative>\d+)\s+\| (?P<indent> *)(?P<module>\S+)$'
+        )
+
+
+class ImportTimings(object):
+    '''Import time of upkern's modules and of everything they import.
+
+    The modules are imported by a fresh interpreter (with ``-X importtime``);
+    thus, modules this interpreter already loaded are measured as well.
+    Every import is attributed to the upkern module that triggered it: each
+    upkern module records its own (self) time and the cumulative time of the
+    other modules it directly imported.
+
+    Parameters
+    ----------
+
+    :``modules``:  Modules to import, in order (e.g. the entry point's).
+    :``deferred``: Dictionary mapping upkern modules to the modules they only
+                   import on first use (e.g. upkern.sources' portage); these
+                   are imported after modules and attributed to the upkern
+                   module that defers them.
+
+    '''
+
+    def __init__(self, modules, deferred = None):
+        self.modules = list(modules)
+        self.deferred = dict(deferred or {})
+
+        self.own = {}
+        self.imports = []
+
+    def measure(self):
+        '''Import the modules and record the time each import took.'''
+
+        logger.info('measuring the import time of %s', ', '.join(self.modules))
+
+        statements = [ 'import ' + _ for _ in self.modules ]
+
+        for importer in sorted(self.deferred):
+            for _ in self.deferred[importer]:
+                statements.append('try:\n    import {0}\nexcept ImportError:\n    pass'.format(_))
+
+        environment = dict(os.environ)
+        environment['PYTHONPATH'] = os.pathsep.join([ _ for _ in sys.path if _ ])
+
+        process = subprocess.Popen([ sys.executable, '-X', 'importtime', '-c', '\n'.join(statements) ], stdout = subprocess.PIPE, stderr = subprocess.PIPE, env = environment)
+        output = process.communicate()[1].decode('utf-8', 'replace')
+
+        if process.returncode != 0:
+            logger.warning('importing %s failed; the import times are incomplete', ', '.join(self.modules))
+            logger.debug('output: %s', output)
+
+        self.parse(output.splitlines())
+
+        logger.info('finished measuring the import time of %s', ', '.join(self.modules))
+
+    def parse(self, lines):
+        '''Record the import times in lines of ``-X importtime`` output.'''
+
+        importers = {}
+
+        for importer in self.deferred:
+            for _ in self.deferred[importer]:
+                importers[_] = importer
+
+        for node in _import_tree(lines):
+            self._attribute(node, importers.get(node['module']), node['module'] in importers)
+
+    def table(self):
+        '''Human readable table of the recorded import times (milliseconds).
+
+        Upkern's modules are ordered by the total time they cost; the modules
+        each of them imported are listed (indented) below it.
+
+        '''
+
+        modules = set(self.own) | set([ _['importer'] for _ in self.imports ])
+
+        totals = dict([ ( _, self.own.get(_, 0) + sum([ i['cumulative'] for i in self.imports if i['importer'] == _ ]) ) for _ in modules ])
+
+        lines = [ '{0:<48} {1:>10} {2:>10}'.format('module', 'self (ms)', 'total (ms)') ]
+
+        for module in sorted(totals, key = lambda _: ( -totals[_], _ )):
+            lines.append('{0:<48} {1:>10.1f} {2:>10.1f}'.format(module, self.own.get(module, 0) / 1000.0, totals[module] / 1000.0))
+
+            for _ in sorted([ i for i in self.imports if i['importer'] == module ], key = lambda i: -i['cumulative']):
+                name = '  ' + _['module'] + (' (deferred)' if _['deferred'] else '')
+
+                lines.append('{0:<48} {1:>10} {2:>10.1f}'.format(name, '', _['cumulative'] / 1000.0))
+
+        lines.append('{0:<48} {1:>10.1f} {2:>10.1f}'.format('total', sum(self.own.values()) / 1000.0, sum(totals.values()) / 1000.0))
+
+        return '\n'.join(lines)
+
+    def _attribute(self, node, importer, deferred):
+        '''Attribute the import of node (and its children) to upkern modules.'''
+
+        if node['module'] == 'upkern' or node['module'].startswith('upkern.'):
+            self.own[node['module']] = node['self']
+
+            for _ in node['children']:
+                self._attribute(_, node['module'], False)
+        elif importer is not None:
+            self.imports.append({ 'importer': importer, 'module': node['module'], 'cumulative': node['cumulative'], 'deferred': deferred })
+        else:
+            for _ in node['children']:
+                self._attribute(_, None, False)
+
+
+def _import_tree(lines):
+    '''Imports (nested by importer) in lines of ``-X importtime`` output.
+
+    Returns
+    -------
+
+    List of the top level imports as dictionaries of module, self and
+    cumulative (microseconds) and children (the imports made by the module).
+
+    Examples
+    --------
+
+    >>> _ = _import_tree([
+    ...     'import time: self [us] | cumulative | imported package',
+    ...     'import time:       100 |        100 |     upkern.information',
+    ...     'import time:       200 |        300 |   upkern.arguments',
+    ...     'import time:        50 |        350 | upkern',
+    ...     ])
+    >>> _[0]['module'], _[0]['cumulative'], _[0]['children'][0]['module']
+    ('upkern', 350, 'upkern.arguments')
+
+    '''
+
+    pending = []
+
+    for line in lines:
+        match = _import_time_expression.match(line)
+
+        if match is None:
+            continue
+
+        depth = len(match.group('indent'))
+
+        node = {
+                'module': match.group('module'),
+                'self': int(match.group('self')),
+                'cumulative': int(match.group('cumulative')),
+                'children': [],
+                }
+
+        # Imports are reported after the imports they made (deeper).
+        while len(pending) and pending[-1][0] > depth:
+            node['children'].insert(0, pending.pop()[1])
+
+        pending.append(( depth, node ))
+
+    return [ _[1] for _ in pending ]
+
+
+def _usage():
+    '''CPU seconds and peak RSS (KiB) of upkern and its waited-for children.'''
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    return {
+            'cpu': own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+            'peak_rss': max(own.ru_maxrss, children.ru_maxrss),
+            }
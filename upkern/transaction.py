@@ -0,0 +1,393 @@
+# Copyright (C) 2014 by Alex Brandt <alunduil@alunduil.com>
+#
+# upkern is freely distributable under the terms of an MIT-style license.
+# See COPYING or http://www.opensource.org/licenses/mit-license.php.
+
+import contextlib
+import errno
+import fcntl
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from upkern import journal
+from upkern import system
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY = '/var/lib/upkern/transaction'
+LOG = 'log.json'
+LOCK = 'lock'
+
+_current = None
+_lock = None
+
+
+class Transaction(object):
+    '''Write-ahead undo log of the filesystem changes made by a run.
+
+    Before a path is changed, `protect` records how to undo the change: remove
+    a path that didn't exist, restore a file from a backup or point a symlink
+    at its previous target.  The log (and every backup) lives in directory
+    and is synced before the change is made; thus, a crashed run can still be
+    rolled back by `recover`.
+
+    Parameters
+    ----------
+
+    :``directory``: Directory holding the log and backups of the transaction.
+
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.operations = []
+        self.state = 'open'
+
+        self._installer = system.files.Installer()
+
+    @classmethod
+    def load(cls, directory):
+        '''The transaction logged in directory; None if there's none.'''
+
+        try:
+            with open(os.path.join(directory, LOG), 'r') as fh:
+                log = json.load(fh)
+        except (IOError, OSError, ValueError) as e:
+            logger.debug('no transaction in %s: %s', directory, e)
+            return None
+
+        transaction = cls(directory)
+        transaction.operations = log['operations']
+        transaction.state = log['state']
+
+        return transaction
+
+    def protect(self, path):
+        '''Record how to undo the change about to be made to path.
+
+        .. note::
+            Only the first protection of a path counts: rolling back restores
+            the path as it was before the transaction.  An existing directory
+            can't be restored; it's left as is.
+
+        '''
+
+        if any([ _['path'] == path for _ in self.operations ]):
+            return
+
+        if os.path.islink(path):
+            operation = { 'action': 'relink', 'path': path, 'target': os.readlink(path) }
+        elif os.path.isfile(path):
+            backup = os.path.join(self.directory, str(len(self.operations)))
+
+            self._installer.copy(path, backup)
+
+            operation = { 'action': 'restore', 'path': path, 'backup': backup }
+        elif os.path.isdir(path):
+            logger.warning('%s can not be restored if the transaction is rolled back', path)
+            return
+        else:
+            operation = { 'action': 'remove', 'path': path }
+
+        self._record(operation)
+
+    def created(self, path):
+        '''Record that path was created (by a command) during the transaction.'''
+
+        if not any([ _['path'] == path for _ in self.operations ]):
+            self._record({ 'action': 'remove', 'path': path })
+
+    def commit(self):
+        '''Keep the changes and discard the log and backups.'''
+
+        logger.info('committing %s changes', len(self.operations))
+
+        self.state = 'committed'
+        self._save()
+
+        journal.record('transaction', state = self.state, operations = len(self.operations))
+
+        self._discard()
+
+    def rollback(self):
+        '''Undo the changes (in reverse order) and discard the log and backups.
+
+        .. note::
+            Every undone change is marked as such in the log (durably) and the
+            log is marked rolled back before it's discarded; thus, recovering
+            from a crash during (or right after) a rollback never undoes a
+            change twice.
+
+        .. note::
+            A change that can't be undone is logged and skipped so the rest
+            are still undone; the log is left (still rolling back) for
+            inspection and `recover` retries only those changes.
+
+        '''
+
+        logger.info('rolling back %s changes', len(self.operations))
+
+        self.state = 'rolling back'
+        self._save()
+
+        failures = 0
+
+        for operation in reversed(self.operations):
+            if operation.get('undone'):
+                continue
+
+            logger.debug('undoing: %s', operation)
+
+            try:
+                self._undo(operation)
+            except Exception as e:
+                logger.exception(e)
+                logger.error('failed restoring %s', operation['path'])
+
+                failures += 1
+            else:
+                operation['undone'] = True
+                self._save()
+
+        journal.record('transaction', state = 'rolled back', operations = len(self.operations), failures = failures)
+
+        if failures:
+            logger.warning('leaving the transaction in %s for inspection', self.directory)
+        else:
+            self.state = 'rolled back'
+            self._save()
+
+            self._discard()
+
+    def _undo(self, operation):
+        '''Undo a single logged operation.'''
+
+        path = operation['path']
+
+        if operation['action'] == 'restore':
+            if os.path.islink(path):
+                os.remove(path)
+
+            self._installer.copy(operation['backup'], path)
+        elif operation['action'] == 'relink':
+            if os.path.lexists(path):
+                os.remove(path)
+
+            os.symlink(operation['target'], path)
+        elif operation['action'] == 'remove':
+            if os.path.islink(path) or os.path.isfile(path):
+                os.remove(path)
+            elif os.path.isdir(path):
+                shutil.rmtree(path)
+
+    def _record(self, operation):
+        '''Log the operation (durably) before the change is made.'''
+
+        logger.debug('protecting: %s', operation)
+
+        self.operations.append(operation)
+        self._save()
+
+    def _save(self):
+        self._installer.write(os.path.join(self.directory, LOG), json.dumps({ 'state': self.state, 'operations': self.operations }, sort_keys = True).encode('utf-8'))
+        self._installer.sync()
+
+    def _discard(self):
+        '''Remove the log and backups (but not the lock; see `begin`).'''
+
+        for _ in os.listdir(self.directory):
+            if _ == LOCK:
+                continue
+
+            _ = os.path.join(self.directory, _)
+
+            if os.path.isdir(_) and not os.path.islink(_):
+                shutil.rmtree(_, ignore_errors = True)
+            else:
+                os.remove(_)
+
+
+def _acquire(directory):
+    '''Exclusively lock directory's transaction for this process.
+
+    .. note::
+        Fails (with a RuntimeError) rather than waits if another process (e.g.
+        a concurrent upkern run) holds the lock.  The lock file is never
+        removed: another process may already have it open.
+
+    '''
+
+    global _lock
+
+    if _lock is not None:
+        if _lock[0] == directory:
+            return
+
+        _release()
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    fh = open(os.path.join(directory, LOCK), 'a')
+
+    try:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except (IOError, OSError) as e:
+        fh.close()
+
+        if e.errno in ( errno.EAGAIN, errno.EACCES ):
+            raise RuntimeError('another upkern run holds the transaction in {0}'.format(directory))
+
+        raise
+
+    logger.debug('locked %s', directory)
+
+    _lock = ( directory, fh )
+
+
+def _release():
+    '''Release the lock taken by `_acquire` (if any).'''
+
+    global _lock
+
+    if _lock is not None:
+        logger.debug('unlocking %s', _lock[0])
+
+        _lock[1].close()
+
+    _lock = None
+
+
+def begin(directory = DIRECTORY):
+    '''Start the run's transaction (see `Transaction`) in directory.
+
+    .. note::
+        The transaction's directory stays locked (see `recover`) until the
+        transaction is committed or rolled back.
+
+    '''
+
+    global _current
+
+    logger.info('starting transaction in %s', directory)
+
+    _acquire(directory)
+
+    _current = Transaction(directory)
+    _current._save()
+
+    journal.record('transaction', state = _current.state)
+
+
+def active():
+    '''True if a transaction is in progress; otherwise, False.'''
+
+    return _current is not None
+
+
+def protect(path):
+    '''Protect path in the current transaction (if any); see `Transaction`.'''
+
+    if _current is not None:
+        _current.protect(path)
+
+
+def created(path):
+    '''Record path's creation in the current transaction (if any).'''
+
+    if _current is not None:
+        _current.created(path)
+
+
+def commit():
+    '''Commit and end the current transaction.'''
+
+    global _current
+
+    try:
+        if _current is not None:
+            _current.commit()
+    finally:
+        _current = None
+
+        _release()
+
+
+def rollback():
+    '''Roll back and end the current transaction.'''
+
+    global _current
+
+    try:
+        if _current is not None:
+            _current.rollback()
+    finally:
+        _current = None
+
+        _release()
+
+
+@contextlib.contextmanager
+def atomic():
+    '''Roll back the changes made in the body if it raises.
+
+    Inside a transaction, this is left to the transaction's owner (the whole
+    transaction is rolled back); otherwise, the body runs in a transaction of
+    its own.
+
+    '''
+
+    if _current is not None:
+        yield
+        return
+
+    directory = tempfile.mkdtemp(prefix = 'upkern.transaction.')
+
+    begin(directory)
+
+    try:
+        yield
+    except Exception:
+        rollback()
+        raise
+    else:
+        commit()
+    finally:
+        if os.listdir(directory) == [ LOCK ]:  # kept after a failed rollback
+            shutil.rmtree(directory, ignore_errors = True)
+
+
+def recover(directory = DIRECTORY):
+    '''Finish a transaction interrupted by a crash.
+
+    A committed or rolled back transaction only has its log and backups
+    discarded; anything else is rolled back (skipping the changes already
+    undone).
+
+    .. note::
+        Locks directory first (and keeps it locked for `begin`); thus, a
+        transaction still in progress in another upkern run is never mistaken
+        for an interrupted one: a RuntimeError is raised instead.
+
+    '''
+
+    _acquire(directory)
+
+    transaction = Transaction.load(directory)
+
+    if transaction is None:
+        return
+
+    logger.warning('recovering the interrupted transaction in %s', directory)
+
+    system.boot.mount()
+
+    if transaction.state in ( 'committed', 'rolled back' ):
+        transaction._discard()
+    else:
+        transaction.rollback()
+
+    logger.info('finished recovering the interrupted transaction in %s', directory)